@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks of hot paths. They need a running MongoDB (see `_common.connect`)
+and are meant to be run by hand, e.g. `python -m benchmarks.worksessions`.
+"""
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Helpers shared by benchmarks.
+"""
+
+import math
+import os
+import statistics
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from mongoengine import connect, disconnect
+from mongoengine.connection import get_db
+from pymongo import monitoring
+
+__all__ = ["CommandCounter", "Result", "connect_db", "measure"]
+
+
+class CommandCounter(monitoring.CommandListener):
+    """
+    Counts commands sent to the server, i.e. network round trips.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        self.count += 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+@dataclass
+class Result:
+    name: str
+    timings: list[float] = field(default_factory=list)
+    commands: int = 0
+
+    def percentile(self, q: float) -> float:
+        """
+        :param q: Percentile as a fraction, e.g. 0.95.
+
+        :return: Timing not exceeded by the share `q` of runs (nearest rank).
+        """
+        ordered = sorted(self.timings)
+
+        return ordered[max(math.ceil(len(ordered) * q) - 1, 0)]
+
+    def __str__(self) -> str:
+        ops = len(self.timings)
+
+        return "{:<32} ops={:<6} mean={:.3f}ms p95={:.3f}ms round-trips/op={:.2f}".format(
+            self.name,
+            ops,
+            statistics.fmean(self.timings) * 1000,
+            self.percentile(0.95) * 1000,
+            self.commands / ops,
+        )
+
+
+@contextmanager
+def connect_db() -> Iterator[CommandCounter]:
+    """
+    Connects mongoengine to a throwaway database and drops it afterwards.
+    Set `BENCHMARK_MONGODB_URI` to point to another server.
+
+    :return: Listener counting commands sent.
+    """
+    counter = CommandCounter()
+    uri = os.environ.get("BENCHMARK_MONGODB_URI", "mongodb://localhost:27017/vulyk_benchmark")
+    client = connect(host=uri, event_listeners=[counter], uuidRepresentation="standard")
+
+    try:
+        yield counter
+    finally:
+        client.drop_database(get_db().name)
+        disconnect()
+
+
+def measure(
+    name: str, counter: CommandCounter, op: Callable[[int], None], setup: Callable[[int], None], n: int
+) -> Result:
+    """
+    Runs `op(i)` n times, timing it and counting commands it sends.
+    `setup(i)` is run before each call and isn't accounted.
+
+    :param name: Title of the result.
+    :param counter: Command listener of the connection.
+    :param op: Operation to measure.
+    :param setup: Preparation of a single run.
+    :param n: Number of runs.
+
+    :return: Collected timings.
+    """
+    result = Result(name)
+
+    for i in range(n):
+        setup(i)
+        before = counter.count
+        started = time.perf_counter()
+        op(i)
+        result.timings.append(time.perf_counter() - started)
+        result.commands += counter.count - before
+
+    return result
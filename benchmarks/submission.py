@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Latency and round trips of submitting an answer through
+`AbstractTaskType.on_task_done`, with and without closing a task.
+
+    python -m benchmarks.submission [iterations]
+"""
+
+import sys
+from collections.abc import Callable
+
+import click
+
+from benchmarks._common import connect_db, measure
+from vulyk.models.task_types import AbstractTaskType
+from vulyk.models.tasks import AbstractAnswer, AbstractTask, Batch
+from vulyk.models.user import Group, User
+
+
+class BenchTask(AbstractTask):
+    pass
+
+
+class BenchAnswer(AbstractAnswer):
+    pass
+
+
+class BenchType(AbstractTaskType):
+    task_model = BenchTask
+    answer_model = BenchAnswer
+    type_name = "bench"
+    template = "bench.html"
+    redundancy = 2
+
+
+def main(n: int) -> None:
+    with connect_db() as counter:
+        task_type = BenchType({})
+        Group.objects.create(id="default", description="default", allowed_types=[task_type.type_name])
+        users = [User(username="bench%s" % i, email="bench%s@example.com" % i).save() for i in range(2)]
+        batch = Batch(id="bench", task_type=task_type.type_name, tasks_count=n, tasks_processed=0).save()
+        tasks = [
+            BenchTask(id="task%s" % i, task_type=task_type.type_name, batch=batch, task_data={"bench": True}).save()
+            for i in range(n)
+        ]
+
+        def start(user: User) -> Callable[[int], None]:
+            return lambda i: task_type.work_session_manager.start_work_session(tasks[i], user.id)
+
+        def submit(user: User) -> Callable[[int], None]:
+            return lambda i: task_type.on_task_done(user, tasks[i].id, {"bench": True})
+
+        results = [
+            # the first answer to a task leaves it open
+            measure("done: task stays open", counter, submit(users[0]), start(users[0]), n),
+            # the second one closes the task and bumps the batch
+            measure("done: task gets closed", counter, submit(users[1]), start(users[1]), n),
+        ]
+
+    for result in results:
+        click.echo(str(result))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Template resolution done while rendering the index and task pages: listing
+every template of every plugin per lookup against the map built once.
+
+    python -m benchmarks.templates [iterations] [plugins]
+"""
+
+import os
+import sys
+import tempfile
+
+import click
+import flask
+import jinja2
+
+from benchmarks._common import CommandCounter, measure
+from vulyk import utils
+
+# templates looked up through `get_template_path` and the `app_template` filter
+PAGES = {
+    "index": ["index.html", "_nav.html", "_holding_page.html", "_instruction.html", "_hello_block.html"],
+    "task": ["task.html", "_nav.html", "_holding_page.html", "_hello_block.html", "_social_signin.html"],
+}
+
+
+def legacy_get_template_path(app: flask.Flask, name: str) -> str:
+    for x in app.jinja_loader.list_templates():  # type: ignore[union-attr]
+        for folder in app.config.get("TEMPLATE_BASE_FOLDERS", []):
+            if folder and os.path.join(folder, "base", name) == x:
+                return x
+    return "base/%s" % name
+
+
+def make_app(root: str, plugins: int) -> flask.Flask:
+    """
+    Application with the core templates and plugins with a few dozens of
+    templates each, laid out the way `init_plugins` does.
+    """
+    loaders = {}
+
+    for p in range(plugins):
+        folder = os.path.join(root, "plugin%s" % p, "templates")
+        os.makedirs(folder)
+
+        for t in range(30):
+            with open(os.path.join(folder, "template%s.html" % t), "w") as f:
+                f.write("{{ t }}")
+
+        loaders["plugin%s" % p] = jinja2.FileSystemLoader(folder)
+
+    app = flask.Flask("vulyk", template_folder=os.path.join(os.path.dirname(utils.__file__), "templates"))
+    app.config["TEMPLATE_BASE_FOLDERS"] = ["plugin0"]
+    app.jinja_loader = jinja2.ChoiceLoader(  # type: ignore[assignment]
+        [app.jinja_loader, jinja2.PrefixLoader(loaders)]  # type: ignore[list-item]
+    )
+
+    return app
+
+
+def main(n: int, plugins: int) -> None:
+    counter = CommandCounter()
+
+    with tempfile.TemporaryDirectory() as root:
+        app = make_app(root, plugins)
+        results = []
+
+        for page, names in PAGES.items():
+
+            def legacy(_: int, names: list[str] = names) -> None:
+                for name in names:
+                    legacy_get_template_path(app, name)
+
+            def memoized(_: int, names: list[str] = names) -> None:
+                for name in names:
+                    utils.get_template_path(app, name)
+
+            results.append(measure("{}: list templates".format(page), counter, legacy, lambda _: None, n))
+            results.append(measure("{}: resolution map".format(page), counter, memoized, lambda _: None, n))
+
+    for r in results:
+        click.echo(str(r))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    )
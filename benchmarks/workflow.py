@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+Load test of the volunteer workflow: N volunteers concurrently take a task
+through `/type/<name>/next`, report activity on it and either submit an
+answer or skip it, all through the application with its blueprints and
+hooks. Reports throughput, p50/p95/p99 latency and database commands per
+route, so a change could be compared with a saved baseline.
+
+    python -m benchmarks.workflow --volunteers 8 --loops 200 --tasks 10000 --save before.json
+    python -m benchmarks.workflow --volunteers 8 --loops 200 --tasks 10000 --baseline before.json
+
+Large batches (up to 10M tasks) take a while to seed, `--keep` leaves
+the database in place and `--reuse` runs against it again. Set
+`BENCHMARK_MONGODB_URI` to point to another server; mongomock won't do, as
+leaderboards need mapReduce.
+"""
+
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import click
+from flask.testing import FlaskClient
+from pymongo import monitoring, uri_parser
+
+from benchmarks._common import Result
+from vulyk import settings
+from vulyk.models.task_types import AbstractTaskType
+from vulyk.models.tasks import AbstractAnswer, AbstractTask, Batch
+from vulyk.models.user import Group, User
+
+ROUTES = ("next", "activity", "done", "skip")
+# tasks inserted within a single command while seeding
+SEED_CHUNK = 10_000
+
+
+class BenchTask(AbstractTask):
+    pass
+
+
+class BenchAnswer(AbstractAnswer):
+    pass
+
+
+class BenchType(AbstractTaskType):
+    task_model = BenchTask
+    answer_model = BenchAnswer
+    type_name = "bench"
+    template = "bench.html"
+    redundancy = 2
+
+
+class RouteCommandCounter(monitoring.CommandListener):
+    """
+    Counts commands sent by each route. pymongo calls listeners in the
+    thread sending a command, so every volunteer tells which route it's in.
+    """
+
+    def __init__(self) -> None:
+        self.counts = dict.fromkeys(ROUTES, 0)
+        self._current = threading.local()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def route(self, name: str) -> Iterator[None]:
+        self._current.route = name
+
+        try:
+            yield
+        finally:
+            self._current.route = None
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        route = getattr(self._current, "route", None)
+
+        if route is not None:
+            with self._lock:
+                self.counts[route] += 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        pass
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        pass
+
+
+def seed(n: int) -> None:
+    """
+    Creates a batch of n tasks, inserting raw documents in chunks, as
+    saving them one by one takes hours for millions of tasks.
+
+    :param n: Number of tasks.
+    """
+    type_name = BenchType.type_name
+    Group.objects.create(id="default", description="default", allowed_types=[type_name])
+    batch = Batch(id="bench", task_type=type_name, tasks_count=n, tasks_processed=0).save()
+    template = BenchTask(id="task", task_type=type_name, batch=batch, task_data={"bench": True}).to_mongo().to_dict()
+    collection = BenchTask._get_collection()  # noqa: SLF001
+
+    for start in range(0, n, SEED_CHUNK):
+        collection.insert_many(
+            [dict(template, _id="task%s" % i) for i in range(start, min(start + SEED_CHUNK, n))], ordered=False
+        )
+
+
+def volunteer(
+    client: FlaskClient,
+    counter: RouteCommandCounter,
+    results: dict[str, Result],
+    lock: threading.Lock,
+    loops: int,
+    skip_ratio: float,
+    rng: random.Random,
+) -> int:
+    """
+    Works on tasks as a volunteer would.
+
+    :param client: Test client logged in as the volunteer.
+    :param counter: Listener counting commands per route.
+    :param results: Timings per route, shared by volunteers.
+    :param lock: Guards the results.
+    :param loops: Number of tasks to take.
+    :param skip_ratio: Share of tasks skipped rather than done.
+    :param rng: Source of the volunteer's decisions.
+
+    :return: Number of tasks actually taken, less than `loops` if tasks ran out.
+    """
+    url = "/type/{}/".format(BenchType.type_name)
+
+    def call(route: str, path: str, **kwargs: Any) -> dict[str, Any]:
+        with counter.route(route):
+            started = time.perf_counter()
+            resp = client.open(url + path, **kwargs)
+            elapsed = time.perf_counter() - started
+
+        if resp.status_code >= 500:
+            raise click.ClickException("{} failed with {}: {!r}".format(path, resp.status_code, resp.data[:200]))
+
+        with lock:
+            results[route].timings.append(elapsed)
+
+        return resp.get_json(silent=True) or {}
+
+    for taken in range(loops):
+        task = call("next", "next", method="GET").get("result", {}).get("task")
+
+        if not task:
+            return taken
+
+        activity = json.dumps([{"task": task["id"], "seconds": rng.randint(5, 60)}])
+        call("activity", "activity", method="POST", data={"activity": activity})
+
+        if rng.random() < skip_ratio:
+            call("skip", "skip/{}".format(task["id"]), method="POST")
+        else:
+            call("done", "done/{}".format(task["id"]), method="POST", data={"result": json.dumps({"bench": True})})
+
+    return loops
+
+
+def report(results: dict[str, Result], counts: dict[str, int], elapsed: float, tasks: int) -> dict[str, Any]:
+    """
+    :param results: Timings per route.
+    :param counts: Commands per route.
+    :param elapsed: Wall time of the run, seconds.
+    :param tasks: Number of tasks taken.
+
+    :return: Summary of the run.
+    """
+    summary: dict[str, Any] = {
+        "tasks_per_second": tasks / elapsed,
+        "requests_per_second": sum(len(r.timings) for r in results.values()) / elapsed,
+        "routes": {},
+    }
+
+    for route, result in results.items():
+        ops = len(result.timings)
+
+        if not ops:
+            continue
+
+        summary["routes"][route] = {
+            "ops": ops,
+            "mean": statistics.fmean(result.timings),
+            "p50": result.percentile(0.5),
+            "p95": result.percentile(0.95),
+            "p99": result.percentile(0.99),
+            "commands_per_op": counts[route] / ops,
+        }
+
+    return summary
+
+
+def echo(summary: dict[str, Any], baseline: dict[str, Any] | None) -> None:
+    """
+    Prints the summary, with the change against the baseline if given.
+
+    :param summary: Summary of the run.
+    :param baseline: Summary of an earlier run.
+    """
+
+    def delta(current: float, before: float | None) -> str:
+        if not current or not before:
+            return ""
+
+        return " ({:+.1%})".format(current / before - 1)
+
+    before = (baseline or {}).get("routes", {})
+
+    for route, stats in summary["routes"].items():
+        was = before.get(route, {})
+
+        click.echo(
+            "{:<9} ops={:<7} p50={:.3f}ms{} p95={:.3f}ms{} p99={:.3f}ms{} round-trips/op={:.2f}{}".format(
+                route,
+                stats["ops"],
+                stats["p50"] * 1000,
+                delta(stats["p50"], was.get("p50")),
+                stats["p95"] * 1000,
+                delta(stats["p95"], was.get("p95")),
+                stats["p99"] * 1000,
+                delta(stats["p99"], was.get("p99")),
+                stats["commands_per_op"],
+                delta(stats["commands_per_op"], was.get("commands_per_op")),
+            )
+        )
+
+    click.echo(
+        "throughput: {:.1f} tasks/s{}, {:.1f} requests/s{}".format(
+            summary["tasks_per_second"],
+            delta(summary["tasks_per_second"], (baseline or {}).get("tasks_per_second")),
+            summary["requests_per_second"],
+            delta(summary["requests_per_second"], (baseline or {}).get("requests_per_second")),
+        )
+    )
+
+
+@click.command()
+@click.option("--volunteers", default=8, show_default=True, help="Concurrent volunteers.")
+@click.option("--loops", default=100, show_default=True, help="Tasks each volunteer takes.")
+@click.option("--tasks", default=10_000, show_default=True, help="Size of the batch to seed.")
+@click.option("--skip-ratio", default=0.1, show_default=True, help="Share of tasks skipped.")
+@click.option("--seed", "rng_seed", default=0, show_default=True, help="Seed of volunteers' decisions.")
+@click.option("--keep", is_flag=True, help="Don't drop the database afterwards.")
+@click.option("--reuse", is_flag=True, help="Run against the tasks kept by an earlier run.")
+@click.option("--save", type=click.Path(dir_okay=False), help="Write the summary to a JSON file.")
+@click.option("--baseline", type=click.File(), help="Summary of an earlier run to compare with.")
+def main(
+    volunteers: int,
+    loops: int,
+    tasks: int,
+    skip_ratio: float,
+    rng_seed: int,
+    save: str | None,
+    baseline: Any,
+    *,
+    keep: bool,
+    reuse: bool,
+) -> None:
+    uri = os.environ.get("BENCHMARK_MONGODB_URI", "mongodb://localhost:27017/vulyk_benchmark")
+    counter = RouteCommandCounter()
+    settings.MONGODB_SETTINGS.update(HOST=uri, DB=uri_parser.parse_uri(uri)["database"] or "vulyk_benchmark", PORT=None)
+    # registered before the application's client is created, so it sees its commands
+    monitoring.register(counter)
+
+    settings.DEBUG = False
+    # volunteers share the address and the user agent of the test client
+    settings.SESSION_PROTECTION = "basic"
+    settings.LOGGING_LOCATION = os.path.join(tempfile.gettempdir(), "vulyk_benchmark.log")
+
+    # the application connects to the database on import
+    from mongoengine.connection import get_db
+
+    from vulyk.app import TASKS_TYPES, app
+
+    task_type = TASKS_TYPES[BenchType.type_name] = BenchType(app.config)
+
+    if not reuse:
+        get_db().client.drop_database(get_db().name)
+        started = time.perf_counter()
+        seed(tasks)
+        click.echo("seeded {} tasks in {:.1f}s".format(tasks, time.perf_counter() - started))
+
+    clients = []
+
+    for i in range(volunteers):
+        user = (
+            User.objects(username="bench%s" % i).first()
+            or User(username="bench%s" % i, email="bench%s@example.com" % i).save()
+        )
+        client = app.test_client()
+
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user.id)
+            session["_fresh"] = True
+
+        clients.append(client)
+
+    results = {route: Result(route) for route in ROUTES}
+    counter.counts = dict.fromkeys(ROUTES, 0)
+    lock = threading.Lock()
+    taken: list[int] = []
+
+    def run(i: int) -> None:
+        rng = random.Random(rng_seed + i)  # noqa: S311
+        taken.append(volunteer(clients[i], counter, results, lock, loops, skip_ratio, rng))
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(volunteers)]
+    started = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    elapsed = time.perf_counter() - started
+
+    if task_type.activity_buffer is not None:
+        task_type.activity_buffer.flush()
+
+    if not keep:
+        get_db().client.drop_database(get_db().name)
+
+    if len(taken) < volunteers:
+        raise click.ClickException("some volunteers failed, see above")
+
+    summary = report(results, counter.counts, elapsed, sum(taken))
+    summary["parameters"] = {"volunteers": volunteers, "loops": loops, "tasks": tasks, "skip_ratio": skip_ratio}
+    echo(summary, json.load(baseline) if baseline else None)
+
+    if save:
+        with open(save, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
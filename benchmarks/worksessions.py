@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Closing a work session on the done and skip paths: the former
+count + first + update/delete sequence against a single findAndModify.
+On the done path both sides add the session up to the time totals and send
+`on_task_done` afterwards, so only the way the session is looked up and
+updated differs.
+
+    python -m benchmarks.worksessions [iterations]
+"""
+
+import sys
+from datetime import datetime, timezone
+
+import click
+from bson import ObjectId
+
+from benchmarks._common import connect_db, measure
+from vulyk.ext.worksession import WorkSessionManager
+from vulyk.models.stats import WorkSession, WorkTimeTotals
+from vulyk.models.tasks import AbstractAnswer, AbstractTask
+from vulyk.models.user import Group, User
+from vulyk.signals import on_task_done
+
+
+def legacy_end(manager: WorkSessionManager, task: AbstractTask, user_id: ObjectId, answer: AbstractAnswer) -> None:
+    rs = WorkSession.objects(user=user_id, task=task).order_by("-start_time")
+
+    if rs.count() > 0:
+        session = rs.first()
+        now = datetime.now(timezone.utc)
+        session.update(set__end_time=now, set__answer=answer)
+        # the rest is what `end_work_session` does as well
+        session.end_time = now.replace(tzinfo=session.start_time.tzinfo)
+        WorkTimeTotals.account(user_id, session)
+        on_task_done.send(manager, answer=answer)
+
+
+def legacy_delete(task: AbstractTask, user_id: ObjectId) -> None:
+    rs = WorkSession.objects(user=user_id, task=task).order_by("-start_time")
+
+    if rs.count() > 0:
+        rs.first().delete()
+
+
+def main(n: int) -> None:
+    with connect_db() as counter:
+        WorkSession.ensure_indexes()
+        manager = WorkSessionManager(WorkSession)
+        Group.objects.create(id="default", description="default")
+        user = User(username="bench", email="bench@example.com").save()
+        tasks = [
+            AbstractTask(id="task%s" % i, task_type="bench", batch=None, task_data={"bench": True}).save()
+            for i in range(n)
+        ]
+        answers = [
+            AbstractAnswer(task=task, created_by=user, task_type="bench", result={"bench": True}).save()
+            for task in tasks
+        ]
+
+        def start(i: int) -> None:
+            manager.start_work_session(tasks[i], user.id)
+
+        results = [
+            measure(
+                "done: count+first+update",
+                counter,
+                lambda i: legacy_end(manager, tasks[i], user.id, answers[i]),
+                start,
+                n,
+            ),
+            measure(
+                "done: find_one_and_update",
+                counter,
+                lambda i: manager.end_work_session(tasks[i], user.id, answers[i]),
+                start,
+                n,
+            ),
+            measure("skip: count+first+delete", counter, lambda i: legacy_delete(tasks[i], user.id), start, n),
+            measure(
+                "skip: find_one_and_delete", counter, lambda i: manager.delete_work_session(tasks[i], user.id), start, n
+            ),
+        ]
+
+    for result in results:
+        click.echo(str(result))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
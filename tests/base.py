@@ -6,11 +6,77 @@ test_cli
 """
 
 import unittest
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from typing import Any
+from unittest.mock import patch
 
+from mongoengine import Document
 from mongoengine.connection import register_connection
 
 from vulyk import settings
 
+# collection methods that send a request to the server
+ROUND_TRIP_METHODS = frozenset(
+    [
+        "aggregate",
+        "bulk_write",
+        "count_documents",
+        "delete_many",
+        "delete_one",
+        "find",
+        "find_one",
+        "find_one_and_delete",
+        "find_one_and_update",
+        "insert_many",
+        "insert_one",
+        "update_many",
+        "update_one",
+    ]
+)
+
+
+class _CountingCollection:
+    def __init__(self, collection: Any, counter: Counter) -> None:
+        self._collection = collection
+        self._counter = counter
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._collection, name)
+
+        if name == "with_options":
+            return lambda *args, **kwargs: _CountingCollection(attr(*args, **kwargs), self._counter)
+
+        if name not in ROUND_TRIP_METHODS:
+            return attr
+
+        def counted(*args: Any, **kwargs: Any) -> Any:
+            self._counter[self._collection.name] += 1
+
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+@contextmanager
+def count_queries(*models: type[Document]) -> Iterator[Counter]:
+    """
+    Counts requests sent to collections of given models.
+
+    :param models: Models to watch.
+
+    :return: Counter of requests per collection name.
+    """
+    counter: Counter = Counter()
+
+    with ExitStack() as stack:
+        for model in models:
+            collection = _CountingCollection(model._get_collection(), counter)  # noqa: SLF001
+            stack.enter_context(patch.object(model, "_collection", collection, create=True))
+
+        yield counter
+
 
 class BaseTest(unittest.TestCase):
     DB_NAME = "vulyk_test"
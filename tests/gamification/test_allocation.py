@@ -154,6 +154,51 @@ class TestAllocationOfMoneyAndPoints(BaseTest):
         self.assertEqual(ev.timestamp, state.last_changed)
         self.assertEqual(state.achievements, {rule.id: rule})
 
+    def test_bulk_allocation_badge_given(self) -> None:
+        task_type = FakeType({})
+        TASKS_TYPES[task_type.type_name] = task_type
+        self.BATCH.update(set__tasks_count=2)
+
+        for i in range(2):
+            task = task_type.task_model(
+                id="task%s" % i,
+                task_type=task_type.type_name,
+                batch=self.BATCH,
+                closed=False,
+                users_count=0,
+                users_processed=[],
+                users_skipped=[],
+                task_data={"data": "data"},
+            ).save()
+            task_type.work_session_manager.start_work_session(task, self.USER.id)
+
+        rule = Rule(
+            badge="Faithful Fury",
+            name="rule_1",
+            description="Kill two flies",
+            bonus=3,
+            tasks_number=2,
+            days_number=0,
+            is_weekend=False,
+            is_adjacent=False,
+            rule_id="100",
+        )
+        RuleModel.from_rule(rule).save()
+
+        task_type.on_tasks_done_bulk(self.USER, [("task0", {"result": "result"}), ("task1", {"result": "result"})])
+
+        events = [e.to_event() for e in EventModel.objects.filter(user=self.USER).order_by("answer")]
+        state = UserStateModel.get_or_create_by_user(user=self.USER)
+
+        self.assertEqual(len(events), 2)
+        self.assertEqual([e.points_given for e in events], [Decimal("1.0"), Decimal("4.0")])
+        self.assertEqual([e.achievements for e in events], [[], [rule]])
+        self.assertEqual([e.level_given for e in events], [None, 1])
+
+        self.assertEqual(state.points, Decimal("5.0"))
+        self.assertEqual(state.potential_coins, Decimal("2.0"))
+        self.assertEqual(state.achievements, {rule.id: rule})
+
     def test_double_allocation(self) -> None:
         task_type = FakeType({})
         TASKS_TYPES[task_type.type_name] = task_type
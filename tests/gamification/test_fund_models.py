@@ -3,24 +3,39 @@
 test_fund_models
 """
 
+import os
+import tempfile
 import unittest
 from io import BytesIO
+from unittest.mock import patch
 
 import flask
 from PIL import Image, ImageChops
 
 from vulyk import utils
 from vulyk.blueprints.gamification import gamification
+from vulyk.blueprints.gamification.logos import LogoCache
 from vulyk.blueprints.gamification.models.foundations import FundFilterBy, FundModel
 
-from ..base import BaseTest
+from ..base import BaseTest, count_queries
 from .fixtures import FixtureFund
 
 
 class TestFundModels(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self._logos = tempfile.TemporaryDirectory()
+        self._config = dict(gamification.config)
+        gamification.configure({"logo_cache_folder": self._logos.name, "logo_sizes": [64]})
+
     def tearDown(self) -> None:
         super().tearDown()
 
+        gamification.config.clear()
+        gamification.config.update(self._config)
+        self._logos.cleanup()
+
         FundModel.objects.delete()
         FundModel._get_db()["images.files"].drop()
         FundModel._get_db()["images.chunks"].drop()
@@ -52,6 +67,152 @@ class TestFundModels(BaseTest):
         self.assertEqual(a.size, b.size)
         self.assertIsNone(ImageChops.difference(a, b).getbbox(), "Returned logo doesn't match expected image")
 
+    @staticmethod
+    def _save_fund(fund_id: str) -> FundModel:
+        return FundModel(
+            id=fund_id,
+            name=fund_id,
+            description=FixtureFund.FUND_DESCRIPTION,
+            donatable=True,
+        ).save()
+
+    def test_logo_not_modified(self) -> None:
+        app = flask.Flask("test")
+        app.config.from_object("vulyk.settings")
+        app.register_blueprint(gamification, url_prefix="/gamification")
+        client = app.test_client()
+        url = "/gamification/funds/{id}/logo".format(id=FixtureFund.get_fund().id)
+
+        resp = client.get(url)
+        self.assertEqual(resp.status_code, utils.HTTPStatus.OK)
+        self.assertIsNotNone(resp.headers.get("ETag"))
+        self.assertEqual(resp.headers["Cache-Control"], utils.CACHE_REVALIDATE)
+
+        with count_queries(FundModel) as queries:
+            cached = client.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+
+        self.assertEqual(cached.status_code, utils.HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(cached.data, b"")
+        self.assertEqual(cached.headers["ETag"], resp.headers["ETag"])
+        # the logo isn't read from GridFS
+        self.assertEqual(dict(queries), {"gamification.funds": 1})
+
+        cached = client.get(url, headers={"If-Modified-Since": resp.headers["Last-Modified"]})
+        self.assertEqual(cached.status_code, utils.HTTPStatus.NOT_MODIFIED)
+
+        fund = FundModel.objects.get(id=FixtureFund.FUND_ID)
+        fund.name = "Renamed"
+        fund.save()
+
+        resp = client.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+        self.assertEqual(resp.status_code, utils.HTTPStatus.OK)
+        self.assertEqual(resp.mimetype, "image/png")
+
+        self.assertEqual(client.get("/gamification/funds/none/logo").status_code, utils.HTTPStatus.NOT_FOUND)
+
+    def test_resized_logo(self) -> None:
+        app = flask.Flask("test")
+        app.config.from_object("vulyk.settings")
+        app.register_blueprint(gamification, url_prefix="/gamification")
+        client = app.test_client()
+        url = "/gamification/funds/{id}/logo?size=64".format(id=FixtureFund.get_fund().id)
+
+        with patch.object(LogoCache, "_resize", wraps=LogoCache._resize) as resize:
+            resp = client.get(url)
+            self.assertEqual(resp.status_code, utils.HTTPStatus.OK)
+            self.assertEqual(resp.mimetype, "image/png")
+            self.assertEqual(resp.headers["Cache-Control"], "public, max-age=86400")
+            self.assertLessEqual(max(Image.open(BytesIO(resp.data)).size), 64)
+
+            cached = client.get(url)
+            self.assertEqual(cached.data, resp.data)
+            self.assertEqual(resize.call_count, 1)
+
+        cached = client.get(url, headers={"If-None-Match": resp.headers["ETag"]})
+        self.assertEqual(cached.status_code, utils.HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(cached.headers["Cache-Control"], "public, max-age=86400")
+
+    def test_resized_cmyk_logo(self) -> None:
+        original = BytesIO()
+        Image.new("CMYK", (128, 96), (0, 255, 255, 0)).save(original, format="JPEG")
+        original.seek(0)
+        path = os.path.join(self._logos.name, "cmyk", "logo-64.png")
+
+        LogoCache._resize(original, 64, path)
+
+        with Image.open(path) as resized:
+            self.assertEqual(resized.format, "PNG")
+            self.assertEqual(resized.mode, "RGB")
+            self.assertEqual(resized.size, (64, 48))
+
+    def test_resized_logo_unknown_size(self) -> None:
+        app = flask.Flask("test")
+        app.config.from_object("vulyk.settings")
+        app.register_blueprint(gamification, url_prefix="/gamification")
+        fund = self._save_fund("fund1")
+
+        resp = app.test_client().get("/gamification/funds/{id}/logo?size=65".format(id=fund.id))
+        self.assertEqual(resp.status_code, utils.HTTPStatus.NOT_FOUND)
+
+        self.assertRaises(ValueError, lambda: gamification.logos.get(fund.id, 65))
+        self.assertIsNone(gamification.logos.get(fund.id, 64))
+
+    def test_resized_logos_dropped_on_change(self) -> None:
+        fund = self._save_fund("../fund1")
+        folder = os.path.join(self._logos.name, fund.id.encode().hex())
+        os.makedirs(folder)
+
+        fund.name = "Renamed"
+        fund.save()
+
+        self.assertFalse(os.path.exists(folder))
+        self.assertTrue(os.path.exists(self._logos.name))
+
+    def test_funds_not_modified(self) -> None:
+        app = flask.Flask("test")
+        app.config.from_object("vulyk.settings")
+        app.register_blueprint(gamification, url_prefix="/gamification")
+        client = app.test_client()
+        self._save_fund("fund1")
+
+        resp = client.get("/gamification/funds")
+        etag = resp.headers["ETag"]
+        self.assertEqual(resp.status_code, utils.HTTPStatus.OK)
+        self.assertEqual(resp.headers["Cache-Control"], utils.CACHE_REVALIDATE)
+        self.assertEqual(len(resp.json["result"]["funds"]), 1)
+
+        resp = client.get("/gamification/funds", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, utils.HTTPStatus.NOT_MODIFIED)
+
+        fund = FundModel.objects.get(id="fund1")
+        fund.name = "Renamed"
+        fund.save()
+
+        resp = client.get("/gamification/funds", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, utils.HTTPStatus.OK)
+        self.assertNotEqual(resp.headers["ETag"], etag)
+        self.assertEqual(resp.json["result"]["funds"][0]["name"], "Renamed")
+
+        etag = resp.headers["ETag"]
+        FundModel.objects(id="fund1").delete()
+
+        resp = client.get("/gamification/funds", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, utils.HTTPStatus.OK)
+        self.assertEqual(resp.json["result"]["funds"], [])
+
+    def test_version_bumped_on_save(self) -> None:
+        fund = self._save_fund(FixtureFund.FUND_ID)
+        version = FundModel.version_of(fund.id)
+
+        self.assertEqual(fund.version, 1)
+        self.assertIsNotNone(fund.updated_at)
+
+        fund.save()
+
+        self.assertEqual(FundModel.objects.get(id=fund.id).version, 2)
+        self.assertNotEqual(FundModel.version_of(fund.id), version)
+        self.assertIsNone(FundModel.version_of("none"))
+
     def test_fund_to_dict(self) -> None:
         fund = FixtureFund.get_fund()
         expected = {
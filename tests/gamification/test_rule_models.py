@@ -3,7 +3,12 @@
 test_rule_models
 """
 
+import flask
+
+from vulyk import utils
+from vulyk.blueprints.gamification import gamification
 from vulyk.blueprints.gamification.core.rules import ProjectRule, Rule
+from vulyk.blueprints.gamification.models.rules import RuleModel
 
 from ..base import BaseTest
 
@@ -19,6 +24,11 @@ class TestRuleModels(BaseTest):
     IS_ADJACENT = True
     TASK_TYPE_NAME = "declarations"
 
+    def tearDown(self):
+        RuleModel.objects.delete()
+
+        super().tearDown()
+
     def test_task_rule_to_dict(self):
         rule = Rule(
             badge=self.BADGE_IMAGE,
@@ -98,3 +108,39 @@ class TestRuleModels(BaseTest):
         }
 
         self.assertDictEqual(expected, rule.to_dict())
+
+    def test_badges_not_modified(self):
+        app = flask.Flask("test")
+        app.config.from_object("vulyk.settings")
+        app.register_blueprint(gamification, url_prefix="/gamification")
+        client = app.test_client()
+        rule = Rule(
+            badge=self.BADGE_IMAGE,
+            name=self.RULE_NAME,
+            description=self.RULE_DESCRIPTION,
+            bonus=0,
+            tasks_number=self.TASKS_NUMBER,
+            days_number=0,
+            is_weekend=False,
+            is_adjacent=False,
+            rule_id=str(self.RULE_ID),
+        )
+        RuleModel.from_rule(rule).save()
+
+        resp = client.get("/gamification/badges")
+        etag = resp.headers["ETag"]
+        self.assertEqual(resp.status_code, utils.HTTPStatus.OK)
+        self.assertEqual(resp.headers["Cache-Control"], utils.CACHE_REVALIDATE)
+        self.assertEqual(len(resp.json["result"]["badges"]), 1)
+
+        for url in ("/gamification/badges", "/gamification/badges/{}/weak".format(self.TASK_TYPE_NAME)):
+            resp = client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(resp.status_code, utils.HTTPStatus.NOT_MODIFIED)
+
+        model = RuleModel.objects.get(id=str(self.RULE_ID))
+        model.bonus = 10
+        model.save()
+
+        resp = client.get("/gamification/badges", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, utils.HTTPStatus.OK)
+        self.assertEqual(resp.json["result"]["badges"][0]["bonus"], 10)
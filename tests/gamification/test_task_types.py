@@ -9,7 +9,7 @@ import unittest
 from unittest.mock import patch
 
 from vulyk.blueprints.gamification.models.task_types import COINS_PER_TASK_KEY, IMPORTANT_KEY, POINTS_PER_TASK_KEY
-from vulyk.models.stats import WorkSession
+from vulyk.models.stats import TaskCounters, WorkSession
 from vulyk.models.tasks import AbstractAnswer, AbstractTask, Batch
 from vulyk.models.user import Group, User
 
@@ -42,7 +42,7 @@ class TestTaskTypes(BaseTest):
         super().tearDown()
 
     # region Task type
-    @patch("mongoengine.queryset.base.BaseQuerySet.count", lambda *a: 22)
+    @patch("vulyk.models.stats.TaskCounters.of_type", lambda *a: TaskCounters(tasks=22, closed=22))
     def test_to_dict_no_batch(self):
         got = {
             "name": "Fake name",
@@ -57,7 +57,7 @@ class TestTaskTypes(BaseTest):
 
         self.assertDictEqual(FakeType({}).to_dict(), got)
 
-    @patch("mongoengine.queryset.base.BaseQuerySet.count", lambda *a: 33)
+    @patch("vulyk.models.stats.TaskCounters.of_type", lambda *a: TaskCounters(tasks=33, closed=33))
     def test_to_dict_one_batch(self):
         got = {
             "name": "Fake name",
@@ -89,7 +89,7 @@ class TestTaskTypes(BaseTest):
 
         self.assertDictEqual(task_type.to_dict(), got)
 
-    @patch("mongoengine.queryset.base.BaseQuerySet.count", lambda *a: 33)
+    @patch("vulyk.models.stats.TaskCounters.of_type", lambda *a: TaskCounters(tasks=33, closed=33))
     def test_to_dict_one_batch_but_closed(self):
         got = {
             "name": "Fake name",
@@ -118,7 +118,7 @@ class TestTaskTypes(BaseTest):
 
         self.assertDictEqual(task_type.to_dict(), got)
 
-    @patch("mongoengine.queryset.base.BaseQuerySet.count", lambda *a: 44)
+    @patch("vulyk.models.stats.TaskCounters.of_type", lambda *a: TaskCounters(tasks=44, closed=44))
     def test_to_dict_two_batch(self):
         got = {
             "name": "Fake name",
@@ -3,7 +3,9 @@
 test_batch_model
 """
 
+import threading
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
 from vulyk.models.tasks import Batch, BatchUpdateResult
 from vulyk.signals import on_batch_done
@@ -78,6 +80,45 @@ class TestBatchModel(BaseTest):
         self.assertEqual(batch.tasks_processed, 5)
         self.assertEqual(called_times, 0)
 
+    def test_task_done_overshooting(self) -> None:
+        # the counter has drifted, tasks done at once would exceed the count
+        batch = Batch(
+            id="default", task_type=self.TASK_TYPE, tasks_count=5, tasks_processed=4, closed=False, batch_meta={}
+        ).save()
+
+        result = Batch.task_done_in(batch.id, amount=3)
+        batch.reload()
+
+        self.assertEqual(result, BatchUpdateResult(success=True, closed=True))
+        self.assertTrue(batch.closed)
+        self.assertEqual(batch.tasks_processed, 5)
+
+    def test_task_done_concurrent(self) -> None:
+        batch = Batch(
+            id="default", task_type=self.TASK_TYPE, tasks_count=50, tasks_processed=0, closed=False, batch_meta={}
+        ).save()
+        called_times = 0
+        lock = threading.Lock()
+
+        @on_batch_done.connect
+        def listen(sender: Batch) -> None:
+            nonlocal called_times
+            assert sender.closed, "Batch {!r} isn't closed".format(sender)
+
+            with lock:
+                called_times += 1
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda _: Batch.task_done_in(batch.id), range(80)))
+
+        batch.reload()
+
+        self.assertEqual(sum(r.success for r in results), 50)
+        self.assertEqual(sum(r.closed for r in results), 1)
+        self.assertEqual(batch.tasks_processed, 50)
+        self.assertTrue(batch.closed)
+        self.assertEqual(called_times, 1)
+
 
 if __name__ == "__main__":
     unittest.main()
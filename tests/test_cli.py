@@ -8,13 +8,16 @@ test_cli
 import gzip
 import unittest
 from datetime import datetime, timezone
+from decimal import Decimal
 from typing import Any, ClassVar
 
 import bz2file
 import click
 from click.testing import CliRunner
 
-from vulyk.cli import admin, batches, db, is_initialized, project_init
+from vulyk.blueprints.gamification.models.events import EventModel
+from vulyk.blueprints.gamification.models.state import UserStateModel
+from vulyk.cli import admin, batches, db, is_initialized, project_init, seed
 from vulyk.control import batch_remove, cli
 from vulyk.models.stats import WorkSession
 from vulyk.models.task_types import AbstractTaskType
@@ -296,6 +299,94 @@ class TestBatches(BaseTest):
         self.assertEqual(WorkSession.objects(task_type=self.TASK_TYPE.type_name).count(), 0)
 
 
+class TestSeed(BaseTest):
+    PLAN = seed.SeedPlan(
+        task_type=FakeType.type_name,
+        task_model=FakeType.task_model,
+        answer_model=FakeType.answer_model,
+        prefix="seed",
+        users=10,
+        groups=2,
+        batches=3,
+        tasks=50,
+        redundancy=3,
+        done=0.5,
+        data_size=64,
+        until=datetime(2024, 6, 1, tzinfo=timezone.utc),
+        days=30,
+        seed=42,
+        batch_meta={"points_per_task": 1.0, "coins_per_task": 2.0},
+        points=Decimal(1),
+        coins=Decimal(2),
+    )
+
+    def tearDown(self) -> None:
+        for model in (User, Group, Batch, AbstractTask, AbstractAnswer, WorkSession, EventModel, UserStateModel):
+            model.objects.delete()
+
+        super().tearDown()
+
+    def seed(self, plan: seed.SeedPlan, chunk: int) -> int:
+        return seed.seed(plan, lambda points: int(points // 10), {}, chunk=chunk)
+
+    def test_seed(self) -> None:
+        progress = []
+        documents = seed.seed(self.PLAN, lambda points: int(points // 10), {}, chunk=20, progress=progress.append)
+        answers = FakeType.answer_model.objects.count()
+        closed = FakeType.task_model.objects(closed=True)
+
+        self.assertEqual(progress, [20, 20, 10])
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(FakeType.task_model.objects.count(), 50)
+        self.assertEqual(len(FakeType.task_model.objects.first().task_data["text"]), 64)
+        self.assertEqual(WorkSession.objects(answer__ne=None).count(), answers)
+        self.assertEqual(EventModel.objects.count(), answers)
+        self.assertEqual(sum(u.processed for u in User.objects), answers)
+        self.assertEqual(sum(b.tasks_count for b in Batch.objects), 50)
+        self.assertEqual(sum(b.tasks_processed for b in Batch.objects), closed.count())
+        self.assertTrue(all(t.users_count == 3 for t in closed))
+        self.assertTrue(User.objects.first().is_eligible_for(FakeType.type_name))
+        self.assertEqual(documents, 10 + 2 + 3 + 50 + answers * 3 + UserStateModel.objects.count())
+
+        for state in UserStateModel.objects:
+            self.assertEqual(state.points, state.user.processed)
+            self.assertEqual(state.actual_coins + state.potential_coins, state.user.processed * 2)
+            self.assertEqual(state.level, state.user.processed // 10)
+
+        for session in WorkSession.objects:
+            self.assertLess(session.start_time, session.end_time)
+            self.assertGreaterEqual(session.end_time, self.PLAN.since.replace(tzinfo=None))
+            self.assertLess(session.end_time, self.PLAN.until.replace(tzinfo=None))
+
+    def test_deterministic(self) -> None:
+        def snapshot() -> list[Any]:
+            return [
+                list(m.objects.as_pymongo().order_by("id"))
+                for m in (User, Batch, AbstractTask, AbstractAnswer, WorkSession, EventModel)
+            ]
+
+        self.seed(self.PLAN, chunk=7)
+        first = snapshot()
+        self.tearDown()
+        self.seed(self.PLAN, chunk=50)
+
+        self.assertEqual(snapshot(), first)
+
+    def test_not_gamified(self) -> None:
+        self.seed(self.PLAN._replace(points=None, coins=None), chunk=50)
+
+        self.assertGreater(AbstractAnswer.objects.count(), 0)
+        self.assertEqual(EventModel.objects.count(), 0)
+        self.assertEqual(UserStateModel.objects.count(), 0)
+
+    def test_prefix_taken(self) -> None:
+        self.seed(self.PLAN, chunk=50)
+
+        with self.assertRaises(click.BadParameter):
+            self.seed(self.PLAN, chunk=50)
+
+
 class TestProjectInit(BaseTest):
     def setUp(self) -> None:
         super().setUp()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_compression
+"""
+
+import gzip
+import unittest
+import zlib
+from typing import ClassVar
+
+import flask
+
+from vulyk import utils
+from vulyk.ext import compression
+from vulyk.ext.compression import Compression
+
+from .base import BaseTest
+
+
+class TestCompression(BaseTest):
+    BODY: ClassVar[dict[str, list[str]]] = {"events": ["event {}".format(i) for i in range(100)]}
+
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.app = flask.Flask("test")
+        Compression(["application/json", "text/html"], min_size=100).init_app(self.app)
+
+        self.app.add_url_rule("/json", "json", lambda: utils.json_response(self.BODY))
+        self.app.add_url_rule("/small", "small", lambda: utils.json_response({}))
+        self.app.add_url_rule("/text", "text", lambda: flask.Response("x" * 1000, mimetype="text/csv"))
+        self.app.add_url_rule(
+            "/stream",
+            "stream",
+            lambda: flask.Response(("<p>{}</p>".format(i) for i in range(100)), mimetype="text/html"),
+        )
+        self.app.add_url_rule(
+            "/tagged",
+            "tagged",
+            lambda: utils.conditional_response(("tag", None), lambda: utils.json_response(self.BODY)),
+        )
+        self.client = self.app.test_client()
+
+    def test_gzip(self) -> None:
+        plain = self.client.get("/json")
+        resp = self.client.get("/json", headers={"Accept-Encoding": "gzip, deflate"})
+
+        self.assertNotIn("Content-Encoding", plain.headers)
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertEqual(resp.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(resp.data), plain.data)
+        self.assertEqual(int(resp.headers["Content-Length"]), len(resp.data))
+        self.assertLess(len(resp.data), len(plain.data))
+
+    def test_not_compressed(self) -> None:
+        for url, headers in (
+            ("/small", {"Accept-Encoding": "gzip"}),
+            ("/text", {"Accept-Encoding": "gzip"}),
+            ("/json", {"Accept-Encoding": "identity"}),
+            ("/json", {"Accept-Encoding": "gzip;q=0"}),
+        ):
+            resp = self.client.get(url, headers=headers)
+
+            self.assertNotIn("Content-Encoding", resp.headers, url)
+
+    def test_stream(self) -> None:
+        resp = self.client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Length", resp.headers)
+        self.assertEqual(gzip.decompress(resp.data).decode(), "".join("<p>{}</p>".format(i) for i in range(100)))
+
+    def test_stream_chunks(self) -> None:
+        with self.app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+            response = flask.Response((c for c in ("first", "second")), mimetype="text/html")
+            chunks = list(Compression(["text/html"]).compress(response).response)
+
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        # every chunk is sent as soon as it's generated
+        self.assertEqual(decompressor.decompress(chunks[0]), b"first")
+        self.assertEqual(decompressor.decompress(chunks[1]), b"second")
+
+    def test_etag(self) -> None:
+        resp = self.client.get("/tagged", headers={"Accept-Encoding": "gzip"})
+
+        self.assertEqual(resp.headers["ETag"], 'W/"tag"')
+
+        resp = self.client.get("/tagged", headers={"Accept-Encoding": "gzip", "If-None-Match": resp.headers["ETag"]})
+
+        self.assertEqual(resp.status_code, utils.HTTPStatus.NOT_MODIFIED)
+        self.assertNotIn("Content-Encoding", resp.headers)
+        # the tag the client has stays the same
+        self.assertEqual(resp.headers["ETag"], 'W/"tag"')
+        self.assertIn("Accept-Encoding", resp.headers["Vary"])
+
+        resp = self.client.get("/tagged", headers={"Accept-Encoding": "gzip", "If-None-Match": resp.headers["ETag"]})
+
+        self.assertEqual(resp.status_code, utils.HTTPStatus.NOT_MODIFIED)
+
+    @unittest.skipIf(compression.brotli is None, "brotli isn't installed")
+    def test_brotli(self) -> None:
+        plain = self.client.get("/json")
+        resp = self.client.get("/json", headers={"Accept-Encoding": "gzip, br"})
+
+        self.assertEqual(resp.headers["Content-Encoding"], "br")
+        self.assertEqual(compression.brotli.decompress(resp.data), plain.data)
+
+
+if __name__ == "__main__":
+    unittest.main()
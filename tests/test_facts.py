@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_facts
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+
+from vulyk import cli
+from vulyk.ext.facts import Facts
+from vulyk.models.user import Group
+
+from .base import BaseTest, count_queries
+
+
+class TestFacts(BaseTest):
+    def tearDown(self) -> None:
+        Group.objects.delete()
+
+        super().tearDown()
+
+    def test_remembered_once_holds(self) -> None:
+        facts = Facts()
+        facts.register("initialized", cli.is_initialized)
+
+        self.assertFalse(facts.holds("initialized"))
+
+        Group.objects.create(id="default", description="default")
+
+        with count_queries(Group) as queries:
+            for _ in range(3):
+                self.assertTrue(facts.holds("initialized"))
+
+        self.assertEqual(sum(queries.values()), 1)
+
+        Group.objects.delete()
+
+        self.assertTrue(facts.holds("initialized"))
+
+        facts.reset("initialized")
+
+        self.assertFalse(facts.holds("initialized"))
+
+    def test_ttl(self) -> None:
+        facts = Facts(ttl=10)
+        probe = Mock(return_value=True)
+        facts.register("fact", probe)
+
+        with patch("vulyk.ext.facts.time.monotonic", return_value=100):
+            self.assertTrue(facts.holds("fact"))
+            self.assertTrue(facts.holds("fact"))
+
+        with patch("vulyk.ext.facts.time.monotonic", return_value=111):
+            self.assertTrue(facts.holds("fact"))
+
+        self.assertEqual(probe.call_count, 2)
+
+    def test_unknown(self) -> None:
+        self.assertRaises(KeyError, lambda: Facts().holds("unknown"))
+
+
+if __name__ == "__main__":
+    unittest.main()
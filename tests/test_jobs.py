@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_jobs
+"""
+
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import flask
+from blinker import Namespace
+
+from vulyk.ext.jobs import JobQueue, deferrable
+from vulyk.models.jobs import Job, JobLock
+from vulyk.models.user import Group, User
+
+from .base import BaseTest
+
+signals = Namespace()
+on_test_event = signals.signal("on_test_event")
+on_keyed_event = signals.signal("on_keyed_event")
+calls: list[tuple[Any, dict[str, Any]]] = []
+# number of keyed calls being made at the moment and the most seen at once
+running = {"now": 0, "max": 0}
+running_lock = threading.Lock()
+
+
+@deferrable(on_test_event)
+def record_call(sender: object, **kwargs: Any) -> None:
+    if kwargs.get("fail"):
+        raise ValueError("Told to fail")
+
+    calls.append((sender, kwargs))
+
+
+@deferrable(on_keyed_event, key=lambda sender, **kwargs: "user:{}".format(kwargs["user"].id))
+def record_keyed_call(sender: object, **kwargs: Any) -> None:
+    with running_lock:
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+
+    time.sleep(0.01)
+
+    with running_lock:
+        running["now"] -= 1
+
+    calls.append((sender, kwargs))
+
+
+class TestJobQueue(BaseTest):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+
+        Group.objects.create(description="test", id="default", allowed_types=[])
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        Group.objects.delete()
+
+        super().tearDownClass()
+
+    def tearDown(self) -> None:
+        Job.objects.delete()
+        JobLock.objects.delete()
+        User.objects.delete()
+        calls.clear()
+
+        super().tearDown()
+
+    def _app(self, *, deferred: bool) -> flask.Flask:
+        app = flask.Flask(__name__)
+        app.config["DEFERRED_LISTENERS"] = deferred
+
+        return app
+
+    def test_sync_by_default(self) -> None:
+        on_test_event.send("sender", value=1)
+
+        with self._app(deferred=False).app_context():
+            on_test_event.send("sender", value=2)
+
+        self.assertEqual(calls, [("sender", {"value": 1}), ("sender", {"value": 2})])
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_deferred(self) -> None:
+        user = User(username="user0", email="user0@email.com").save()
+
+        with self._app(deferred=True).app_context():
+            on_test_event.send(object(), user=user, value=1)
+
+        self.assertEqual(calls, [])
+        self.assertEqual(Job.objects.count(), 1)
+
+        queue = JobQueue()
+
+        self.assertTrue(queue.run_next())
+        self.assertFalse(queue.run_next())
+        self.assertEqual(calls, [(None, {"user": user, "value": 1})])
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_retry_and_fail(self) -> None:
+        queue = JobQueue(max_attempts=2)
+        job = queue.enqueue("{}.record_call".format(__name__), None, {"fail": True})
+
+        self.assertTrue(queue.run_next())
+
+        job.reload()
+
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("Told to fail", job.last_error)
+        # the retry is postponed
+        self.assertIsNone(queue.claim())
+
+        Job.objects(id=job.id).update(set__available_at=datetime.now(timezone.utc))
+
+        self.assertTrue(queue.run_next())
+
+        job.reload()
+
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertFalse(queue.run_next())
+
+    def test_expired_claim(self) -> None:
+        queue = JobQueue(lease=timedelta(seconds=-1))
+        queue.enqueue("{}.record_call".format(__name__), None, {})
+
+        first = queue.claim()
+        second = queue.claim()
+
+        self.assertIsNotNone(first)
+        self.assertEqual(first.id, second.id)
+        self.assertFalse(queue.ack(first))
+        self.assertTrue(queue.ack(second))
+
+    def test_expired_claim_out_of_attempts(self) -> None:
+        queue = JobQueue(lease=timedelta(seconds=-1), max_attempts=2)
+        job = queue.enqueue("{}.record_call".format(__name__), None, {})
+
+        self.assertIsNotNone(queue.claim())
+        self.assertIsNotNone(queue.claim())
+        self.assertIsNone(queue.claim())
+
+        job.reload()
+
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(job.claim)
+        self.assertIn("lease has expired", job.last_error)
+
+    def test_work_burst(self) -> None:
+        queue = JobQueue()
+
+        for i in range(20):
+            queue.enqueue("{}.record_call".format(__name__), None, {"value": i})
+
+        queue.work(threads=4, poll_interval=0.1, stop=threading.Event(), burst=True)
+
+        self.assertEqual(sorted(kw["value"] for _, kw in calls), list(range(20)))
+        self.assertEqual(Job.objects.count(), 0)
+
+    def test_work_serialized_by_key(self) -> None:
+        queue = JobQueue()
+        users = [User(username="user%s" % i, email="user%s@email.com" % i).save() for i in range(2)]
+
+        with self._app(deferred=True).app_context():
+            for i in range(10):
+                on_keyed_event.send(None, user=users[i % 2], value=i)
+
+        self.assertEqual(Job.objects(key="user:%s" % users[0].id).count(), 5)
+        running["max"] = 0
+        queue.work(threads=4, poll_interval=0.1, stop=threading.Event(), burst=True)
+
+        self.assertEqual(sorted(kw["value"] for _, kw in calls), list(range(10)))
+        self.assertLessEqual(running["max"], 2)
+        self.assertEqual(Job.objects.count(), 0)
+        self.assertEqual(JobLock.objects.count(), 0)
+
+        # calls for one user are made in order
+        for user in users:
+            values = [kw["value"] for _, kw in calls if kw["user"] == user]
+            self.assertEqual(values, sorted(values))
+
+    def test_claim_skips_locked_key(self) -> None:
+        queue = JobQueue()
+        first = queue.enqueue("{}.record_call".format(__name__), None, {"value": 1}, key="user:1")
+        queue.enqueue("{}.record_call".format(__name__), None, {"value": 2}, key="user:1")
+        other = queue.enqueue("{}.record_call".format(__name__), None, {"value": 3}, key="user:2")
+
+        self.assertEqual(queue.claim().id, first.id)
+        # the second job of user 1 waits for the first one
+        self.assertEqual(queue.claim().id, other.id)
+        self.assertIsNone(queue.claim())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,9 +6,10 @@ test_leaderboard
 """
 
 import unittest
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
-from vulyk.ext.leaderboard import LeaderBoardManager
+from vulyk.ext.leaderboard import LeaderBoardManager, LeaderBoardWindow
+from vulyk.models.stats import AnswersRollup, LeaderBoardSnapshot
 from vulyk.models.tasks import AbstractAnswer, AbstractTask, Batch
 from vulyk.models.user import Group, User
 
@@ -36,6 +37,8 @@ class TestLeaderBoard(BaseTest):
         AbstractTask.objects.delete()
         AbstractAnswer.objects.delete()
         Batch.objects.delete()
+        LeaderBoardSnapshot.objects.delete()
+        AnswersRollup.objects.delete()
 
         super().tearDown()
 
@@ -106,6 +109,146 @@ class TestLeaderBoard(BaseTest):
             ],
         )
 
+    # region Snapshot cache
+    def test_cache_disabled_recomputes(self):
+        task_type = FakeType({})
+        manager = LeaderBoardManager(task_type.type_name, task_type.answer_model, User)
+        calls = []
+        manager._compute_leaders = lambda *_: calls.append(1) or []
+
+        manager.get_leaders()
+        manager.get_leaders()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(LeaderBoardSnapshot.objects.count(), 0)
+
+    def test_cache_hit(self):
+        task_type = FakeType({})
+        manager = LeaderBoardManager(task_type.type_name, task_type.answer_model, User, cache_ttl=60)
+        leaders = [("user1", 5), ("user0", 2)]
+        calls = []
+        manager._compute_leaders = lambda *_: calls.append(1) or leaders
+
+        self.assertEqual(manager.get_leaders(), leaders)
+        self.assertEqual(manager.get_leaders(), leaders)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(manager.cache_stats, {"hits": 1, "misses": 1, "refreshes": 1})
+
+    def test_cache_shared_between_workers(self):
+        task_type = FakeType({})
+        first = LeaderBoardManager(task_type.type_name, task_type.answer_model, User, cache_ttl=60)
+        second = LeaderBoardManager(task_type.type_name, task_type.answer_model, User, cache_ttl=60)
+        leaders = [("user1", 5), ("user0", 2)]
+        first._compute_leaders = lambda *_: leaders
+        second._compute_leaders = lambda *_: self.fail("Snapshot should have been reused")
+
+        first.get_leaders()
+
+        self.assertEqual(second.get_leaders(), leaders)
+        self.assertEqual(second.cache_stats, {"hits": 1, "misses": 0, "refreshes": 0})
+
+    def test_cache_stale_served_during_refresh(self):
+        task_type = FakeType({})
+        manager = LeaderBoardManager(task_type.type_name, task_type.answer_model, User, cache_ttl=60)
+        long_ago = datetime.now(timezone.utc) - timedelta(minutes=5)
+        LeaderBoardSnapshot(
+            id=task_type.type_name,
+            leaders=[["user0", 1]],
+            created_at=long_ago,
+            # another worker is rebuilding the snapshot right now
+            refresh_until=datetime.now(timezone.utc) + timedelta(seconds=30),
+        ).save()
+        manager._compute_leaders = lambda *_: self.fail("Refresh lease should have been respected")
+
+        self.assertEqual(manager.get_leaders(), [("user0", 1)])
+        self.assertEqual(manager.cache_stats, {"hits": 0, "misses": 1, "refreshes": 0})
+
+    def test_cache_expired_lease_is_taken_over(self):
+        task_type = FakeType({})
+        manager = LeaderBoardManager(task_type.type_name, task_type.answer_model, User, cache_ttl=60)
+        long_ago = datetime.now(timezone.utc) - timedelta(minutes=5)
+        LeaderBoardSnapshot(
+            id=task_type.type_name, leaders=[["user0", 1]], created_at=long_ago, refresh_until=long_ago
+        ).save()
+        manager._compute_leaders = lambda *_: [("user0", 2)]
+
+        self.assertEqual(manager.get_leaders(), [("user0", 2)])
+        self.assertEqual(manager.cache_stats["refreshes"], 1)
+        self.assertIsNone(LeaderBoardSnapshot.objects.get(id=task_type.type_name).refresh_until)
+
+    # endregion Snapshot cache
+
+    # region Time windows
+    def test_record_answer_rollup(self):
+        task_type = FakeType({})
+        manager = LeaderBoardManager(task_type.type_name, task_type.answer_model, User)
+        user = User(username="user0", email="user0@email.com").save()
+        now = datetime.now(timezone.utc)
+
+        manager.record_answer(user.id, now)
+        manager.record_answer(user.id, now)
+        manager.record_answer(user.id, now - timedelta(days=1))
+
+        rollup = AnswersRollup.objects.get(day=AnswersRollup.day_of(now), user=user)
+
+        self.assertEqual(rollup.answers, 2)
+        self.assertEqual(rollup.task_type, task_type.type_name)
+        self.assertEqual(AnswersRollup.objects.count(), 2)
+
+    def test_windowed_leaders(self):
+        task_type = FakeType({})
+        manager = LeaderBoardManager(task_type.type_name, task_type.answer_model, User)
+        users = [User(username="user%s" % i, email="user%s@email.com" % i).save() for i in range(2)]
+        now = datetime.now(timezone.utc)
+
+        manager.record_answer(users[0].id, now, 3)
+        manager.record_answer(users[1].id, now - timedelta(days=2), 2)
+        manager.record_answer(users[1].id, now - timedelta(days=20), 5)
+        manager.record_answer(users[1].id, now - timedelta(days=40), 100)
+        AnswersRollup.increment("other_type", users[1].id, now, 10)
+
+        self.assertEqual(manager.get_leaders(LeaderBoardWindow.WEEK), [(users[0].id, 3), (users[1].id, 2)])
+        self.assertEqual(manager.get_leaders(LeaderBoardWindow.MONTH), [(users[1].id, 7), (users[0].id, 3)])
+
+    def test_global_windowed_leaders(self):
+        task_type = FakeType({})
+        manager = LeaderBoardManager(None, task_type.answer_model, User)
+        users = [User(username="user%s" % i, email="user%s@email.com" % i).save() for i in range(2)]
+        now = datetime.now(timezone.utc)
+
+        AnswersRollup.increment(task_type.type_name, users[0].id, now, 3)
+        AnswersRollup.increment("other_type", users[1].id, now, 2)
+        AnswersRollup.increment("another_type", users[1].id, now, 2)
+        # global manager has no project to account answers for
+        manager.record_answer(users[0].id, now, 10)
+
+        self.assertEqual(manager.get_leaders(LeaderBoardWindow.WEEK), [(users[1].id, 4), (users[0].id, 3)])
+
+    def test_backfill_rollups(self):
+        task_type = FakeType({})
+        users = [User(username="user%s" % i, email="user%s@email.com" % i).save() for i in range(2)]
+        now = datetime.now(timezone.utc)
+
+        for i in range(3):
+            task = task_type.task_model(
+                id="task%s" % i, task_type=task_type.type_name, task_data={"data": "data"}
+            ).save()
+
+            for u in users[: i + 1]:
+                task_type.answer_model(
+                    task=task, created_by=u, created_at=now, task_type=task_type.type_name, result={}
+                ).save()
+
+        # stale counter must be overwritten
+        AnswersRollup.increment(task_type.type_name, users[0].id, now, 100)
+
+        self.assertEqual(AnswersRollup.backfill(task_type.answer_model, task_type.type_name), 2)
+        self.assertEqual(AnswersRollup.objects.get(user=users[0]).answers, 3)
+        self.assertEqual(AnswersRollup.objects.get(user=users[1]).answers, 2)
+
+    # endregion Time windows
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_metrics
+"""
+
+import unittest
+from unittest.mock import patch
+
+import flask
+from blinker import Namespace
+from pymongo.errors import PyMongoError
+
+from vulyk.ext import metrics
+from vulyk.ext.jobs import deferrable
+from vulyk.ext.metrics import Metrics
+from vulyk.models.stats import MetricsTotal
+from vulyk.models.tasks import AbstractTask
+from vulyk.models.user import Group, User
+
+from .base import BaseTest
+from .fixtures import FakeType
+
+
+class TestMetrics(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.metrics = Metrics()
+
+        self.app = flask.Flask("test")
+        self.app.config["METRICS_FLUSH_INTERVAL"] = 0
+        self.metrics.init_app(self.app)
+        self.app.add_url_rule("/hello", "hello", lambda: "hello")
+        self.client = self.app.test_client()
+
+    def tearDown(self) -> None:
+        MetricsTotal.objects.delete()
+        User.objects.delete()
+        Group.objects.delete()
+        AbstractTask.objects.delete()
+
+        super().tearDown()
+
+    def test_requests(self) -> None:
+        self.client.get("/hello")
+        self.client.get("/hello")
+        self.client.get("/nowhere")
+
+        lines = self.client.get("/metrics").data.decode().splitlines()
+
+        self.assertIn("# TYPE vulyk_http_requests_total counter", lines)
+        self.assertIn('vulyk_http_requests_total{endpoint="hello",method="GET",status="200"} 2', lines)
+        self.assertIn('vulyk_http_requests_total{endpoint="unmatched",method="GET",status="404"} 1', lines)
+        self.assertIn("# TYPE vulyk_http_request_duration_seconds histogram", lines)
+        self.assertIn('vulyk_http_request_duration_seconds_bucket{endpoint="hello",le="+Inf"} 2', lines)
+        self.assertIn('vulyk_http_request_duration_seconds_count{endpoint="hello"} 2', lines)
+
+    def test_histogram(self) -> None:
+        for value in (0.001, 0.005, 0.3, 20):
+            self.metrics.observe("duration", value, name='a "quoted"\nname')
+
+        lines = self.metrics.render().splitlines()
+        labels = 'name="a \\"quoted\\"\\nname"'
+
+        self.assertIn('duration_bucket{{{},le="0.005"}} 2'.format(labels), lines)
+        self.assertIn('duration_bucket{{{},le="0.25"}} 2'.format(labels), lines)
+        self.assertIn('duration_bucket{{{},le="0.5"}} 3'.format(labels), lines)
+        self.assertIn('duration_bucket{{{},le="10"}} 3'.format(labels), lines)
+        self.assertIn('duration_bucket{{{},le="+Inf"}} 4'.format(labels), lines)
+        self.assertIn("duration_sum{{{}}} 20.306".format(labels), lines)
+        self.assertIn("duration_count{{{}}} 4".format(labels), lines)
+
+    def test_workers_summed_up(self) -> None:
+        self.metrics.inc("vulyk_tasks_assigned_total", task_type="declarations")
+        self.metrics.observe("vulyk_listener_duration_seconds", 0.02, listener="listener")
+
+        MetricsTotal.add(
+            [{"name": "vulyk_tasks_assigned_total", "labels": {"task_type": "declarations"}, "value": 5}],
+            [
+                {
+                    "name": "vulyk_listener_duration_seconds",
+                    "labels": {"listener": "listener"},
+                    "buckets": [1] + [0] * len(metrics.BUCKETS),
+                    "sum": 0.001,
+                    "count": 1,
+                }
+            ],
+        )
+
+        lines = self.metrics.render().splitlines()
+
+        self.assertIn('vulyk_tasks_assigned_total{task_type="declarations"} 6', lines)
+        self.assertIn('vulyk_listener_duration_seconds_bucket{listener="listener",le="0.005"} 1', lines)
+        self.assertIn('vulyk_listener_duration_seconds_bucket{listener="listener",le="0.025"} 2', lines)
+        self.assertIn('vulyk_listener_duration_seconds_count{listener="listener"} 2', lines)
+        self.assertEqual(MetricsTotal.objects.count(), 2)
+
+    def test_totals_outlive_workers(self) -> None:
+        self.metrics.inc("counter", 3)
+        self.metrics.observe("duration", 0.02)
+        self.metrics.close()
+
+        # the worker is restarted
+        registry = Metrics()
+        app = flask.Flask("test")
+        app.config["METRICS_FLUSH_INTERVAL"] = 0
+        registry.init_app(app)
+        registry.inc("counter")
+
+        lines = registry.render().splitlines()
+
+        self.assertIn("counter 4", lines)
+        self.assertIn("duration_count 1", lines)
+
+    def test_flush_failed(self) -> None:
+        self.metrics.inc("counter", 2)
+
+        with patch.object(MetricsTotal, "add", side_effect=PyMongoError("down")):
+            self.metrics.flush()
+
+        self.metrics.inc("counter")
+
+        self.assertIn("counter 3", self.metrics.render().splitlines())
+
+    def test_forked_worker_starts_over(self) -> None:
+        self.metrics.inc("counter")
+        self.metrics.flush()
+
+        with patch("vulyk.ext.metrics.os.getpid", return_value=-1):
+            self.metrics.inc("counter")
+            lines = self.metrics.render().splitlines()
+
+        self.assertIn("counter 2", lines)
+        self.assertEqual(MetricsTotal.objects.count(), 1)
+
+    def test_disabled(self) -> None:
+        registry = Metrics()
+        registry.inc("counter")
+
+        with registry.time("duration"):
+            pass
+
+        self.assertEqual(registry.render(), "\n")
+
+    def test_token(self) -> None:
+        app = flask.Flask("test")
+        app.config["METRICS_FLUSH_INTERVAL"] = 0
+        app.config["METRICS_TOKEN"] = "secret"  # noqa: S105
+        Metrics().init_app(app)
+        client = app.test_client()
+
+        self.assertEqual(client.get("/metrics").status_code, 403)
+        self.assertEqual(client.get("/metrics", headers={"Authorization": "Bearer secret"}).status_code, 200)
+
+    def test_listener_duration(self) -> None:
+        signal = Namespace().signal("test_signal")
+
+        @deferrable(signal)
+        def listener(sender: object) -> None:
+            pass
+
+        with patch("vulyk.ext.jobs.METRICS", self.metrics):
+            signal.send(self)
+
+        self.assertIn(
+            'vulyk_listener_duration_seconds_count{listener="tests.test_metrics.TestMetrics.test_listener_duration.'
+            '<locals>.listener"} 1',
+            self.metrics.render().splitlines(),
+        )
+
+    def test_task_counters(self) -> None:
+        task_type = FakeType({})
+        Group.objects.create(description="test", id="default", allowed_types=[task_type.type_name])
+        user = User(username="user0", email="user0@email.com").save()
+        task_type.task_model(id="task0", task_type=task_type.type_name, task_data={"data": "data"}).save()
+
+        with patch("vulyk.models.task_types.METRICS", self.metrics):
+            task = task_type.get_next(user)
+            task_type.skip_task(task["id"], user)
+            task_type.get_next(user)
+            task_type.on_task_done(user, task["id"], {"result": "result"})
+
+        lines = self.metrics.render().splitlines()
+
+        self.assertIn('vulyk_tasks_assigned_total{{task_type="{}"}} 2'.format(task_type.type_name), lines)
+        self.assertIn('vulyk_tasks_skipped_total{{task_type="{}"}} 1'.format(task_type.type_name), lines)
+        self.assertIn('vulyk_answers_submitted_total{{task_type="{}"}} 1'.format(task_type.type_name), lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
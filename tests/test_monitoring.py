@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_monitoring
+"""
+
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import flask
+
+from vulyk import utils
+from vulyk.ext.monitoring import CommandMonitor, shape
+
+from .base import BaseTest
+
+
+def command(monitor: CommandMonitor, request_id: int, micros: int, **cmd: object) -> None:
+    name = next(iter(cmd))
+    started = SimpleNamespace(connection_id=("localhost", 27017), request_id=request_id, command=cmd)
+    finished = SimpleNamespace(
+        connection_id=("localhost", 27017),
+        request_id=request_id,
+        command_name=name,
+        database_name="vulyk",
+        duration_micros=micros,
+    )
+
+    monitor.started(started)
+    monitor.succeeded(finished)
+
+
+class TestCommandMonitor(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.monitor = CommandMonitor(slow_ms=50)
+        self.app = flask.Flask("test")
+
+        with patch("vulyk.ext.monitoring.monitoring.register") as register:
+            self.monitor.init_app(self.app)
+
+        register.assert_called_once_with(self.monitor)
+
+        def tasks() -> str:
+            for i in range(3):
+                command(self.monitor, i, 2000, find="tasks", filter={"_id": i})
+
+            return "done"
+
+        self.app.add_url_rule("/tasks", "tasks", tasks)
+        self.app.add_url_rule("/nothing", "nothing", lambda: "nothing")
+
+        def timed() -> flask.Response:
+            command(self.monitor, 1, 1000, find="tasks", filter={})
+            response = utils.no_tasks()
+            response.headers["Server-Timing"] = "app;dur=1"
+
+            return response
+
+        self.app.add_url_rule("/timed", "timed", timed)
+
+    def test_server_timing(self) -> None:
+        self.app.config["DB_SERVER_TIMING"] = True
+        client = self.app.test_client()
+
+        self.assertEqual(client.get("/tasks").headers["Server-Timing"], 'db;dur=6.0;desc="3 commands"')
+        self.assertNotIn("Server-Timing", client.get("/nothing").headers)
+
+        self.app.config["DB_SERVER_TIMING"] = False
+
+        self.assertNotIn("Server-Timing", client.get("/tasks").headers)
+
+    def test_server_timing_single_header(self) -> None:
+        self.app.config["DB_SERVER_TIMING"] = True
+        client = self.app.test_client()
+
+        for _ in range(3):
+            headers = client.get("/timed").headers
+
+            self.assertEqual(headers.getlist("Server-Timing"), ['app;dur=1, db;dur=1.0;desc="1 commands"'])
+
+    def test_slow_commands_logged(self) -> None:
+        with self.app.test_request_context("/tasks"), self.assertLogs("vulyk.app", "WARNING") as logs:
+            command(self.monitor, 1, 10000, find="tasks", filter={"_id": "secret"})
+            command(self.monitor, 2, 60000, find="tasks", filter={"taskType": "secret", "closed": {"$ne": True}})
+            command(self.monitor, 3, 70000, update="tasks", updates=[{"q": {"_id": {"$in": [1, 2, 3]}}, "u": {}}])
+
+            self.assertEqual(flask.g.db_commands, 3)
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn("Slow find on vulyk.tasks took 60.0ms", logs.output[0])
+        self.assertIn("{'taskType': '?', 'closed': {'$ne': '?'}}", logs.output[0])
+        self.assertNotIn("secret", "".join(logs.output))
+        self.assertIn("[{'q': {'_id': {'$in': ['?']}}, 'u': {}}]", logs.output[1])
+
+    def test_outside_request(self) -> None:
+        with self.assertLogs("vulyk.app", "WARNING") as logs:
+            command(self.monitor, 1, 60000, aggregate="tasks", pipeline=[{"$match": {"a": 1}}, {"$limit": 10}])
+
+        self.assertIn("(endpoint None): [{'$match': {'a': '?'}}, {'$limit': '?'}]", logs.output[0])
+
+    def test_shape(self) -> None:
+        self.assertEqual(shape({"a": 1, "b": {"$in": ["x", "y"]}}), {"a": "?", "b": {"$in": ["?"]}})
+        self.assertEqual(shape([{"$group": {"_id": "$a"}}]), [{"$group": {"_id": "?"}}])
+        self.assertEqual(shape(None), "?")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_profiler
+"""
+
+import pstats
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import flask
+import flask_admin
+from flask_login import AnonymousUserMixin
+
+from vulyk import utils
+from vulyk.admin.models import ProfileAdmin
+from vulyk.ext.profiler import PROFILE_HEADER, Profiler
+from vulyk.models.stats import RequestProfile
+from vulyk.models.user import User
+
+from .base import BaseTest
+
+
+def next_task() -> str:
+    return "task"
+
+
+class TestProfiler(BaseTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.user: User | AnonymousUserMixin = User(username="admin", email="admin@email.com", admin=True)
+
+        self.app = flask.Flask("test")
+        self.app.before_request(lambda: setattr(flask.g, "user", self.user))
+        Profiler().init_app(self.app)
+        self.app.add_url_rule("/next", "next_page", next_task)
+        self.app.add_url_rule("/missing", "missing", utils.no_tasks)
+        self.client = self.app.test_client()
+
+    def tearDown(self) -> None:
+        RequestProfile.drop_collection()
+
+        super().tearDown()
+
+    def test_profiled(self) -> None:
+        resp = self.client.get("/next?profile=1&type=declarations")
+        profile = RequestProfile.objects.get(id=resp.headers[PROFILE_HEADER])
+
+        self.assertEqual(resp.data, b"task")
+        self.assertEqual(profile.endpoint, "next_page")
+        self.assertEqual(profile.path, "/next?profile=1&type=declarations")
+        self.assertEqual(profile.status, 200)
+        self.assertEqual(profile.username, "admin")
+
+        with tempfile.NamedTemporaryFile(suffix=".prof") as f:
+            f.write(profile.to_pstats())
+            f.flush()
+            functions = {name for _, _, name in pstats.Stats(f.name).stats}
+
+        self.assertIn("next_task", functions)
+
+        resp = self.client.get("/next", headers={PROFILE_HEADER: "1"})
+
+        self.assertIn(PROFILE_HEADER, resp.headers)
+        self.assertEqual(RequestProfile.objects.count(), 2)
+
+    def test_not_profiled(self) -> None:
+        self.assertNotIn(PROFILE_HEADER, self.client.get("/next").headers)
+
+        self.user = User(username="user", email="user@email.com")
+        self.assertNotIn(PROFILE_HEADER, self.client.get("/next?profile=1").headers)
+
+        self.user = AnonymousUserMixin()
+        self.assertNotIn(PROFILE_HEADER, self.client.get("/next?profile=1").headers)
+
+        self.assertEqual(RequestProfile.objects.count(), 0)
+
+    def test_no_tasks_not_shared(self) -> None:
+        resp = self.client.get("/missing?profile=1")
+
+        self.assertEqual(resp.status_code, 404)
+        self.assertIn(PROFILE_HEADER, resp.headers)
+
+        # the next user mustn't get the ID of the admin's profile
+        self.user = User(username="user", email="user@email.com")
+        resp = self.client.get("/missing")
+
+        self.assertEqual(resp.status_code, 404)
+        self.assertNotIn(PROFILE_HEADER, resp.headers)
+
+    def test_download(self) -> None:
+        self.app.config["SECRET_KEY"] = "secret"  # noqa: S105
+        admin = flask_admin.Admin(self.app)
+        admin.add_view(ProfileAdmin(RequestProfile, name="Profiles"))
+        profile_id = self.client.get("/next?profile=1").headers[PROFILE_HEADER]
+
+        with patch.object(ProfileAdmin, "is_accessible", return_value=True):
+            resp = self.client.get("/admin/requestprofile/download/{}".format(profile_id))
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.data, RequestProfile.objects.get(id=profile_id).to_pstats())
+            self.assertEqual(self.client.get("/admin/requestprofile/download/nope").status_code, 404)
+
+            resp = self.client.get("/admin/requestprofile/")
+
+            self.assertIn("{}.prof".format(profile_id), resp.data.decode())
+
+        resp = self.client.get("/admin/requestprofile/download/{}".format(profile_id))
+
+        self.assertNotEqual(resp.status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,8 +10,10 @@ from datetime import datetime, timezone
 from unittest.mock import Mock, patch
 
 from bson import ObjectId
+from mongoengine import signals
 
 from vulyk.ext.leaderboard import LeaderBoardManager
+from vulyk.ext.submission import SubmissionPipeline
 from vulyk.models.exc import (
     InitializationError,
     TaskImportError,
@@ -19,12 +21,12 @@ from vulyk.models.exc import (
     TaskValidationError,
     WorkSessionLookUpError,
 )
-from vulyk.models.stats import WorkSession
+from vulyk.models.stats import AnswersRollup, TaskCounters, WorkSession, WorkTimeTotals
 from vulyk.models.task_types import AbstractTaskType
 from vulyk.models.tasks import AbstractAnswer, AbstractTask, Batch
 from vulyk.models.user import Group, User
 
-from .base import BaseTest
+from .base import BaseTest, count_queries
 from .fixtures import FakeType
 
 
@@ -49,6 +51,9 @@ class TestTaskTypes(BaseTest):
         AbstractAnswer.objects.delete()
         Batch.objects.delete()
         WorkSession.objects.delete()
+        AnswersRollup.objects.delete()
+        WorkTimeTotals.objects.delete()
+        TaskCounters.objects.delete()
 
         super().tearDown()
 
@@ -81,19 +86,50 @@ class TestTaskTypes(BaseTest):
 
         self.assertRaises(InitializationError, lambda: NoTemplateName({}))
 
-    @patch("mongoengine.queryset.base.BaseQuerySet.count", lambda *a: 22)
     def test_to_dict(self):
+        task_type = FakeType({})
+        task_type.import_tasks([{"name": str(i)} for i in range(3)], None)
+        # tasks of another type don't count
+        task_type.task_model(id="another", task_type="another", task_data={"name": "another"}).save()
+        task_type.task_model.objects(id__ne="another").update_one(set__closed=True)
+        TaskCounters.objects.delete()
+
         got = {
             "name": "Fake name",
             "description": "Fake description",
             "type": "FakeTaskType",
-            "tasks": 22,
-            "closed_tasks": 22,
-            "open_tasks": 0,
-            "has_tasks": False,
+            "tasks": 3,
+            "closed_tasks": 1,
+            "open_tasks": 2,
+            "has_tasks": True,
         }
 
-        self.assertDictEqual(FakeType({}).to_dict(), got)
+        # recounted once, then read from the counters
+        self.assertDictEqual(task_type.to_dict(), got)
+
+        with count_queries(task_type.task_model, TaskCounters) as queries:
+            self.assertDictEqual(task_type.to_dict(), got)
+
+        self.assertEqual(dict(queries), {TaskCounters._get_collection_name(): 1})
+
+    def test_counters_maintained(self):
+        task_type = FakeType({})
+        task_type.redundancy = 1
+        user = User(username="user0", email="user0@email.com").save()
+        task_type.import_tasks([{"name": str(i)} for i in range(3)], None)
+
+        self.assertEqual(TaskCounters.of_type(task_type.type_name).tasks, 3)
+
+        task_ids = task_type.task_model.objects.scalar("id")
+
+        for task_id in task_ids:
+            task_type.work_session_manager.start_work_session(task_type.task_model.objects.get(id=task_id), user.id)
+
+        task_type.on_task_done(user, task_ids[0], {"result": "result"})
+        task_type.on_tasks_done_bulk(user, [(task_id, {"result": "result"}) for task_id in task_ids[1:]])
+
+        counters = TaskCounters.of_type(task_type.type_name)
+        self.assertEqual((counters.tasks, counters.closed, counters.open), (3, 3, 0))
 
     # endregion Task type
 
@@ -738,6 +774,283 @@ class TestTaskTypes(BaseTest):
 
         self.assertEqual(batch.tasks_processed, 1)
 
+    def test_on_done_twice_keeps_counters(self):
+        task_type = FakeType({})
+        user = User(username="user0", email="user0@email.com").save()
+        task = task_type.task_model(
+            id="task0",
+            task_type=task_type.type_name,
+            batch=None,
+            closed=False,
+            users_count=0,
+            users_processed=[],
+            users_skipped=[],
+            task_data={"data": "data"},
+        ).save()
+        task_type._work_session_manager.start_work_session(task, user.id)
+        task_type.on_task_done(user, task.id, {"result": "result"})
+
+        with self.assertRaises(TaskValidationError):
+            task_type.on_task_done(user, task.id, {"result": "result2"})
+
+        task.reload()
+
+        self.assertEqual(User.objects.get(id=user.id).processed, 1)
+        self.assertEqual(AnswersRollup.objects.get(user=user).answers, 1)
+        self.assertEqual(task.users_count, 1)
+
+    def test_on_done_idempotency_key(self):
+        task_type = FakeType({})
+        user = User(username="user0", email="user0@email.com").save()
+        another = User(username="user1", email="user1@email.com").save()
+        task = task_type.task_model(
+            id="task0",
+            task_type=task_type.type_name,
+            batch=None,
+            closed=False,
+            users_count=0,
+            users_processed=[],
+            users_skipped=[],
+            task_data={"data": "data"},
+        ).save()
+        task_type._work_session_manager.start_work_session(task, user.id)
+
+        self.assertIsNone(task_type.find_submission(user, "key0"))
+
+        task_type.on_task_done(user, task.id, {"result": "result"}, idempotency_key="key0")
+
+        self.assertEqual(task_type.find_submission(user, "key0"), task.id)
+        self.assertIsNone(task_type.find_submission(another, "key0"))
+        self.assertIsNone(task_type.find_submission(user, "key1"))
+
+        # a retry is cheap to recognize and doesn't touch the task
+        with count_queries(task_type.task_model, task_type.answer_model) as queries:
+            task_type.find_submission(user, "key0")
+
+        self.assertEqual(dict(queries), {task_type.answer_model._get_collection_name(): 1})
+
+    def test_idempotency_key_per_user(self):
+        task_type = FakeType({})
+        users = [User(username="user%s" % i, email="user%s@email.com" % i).save() for i in range(2)]
+        task = task_type.task_model(id="task0", task_type=task_type.type_name, task_data={"data": "data"}).save()
+        other = task_type.task_model(id="task1", task_type=task_type.type_name, task_data={"data": "data"}).save()
+
+        for user in users:
+            task_type._work_session_manager.start_work_session(task, user.id)
+            # the same key from different users is no conflict
+            task_type.on_task_done(user, task.id, {"result": "result"}, idempotency_key="key0")
+            self.assertEqual(task_type.find_submission(user, "key0"), task.id)
+
+        # answers without a key don't collide either
+        task_type._work_session_manager.start_work_session(other, users[0].id)
+        task_type.on_task_done(users[0], other.id, {"result": "result"})
+
+        self.assertEqual(task_type.answer_model.objects.count(), 3)
+
+        # but a user can't reuse a key
+        task_type._work_session_manager.start_work_session(other, users[1].id)
+
+        with self.assertRaises(TaskValidationError):
+            task_type.on_task_done(users[1], other.id, {"result": "result"}, idempotency_key="key0")
+
+    def test_on_done_query_count(self):
+        task_type = FakeType({})
+        user = User(username="user0", email="user0@email.com").save()
+        batch = Batch(id="default", task_type=task_type.type_name, tasks_count=2, tasks_processed=0).save()
+        tasks = [
+            task_type.task_model(
+                id="task%s" % i,
+                task_type=task_type.type_name,
+                batch=batch,
+                closed=False,
+                users_count=users_count,
+                users_processed=[],
+                users_skipped=[],
+                task_data={"data": "data"},
+            ).save()
+            for i, users_count in enumerate([0, 2])
+        ]
+        models = (
+            task_type.task_model,
+            task_type.answer_model,
+            User,
+            Batch,
+            WorkSession,
+            AnswersRollup,
+            WorkTimeTotals,
+            TaskCounters,
+        )
+
+        for task in tasks:
+            task_type._work_session_manager.start_work_session(task, user.id)
+
+        # task, answer + user + rollup (a request each, as if saved one by one),
+        # task update, session, time totals and, as it's the first session of
+        # the user, their earlier sessions
+        with count_queries(*models) as queries:
+            task_type.on_task_done(user, tasks[0].id, {"result": "result"})
+
+        self.assertEqual(sum(queries.values()), 8)
+        self.assertEqual(queries[AnswersRollup._get_collection_name()], 1)
+
+        # the same plus the batch, which is never dereferenced on its own, and task counters
+        with count_queries(*models) as queries:
+            task_type.on_task_done(user, tasks[1].id, {"result": "result"})
+
+        self.assertEqual(queries[Batch._get_collection_name()], 1)
+        self.assertEqual(sum(queries.values()), 9)
+
+    def test_on_done_bulk(self):
+        task_type = FakeType({})
+        user = User(username="user0", email="user0@email.com").save()
+        batch = Batch(id="default", task_type=task_type.type_name, tasks_count=3, tasks_processed=0).save()
+        tasks = [
+            task_type.task_model(
+                id="task%s" % i,
+                task_type=task_type.type_name,
+                batch=batch,
+                closed=False,
+                users_count=users_count,
+                users_processed=[],
+                users_skipped=[],
+                task_data={"data": "data"},
+            ).save()
+            for i, users_count in enumerate([2, 2, 0])
+        ]
+        models = (
+            task_type.task_model,
+            task_type.answer_model,
+            User,
+            Batch,
+            WorkSession,
+            AnswersRollup,
+            WorkTimeTotals,
+            TaskCounters,
+        )
+
+        for task in tasks:
+            task_type._work_session_manager.start_work_session(task, user.id)
+
+        task_type.on_task_done(user, "task2", {"result": "result"})
+
+        # tasks, answers, answers + user + rollup, 2 task updates, sessions x2, totals, task counters, batch
+        with count_queries(*models) as queries:
+            results = task_type.on_tasks_done_bulk(
+                user,
+                [
+                    ("task0", {"result": "0"}),
+                    ("fake_id", {"result": "1"}),
+                    ("task2", {"result": "2"}),
+                    ("task1", {"result": "3"}),
+                    ("task0", {"result": "4"}),
+                ],
+            )
+
+        self.assertEqual([r.done for r in results], [True, False, False, True, False])
+        self.assertEqual(results[0].task_id, "task0")
+        self.assertIsNone(results[0].error)
+        self.assertEqual(sum(queries.values()), 11)
+        self.assertEqual(queries[task_type.answer_model._get_collection_name()], 2)
+
+        self.assertEqual(task_type.answer_model.objects(created_by=user).count(), 3)
+        self.assertEqual(task_type.answer_model.objects.get(task="task0").result, {"result": "0"})
+        self.assertEqual(User.objects.get(id=user.id).processed, 3)
+        self.assertEqual(task_type.task_model.objects(closed=True).count(), 2)
+        self.assertEqual(task_type.task_model.objects.get(id="task1").users_count, 3)
+        self.assertEqual(WorkSession.objects(user=user, end_time=None).count(), 0)
+        self.assertEqual(Batch.objects.get(id="default").tasks_processed, 2)
+        self.assertEqual(AnswersRollup.objects.get(user=user).answers, 3)
+
+    def test_on_done_without_transaction(self):
+        task_type = FakeType({})
+        user = User(username="user0", email="user0@email.com").save()
+        task_ids = ["task0", "task1", "task2"]
+
+        for task_id in task_ids:
+            task = task_type.task_model(id=task_id, task_type=task_type.type_name, task_data={"data": "data"}).save()
+            task_type._work_session_manager.start_work_session(task, user.id)
+
+        saved = []
+        receiver = Mock(side_effect=lambda sender, document, created: saved.append((document.task.id, created)))
+        signals.post_save.connect(receiver, sender=task_type.answer_model)
+        self.addCleanup(signals.post_save.disconnect, receiver, sender=task_type.answer_model)
+
+        with patch.object(
+            SubmissionPipeline, "__init__", autospec=True, side_effect=SubmissionPipeline.__init__
+        ) as init:
+            task_type.on_task_done(user, "task0", {"result": "result"})
+
+        # a single answer isn't worth a transaction
+        init.assert_called_once()
+        self.assertEqual(init.call_args.args[1:], ())
+
+        task_type.on_tasks_done_bulk(user, [(task_id, {"result": "result"}) for task_id in task_ids[1:]])
+
+        self.assertEqual(saved, [("task0", True), ("task1", True), ("task2", True)])
+
+    def test_on_done_invalid_answer(self):
+        task_type = FakeType({})
+        user = User(username="user0", email="user0@email.com").save()
+        task_type.task_model(id="task0", task_type=task_type.type_name, task_data={"data": "data"}).save()
+
+        with self.assertRaises(TaskValidationError):
+            task_type.on_task_done(user, "task0", {"result": "result"}, idempotency_key="k" * 1000)
+
+        self.assertEqual(task_type.answer_model.objects.count(), 0)
+        self.assertEqual(User.objects.get(id=user.id).processed, 0)
+
+    def test_on_done_bulk_concurrent_duplicate(self):
+        task_type = FakeType({})
+        user = User(username="user0", email="user0@email.com").save()
+        batch = Batch(id="default", task_type=task_type.type_name, tasks_count=3, tasks_processed=0).save()
+        tasks = [
+            task_type.task_model(
+                id="task%s" % i,
+                task_type=task_type.type_name,
+                batch=batch,
+                closed=False,
+                users_count=0,
+                users_processed=[],
+                users_skipped=[],
+                task_data={"data": "data"},
+            ).save()
+            for i in range(3)
+        ]
+
+        for task in tasks:
+            task_type._work_session_manager.start_work_session(task, user.id)
+
+        write_inserts = SubmissionPipeline.write_inserts
+
+        def concurrently_answered(pipeline, model):
+            # another request saves an answer to the task in the middle
+            task_type.answer_model(
+                task=tasks[1], created_by=user, task_type=task_type.type_name, result={"result": "other"}
+            ).save()
+
+            return write_inserts(pipeline, model)
+
+        with patch.object(SubmissionPipeline, "write_inserts", concurrently_answered):
+            results = task_type.on_tasks_done_bulk(user, [("task%s" % i, {"result": str(i)}) for i in range(3)])
+
+        self.assertEqual(results[1], ("task1", False, "Task has been answered already"))
+        self.assertEqual([r.done for r in results], [True, False, True])
+        self.assertEqual(task_type.answer_model.objects.get(task="task2").result, {"result": "2"})
+        # only answers stored by this call are accounted
+        self.assertEqual(User.objects.get(id=user.id).processed, 2)
+        self.assertEqual(AnswersRollup.objects.get(user=user).answers, 2)
+        self.assertEqual([t.users_count for t in task_type.task_model.objects.order_by("id")], [1, 0, 1])
+        self.assertEqual(WorkSession.objects(user=user, end_time=None).count(), 1)
+
+    def test_on_done_bulk_nothing_accepted(self):
+        task_type = FakeType({})
+        user = User(username="user0", email="user0@email.com").save()
+
+        results = task_type.on_tasks_done_bulk(user, [("fake_id", {"result": "result"})])
+
+        self.assertEqual(results, [("fake_id", False, "Task not found")])
+        self.assertEqual(User.objects.get(id=user.id).processed, 0)
+
     def test_on_done_raises_not_found(self):
         self.assertRaises(
             TaskNotFoundError,
@@ -6,10 +6,11 @@ test_user_model
 """
 
 import unittest
+from datetime import datetime, timedelta, timezone
 
 from vulyk.models.user import Group, User
 
-from .base import BaseTest
+from .base import BaseTest, count_queries
 from .fixtures import FakeType
 
 
@@ -65,6 +66,20 @@ class TestUser(BaseTest):
         self.assertTrue(u2.is_eligible_for(self.TASK_TYPE))
         self.assertFalse(u2.is_eligible_for(another_task_type))
 
+    def test_is_eligible_for_fetches_groups_once(self):
+        Group.objects.create(description="another", id="another", allowed_types=["task_type_2"])
+        User(username="1", email="1@email.com", groups=list(Group.objects(id__in=["default", "another"]))).save()
+        user = User.objects.get(username="1")
+
+        with count_queries(Group) as queries:
+            self.assertTrue(user.is_eligible_for(self.TASK_TYPE))
+            self.assertTrue(user.is_eligible_for("task_type_2"))
+            self.assertFalse(user.is_eligible_for("task_type_3"))
+
+        self.assertEqual(sum(queries.values()), 1)
+
+        Group.objects(id="another").delete()
+
     def test_as_dict(self):
         username = "mutumba"
         email = "mutumba@email.com"
@@ -108,6 +123,24 @@ class TestUser(BaseTest):
 
         self.assertEqual(None, User.get_by_id(uid))
 
+    def test_touch(self):
+        long_ago = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        User(username="1", email="1@email.com", last_login=long_ago).save()
+        user = User.objects.get(username="1")
+
+        self.assertTrue(user.touch(timedelta(minutes=5)))
+        self.assertFalse(user.touch(timedelta(minutes=5)))
+        self.assertGreater(User.objects.get(username="1").last_login, long_ago.replace(tzinfo=None))
+
+    def test_touch_concurrent(self):
+        User(username="1", email="1@email.com", last_login=datetime(2020, 1, 1, tzinfo=timezone.utc)).save()
+        first = User.objects.get(username="1")
+        second = User.objects.get(username="1")
+
+        self.assertTrue(first.touch(timedelta(minutes=5)))
+        self.assertFalse(second.touch(timedelta(minutes=5)))
+        self.assertTrue(second.touch(timedelta(0)))
+
 
 if __name__ == "__main__":
     unittest.main()
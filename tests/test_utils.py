@@ -6,6 +6,8 @@ test_utils
 import unittest
 from unittest.mock import Mock
 
+import flask
+import jinja2
 from werkzeug.exceptions import HTTPException
 
 from vulyk import utils
@@ -86,6 +88,39 @@ class TestUtils(BaseTest):
 
         self.assertEqual(utils.get_template_path(app, "shekel.html"), "base/shekel.html")
 
+    def _app_with_templates(self, *, auto_reload: bool) -> tuple[flask.Flask, Mock]:
+        app = flask.Flask("test")
+        app.config["TEMPLATE_BASE_FOLDERS"] = ["shekels"]
+        app.config["TEMPLATES_AUTO_RELOAD"] = auto_reload
+        loader = jinja2.DictLoader({"shekels/base/shekel.html": "", "base/index.html": ""})
+        app.jinja_loader = Mock(wraps=loader)
+
+        return app, app.jinja_loader.list_templates
+
+    def test_get_template_path_listed_once(self) -> None:
+        app, list_templates = self._app_with_templates(auto_reload=False)
+
+        for _ in range(3):
+            self.assertEqual(utils.get_template_path(app, "shekel.html"), "shekels/base/shekel.html")
+            self.assertEqual(utils.get_template_path(app, "index.html"), "base/index.html")
+
+        self.assertEqual(list_templates.call_count, 1)
+
+        # plugins' loaders added later
+        app.jinja_loader = Mock(wraps=jinja2.DictLoader({"shekels/base/index.html": ""}))
+
+        self.assertEqual(utils.get_template_path(app, "index.html"), "shekels/base/index.html")
+
+    def test_get_template_path_auto_reload(self) -> None:
+        app, list_templates = self._app_with_templates(auto_reload=True)
+
+        for _ in range(2):
+            with app.test_request_context():
+                utils.get_template_path(app, "shekel.html")
+                utils.get_template_path(app, "index.html")
+
+        self.assertEqual(list_templates.call_count, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
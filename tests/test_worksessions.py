@@ -6,11 +6,15 @@ test_worksessions
 """
 
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch
 
-from vulyk.models.exc import TaskNotFoundError, WorkSessionUpdateError
-from vulyk.models.stats import WorkSession
+from bson import ObjectId
+
+from vulyk.ext.worksession import ActivityBuffer
+from vulyk.models.exc import TaskNotFoundError, WorkSessionLookUpError, WorkSessionUpdateError
+from vulyk.models.stats import WorkSession, WorkTimeTotals
 from vulyk.models.tasks import AbstractAnswer, AbstractTask
 from vulyk.models.user import Group, User
 
@@ -38,6 +42,7 @@ class TestTaskTypes(BaseTest):
         AbstractTask.objects.delete()
         AbstractAnswer.objects.delete()
         WorkSession.objects.delete()
+        WorkTimeTotals.objects.delete()
 
         super().tearDown()
 
@@ -205,8 +210,215 @@ class TestTaskTypes(BaseTest):
         fake_type = self.FAKE_TYPE
         self.assertRaises(TaskNotFoundError, lambda: fake_type.record_activity("fake_id", "", 0))
 
+    def test_update_session_no_session(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        task = task_type.task_model(
+            id="task0",
+            task_type=task_type.type_name,
+            batch="any_batch",
+            closed=False,
+            users_count=0,
+            users_processed=[],
+            users_skipped=[],
+            task_data={"data": "data"},
+        ).save()
+
+        self.assertRaises(WorkSessionLookUpError, lambda: task_type.record_activity(user.id, task.id, 0))
+
+    def test_update_session_concurrent(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        task = task_type.task_model(
+            id="task0",
+            task_type=task_type.type_name,
+            batch="any_batch",
+            closed=False,
+            users_count=0,
+            users_processed=[],
+            users_skipped=[],
+            task_data={"data": "data"},
+        ).save()
+        heartbeats = 40
+        fake_datetime = datetime.now(timezone.utc) - timedelta(seconds=heartbeats * 10)
+
+        with patch("vulyk.ext.worksession.datetime") as mock_date:
+            mock_date.now = lambda _: fake_datetime
+            task_type.work_session_manager.start_work_session(task, user.id)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for f in [pool.submit(task_type.record_activity, user.id, task.id, 5) for _ in range(heartbeats)]:
+                f.result()
+
+        session = WorkSession.objects.get(user=user.id, task=task)
+
+        self.assertEqual(session.activity, heartbeats * 5)
+
+    def test_update_session_concurrent_overdrive(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        task = task_type.task_model(
+            id="task0",
+            task_type=task_type.type_name,
+            batch="any_batch",
+            closed=False,
+            users_count=0,
+            users_processed=[],
+            users_skipped=[],
+            task_data={"data": "data"},
+        ).save()
+        fake_datetime = datetime.now(timezone.utc) - timedelta(seconds=100)
+
+        with patch("vulyk.ext.worksession.datetime") as mock_date:
+            mock_date.now = lambda _: fake_datetime
+            task_type.work_session_manager.start_work_session(task, user.id)
+
+        def heartbeat() -> bool:
+            try:
+                task_type.record_activity(user.id, task.id, 30)
+                return True
+            except WorkSessionUpdateError:
+                return False
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            accepted = sum(pool.map(lambda _: heartbeat(), range(10)))
+
+        session = WorkSession.objects.get(user=user.id, task=task)
+
+        # only three of 30 seconds fit into 100 seconds session
+        self.assertEqual(accepted, 3)
+        self.assertEqual(session.activity, 90)
+
     # endregion Record activity
 
+    # region Buffered activity
+    def _start_sessions(self, user: User, count: int, seconds_ago: int = 100) -> list[AbstractTask]:
+        task_type = self.FAKE_TYPE
+        tasks = []
+        fake_datetime = datetime.now(timezone.utc) - timedelta(seconds=seconds_ago)
+
+        for i in range(count):
+            task = task_type.task_model(
+                id="task%s" % i,
+                task_type=task_type.type_name,
+                batch=None,
+                closed=False,
+                users_count=0,
+                users_processed=[],
+                users_skipped=[],
+                task_data={"data": "data"},
+            ).save()
+
+            with patch("vulyk.ext.worksession.datetime") as mock_date:
+                mock_date.now = lambda _: fake_datetime
+                task_type.work_session_manager.start_work_session(task, user.id)
+
+            tasks.append(task)
+
+        return tasks
+
+    def test_record_activities_bulk(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        task0, task1 = self._start_sessions(user, 2)
+
+        task_type.record_activities(user.id, [(task0.id, 10), (task1.id, 20), (task0.id, 15), ("unknown", 5)])
+
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task0).activity, 25)
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task1).activity, 20)
+
+    def test_record_activities_overdrive(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        task0, task1 = self._start_sessions(user, 2)
+
+        task_type.record_activities(user.id, [(task0.id, 60), (task1.id, 500)])
+
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task0).activity, 60)
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task1).activity, 0)
+
+    def test_record_activities_negative(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        (task0,) = self._start_sessions(user, 1)
+
+        self.assertRaises(WorkSessionUpdateError, lambda: task_type.record_activities(user.id, [(task0.id, -1)]))
+
+    def test_buffer_coalesces(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        (task0,) = self._start_sessions(user, 1)
+        buffer = ActivityBuffer(task_type.work_session_manager, flush_interval=0, max_entries=10)
+
+        for _ in range(4):
+            buffer.add(user.id, task0.id, 5)
+
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task0).activity, 0)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task0).activity, 20)
+
+    def test_buffer_flushes_when_full(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        tasks = self._start_sessions(user, 3)
+        buffer = ActivityBuffer(task_type.work_session_manager, flush_interval=0, max_entries=3)
+
+        for task in tasks:
+            buffer.add(user.id, task.id, 7)
+
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(sum(ws.activity for ws in WorkSession.objects(user=user.id)), 21)
+
+    def test_buffer_negative(self) -> None:
+        buffer = ActivityBuffer(self.FAKE_TYPE.work_session_manager, flush_interval=0, max_entries=3)
+
+        self.assertRaises(WorkSessionUpdateError, lambda: buffer.add(ObjectId(), "task0", -5))
+
+    def test_buffered_task_type(self) -> None:
+        task_type = FakeType({"ACTIVITY_FLUSH_INTERVAL": 60, "ACTIVITY_BUFFER_SIZE": 10})
+        user = User(username="user0", email="user0@email.com").save()
+        (task0,) = self._start_sessions(user, 1)
+
+        self.assertIsInstance(task_type.activity_buffer, ActivityBuffer)
+        self.assertIsNone(self.FAKE_TYPE.activity_buffer)
+
+        task_type.record_activities(user.id, [(task0.id, 10), (task0.id, 10)])
+
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task0).activity, 0)
+
+        task_type.activity_buffer.close()
+
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task0).activity, 20)
+
+    def test_buffer_too_long(self) -> None:
+        user = User(username="user0", email="user0@email.com").save()
+        (task0,) = self._start_sessions(user, 1)
+        task_type = FakeType({"ACTIVITY_FLUSH_INTERVAL": 60, "ACTIVITY_BUFFER_SIZE": 10})
+
+        self.assertRaises(
+            WorkSessionUpdateError, lambda: task_type.record_activities(user.id, [(task0.id, 10), (task0.id, 10**30)])
+        )
+        self.assertEqual(len(task_type.activity_buffer), 0)
+
+    def test_buffered_activity_accounted_on_done(self) -> None:
+        task_type = FakeType({"ACTIVITY_FLUSH_INTERVAL": 60, "ACTIVITY_BUFFER_SIZE": 10})
+        user = User(username="user0", email="user0@email.com").save()
+        task0, task1, task2 = self._start_sessions(user, 3)
+
+        task_type.record_activities(user.id, [(task0.id, 30), (task1.id, 20), (task2.id, 10)])
+        task_type.on_task_done(user, task0.id, {"result": "result"})
+        task_type.on_tasks_done_bulk(user, [(task1.id, {"result": "result"})])
+
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task0).activity, 30)
+        self.assertEqual(WorkTimeTotals.objects.get(user=user).precise, 50)
+        # sessions still in progress wait for the next flush
+        self.assertEqual(len(task_type.activity_buffer), 1)
+        self.assertEqual(WorkSession.objects.get(user=user.id, task=task2).activity, 0)
+
+    # endregion Buffered activity
+
     # region On task done
     def test_on_done_ok(self) -> None:
         task_type = self.FAKE_TYPE
@@ -231,8 +443,79 @@ class TestTaskTypes(BaseTest):
         self.assertEqual(ws.answer, answer)
         self.assertLess(ws.end_time.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc), timedelta(seconds=1))
 
+    def test_on_done_latest_session(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        (task,) = self._start_sessions(user, 1, seconds_ago=300)
+        # a leftover of the same task, e.g. from before sessions were upserted
+        WorkSession(
+            user=user, task=task, task_type=task.task_type, start_time=datetime.now(timezone.utc), activity=0
+        ).save()
+
+        answer = task_type.answer_model(
+            task=task, created_by=user, task_type=task.task_type, result={"result": "result"}
+        ).save()
+        task_type.work_session_manager.end_work_session(task, user.id, answer)
+
+        latest, earliest = WorkSession.objects(user=user, task=task).order_by("-start_time")
+
+        self.assertEqual(latest.answer, answer)
+        self.assertIsNone(earliest.answer)
+
+    def test_on_done_no_session(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        (task,) = self._start_sessions(user, 1)
+        WorkSession.objects.delete()
+        answer = task_type.answer_model(
+            task=task, created_by=user, task_type=task.task_type, result={"result": "result"}
+        ).save()
+
+        self.assertRaises(
+            WorkSessionLookUpError, lambda: task_type.work_session_manager.end_work_session(task, user.id, answer)
+        )
+
+    def test_on_skip_deletes_session(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        (task,) = self._start_sessions(user, 1)
+
+        task_type.work_session_manager.delete_work_session(task, user.id)
+
+        self.assertEqual(WorkSession.objects(user=user, task=task).count(), 0)
+        self.assertRaises(
+            WorkSessionLookUpError, lambda: task_type.work_session_manager.delete_work_session(task, user.id)
+        )
+
     # endregion On task done
 
+    # region Reaping
+    def test_reap_abandoned(self) -> None:
+        manager = self.FAKE_TYPE.work_session_manager
+        user = User(username="user0", email="user0@email.com").save()
+        _, finished, fresh = self._start_sessions(user, 3, seconds_ago=3 * 3600)
+        WorkSession.objects(task=finished).update(set__end_time=datetime.now(timezone.utc))
+        WorkSession.objects(task=fresh).update(set__start_time=datetime.now(timezone.utc))
+
+        removed = manager.reap_abandoned(timedelta(hours=2), chunk_size=1)
+
+        self.assertEqual(removed, 1)
+        self.assertEqual({ws.task.id for ws in WorkSession.objects}, {finished.id, fresh.id})
+        self.assertEqual(manager.reap_abandoned(timedelta(hours=2)), 0)
+
+    def test_reap_abandoned_chunks(self) -> None:
+        manager = self.FAKE_TYPE.work_session_manager
+        user = User(username="user0", email="user0@email.com").save()
+        self._start_sessions(user, 5, seconds_ago=3 * 3600)
+
+        self.assertEqual(manager.reap_abandoned(timedelta(hours=2), task_type="other_type", chunk_size=2), 0)
+        self.assertEqual(
+            manager.reap_abandoned(timedelta(hours=2), task_type=self.FAKE_TYPE.type_name, chunk_size=2), 5
+        )
+        self.assertEqual(WorkSession.objects.count(), 0)
+
+    # endregion Reaping
+
     # region Stats
     def test_total_time_approximate(self) -> None:
         task_type = self.FAKE_TYPE
@@ -313,6 +596,66 @@ class TestTaskTypes(BaseTest):
 
         self.assertEqual(ws.get_total_user_time_precise(user.id), 150)
 
+    def test_total_time_kept_per_task_type(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        task0, task1 = self._start_sessions(user, 2, seconds_ago=40)
+        task_type.record_activity(user.id, task0.id, 20)
+
+        for task in (task0, task1):
+            task_type.on_task_done(user, task.id, {"result": "result"})
+
+        totals = WorkTimeTotals.objects.get(user=user)
+
+        self.assertEqual(totals.approximate, 80)
+        self.assertEqual(totals.precise, 20)
+        self.assertEqual(totals.seconds("approximate", task_type.type_name), 80)
+        self.assertEqual(totals.seconds("precise", "other_type"), 0)
+        self.assertEqual(WorkSession.get_total_user_time_precise(user.id, task_type.type_name), 20)
+
+    def test_total_time_backfill(self) -> None:
+        user = User(username="user0", email="user0@email.com").save()
+        task0, task1 = self._start_sessions(user, 2, seconds_ago=3600)
+        end_time = datetime.now(timezone.utc)
+        WorkSession.objects(task=task0).update(set__end_time=end_time, set__activity=1800)
+        WorkSession.objects(task=task1).update(set__end_time=end_time - timedelta(minutes=30), set__activity=600)
+        WorkSession(
+            user=user, task=task1, task_type="other_type", start_time=end_time, end_time=end_time + timedelta(seconds=5)
+        ).save()
+
+        self.assertEqual(WorkTimeTotals.objects.count(), 0)
+        # nothing has been accounted yet, so the first read backfills
+        self.assertEqual(WorkSession.get_total_user_time_approximate(user.id), 5405)
+        self.assertEqual(WorkSession.get_total_user_time_precise(user.id), 2400)
+        self.assertEqual(WorkSession.get_total_user_time_approximate(user.id, "other_type"), 5)
+        self.assertEqual(WorkTimeTotals.backfill(), 1)
+        self.assertEqual(WorkTimeTotals.objects.get(user=user).approximate, 5405)
+
+    def test_total_time_history_accounted_on_first_session(self) -> None:
+        task_type = self.FAKE_TYPE
+        user = User(username="user0", email="user0@email.com").save()
+        task0, task1, task2 = self._start_sessions(user, 3, seconds_ago=3600)
+        end_time = datetime.now(timezone.utc) - timedelta(minutes=30)
+        # sessions ended before the totals were introduced
+        WorkSession.objects(task=task0).update(set__end_time=end_time, set__activity=1200)
+        WorkSession.objects(task=task1).update(set__end_time=end_time, set__activity=600)
+
+        # the first session ending after the deploy comes before any read
+        task_type.record_activity(user.id, task2.id, 60)
+        task_type.on_task_done(user, task2.id, {"result": "result"})
+
+        totals = WorkTimeTotals.objects.get(user=user)
+
+        self.assertEqual(totals.precise, 1860)
+        self.assertEqual(totals.seconds("precise", task_type.type_name), 1860)
+        self.assertAlmostEqual(totals.approximate, 2 * 1800 + 3600, delta=5)
+
+    def test_total_time_no_sessions(self) -> None:
+        user = User(username="user0", email="user0@email.com").save()
+
+        self.assertEqual(WorkSession.get_total_user_time_approximate(user.id), 0)
+        self.assertEqual(WorkTimeTotals.objects.count(), 0)
+
     # endregion Stats
 
 
@@ -1,11 +1,19 @@
 # -*- coding: utf-8 -*-
-from typing import ClassVar
+from http import HTTPStatus
+from io import BytesIO
+from typing import Any, ClassVar
 
+import flask
 import flask_login as login
 import wtforms
+from flask_admin import expose
 from flask_admin.contrib.mongoengine import ModelView
+from markupsafe import Markup
+from mongoengine import ValidationError
 
-__all__ = ["AuthModelView"]
+from vulyk.models.stats import RequestProfile
+
+__all__ = ["AuthModelView", "ProfileAdmin"]
 
 
 class CKTextAreaWidget(wtforms.widgets.TextArea):
@@ -48,3 +56,58 @@ class AuthModelView(ModelView):
 
     def is_accessible(self) -> bool:
         return login.current_user.is_authenticated and login.current_user.is_admin()
+
+
+class ProfileAdmin(AuthModelView):
+    """
+    Profiles of requests made by admins with `?profile=1`, downloadable in
+    pstats format (see `vulyk.ext.profiler`).
+    """
+
+    extra_js: ClassVar[list[str]] = []
+
+    can_create = False
+    can_edit = False
+    # profiles are kept in a capped collection, the oldest go away by themselves
+    can_delete = False
+
+    column_list: ClassVar[list[str]] = [
+        "created_at",
+        "method",
+        "path",
+        "endpoint",
+        "status",
+        "duration",
+        "username",
+        "stats",
+    ]
+    column_sortable_list: ClassVar[list[str]] = ["created_at", "path", "endpoint", "duration"]
+    column_default_sort: ClassVar[tuple[str, bool]] = ("created_at", True)
+    column_labels: ClassVar[dict[str, str]] = {"stats": "Profile"}
+    column_formatters: ClassVar[dict[str, Any]] = {
+        "stats": lambda view, context, model, name: Markup('<a href="{}">{}.prof</a>').format(
+            flask.url_for(".download", profile_id=model.id), model.id
+        )
+    }
+
+    @expose("/download/<string:profile_id>")
+    def download(self, profile_id: str) -> flask.Response:
+        """
+        :param profile_id: ID of the profile.
+
+        :return: The profile to open with `pstats`, snakeviz and alike.
+        """
+        try:
+            profile = RequestProfile.objects(id=profile_id).first()
+        except ValidationError:
+            profile = None
+
+        if profile is None:
+            flask.abort(HTTPStatus.NOT_FOUND)
+
+        return flask.send_file(
+            BytesIO(profile.to_pstats()),
+            mimetype="application/octet-stream",
+            as_attachment=True,
+            download_name="{}.prof".format(profile.id),
+        )
@@ -7,14 +7,22 @@ import orjson as json
 from werkzeug.wrappers import Response
 
 from vulyk import bootstrap, cli, utils
-from vulyk.models.exc import TaskNotFoundError
+from vulyk.ext.facts import Facts
+from vulyk.ext.leaderboard import LeaderBoardManager
+from vulyk.models.exc import TaskNotFoundError, TaskValidationError, WorkSessionUpdateError
 from vulyk.models.task_types import AbstractTaskType
-from vulyk.utils import NO_TASKS
+from vulyk.models.tasks import AbstractAnswer
+from vulyk.models.user import User
 
-__all__ = ["TASKS_TYPES", "app"]
+__all__ = ["FACTS", "GLOBAL_LEADERBOARD", "TASKS_TYPES", "app"]
 
 app = bootstrap.init_app(__name__)
 TASKS_TYPES: dict[str, AbstractTaskType] = bootstrap.init_plugins(app)
+# cross-project ranking
+GLOBAL_LEADERBOARD = LeaderBoardManager(None, AbstractAnswer, User, cache_ttl=app.config["LEADERBOARD_CACHE_TTL"])
+# checked until they hold, then remembered instead of being queried on every render
+FACTS = Facts(ttl=app.config["FACTS_TTL"])
+FACTS.register("initialized", cli.is_initialized)
 
 
 # region Views
@@ -65,12 +73,12 @@ def next_page(type_name: str) -> Response:
     task_type = utils.resolve_task_type(type_name, TASKS_TYPES, user)
 
     if task_type is None:
-        return NO_TASKS
+        return utils.no_tasks()
 
     task = task_type.get_next(user)
 
     if not task:
-        return NO_TASKS
+        return utils.no_tasks()
 
     return utils.json_response(
         {"task": task, "stats": user.get_stats(task_type=task_type)},
@@ -100,6 +108,8 @@ def task_home(type_name: str) -> Response | str:
 def leaders(type_name: str) -> Response | str:
     """
     Display a list of most effective participants.
+    Optional `window` query argument (`all_time`, `week` or `month`) limits
+    the period answers are counted within.
 
     :param type_name: Task type name.
 
@@ -110,8 +120,31 @@ def leaders(type_name: str) -> Response | str:
     if task_type is None:
         flask.abort(utils.HTTPStatus.NOT_FOUND)
 
+    window = utils.resolve_leaderboard_window(flask.request.args.get("window"))
+
+    return flask.render_template(
+        utils.get_template_path(app, "leaderboard.html"),
+        task_type=task_type,
+        window=window,
+        leaders=task_type.get_leaderboard(window=window),
+    )
+
+
+@app.route("/leaders", methods=["GET"])
+@login.login_required
+def global_leaders() -> Response | str:
+    """
+    Display a list of most effective participants across all projects.
+
+    :returns: Prepared response.
+    """
+    window = utils.resolve_leaderboard_window(flask.request.args.get("window"))
+
     return flask.render_template(
-        utils.get_template_path(app, "leaderboard.html"), task_type=task_type, leaders=task_type.get_leaderboard()
+        utils.get_template_path(app, "leaderboard.html"),
+        task_type=None,
+        window=window,
+        leaders=GLOBAL_LEADERBOARD.get_leaderboard(10, window),
     )
 
 
@@ -130,12 +163,12 @@ def skip(type_name: str, task_id: str) -> Response:
     task_type = utils.resolve_task_type(type_name, TASKS_TYPES, user)
 
     if task_type is None:
-        return NO_TASKS
+        return utils.no_tasks()
 
     try:
         task_type.skip_task(user=user, task_id=task_id)
     except TaskNotFoundError:
-        return NO_TASKS
+        return utils.no_tasks()
 
     return utils.json_response({"done": True})
 
@@ -155,12 +188,127 @@ def done(type_name: str, task_id: str) -> Response:
     task_type = utils.resolve_task_type(type_name, TASKS_TYPES, user)
 
     if task_type is None:
-        return NO_TASKS
+        return utils.no_tasks()
+
+    key = flask.request.headers.get("Idempotency-Key") or flask.request.form.get("idempotency_key")
+
+    if key is not None and not 0 < len(key) <= AbstractAnswer.idempotency_key.max_length:
+        return utils.json_response({"done": False}, ["Malformed idempotency key"], utils.HTTPStatus.BAD_REQUEST)
+
+    # a retry of the submission which has already been stored
+    if key is not None and (replayed := _replay_submission(task_type, user, task_id, key)) is not None:
+        return replayed
 
     try:
-        task_type.on_task_done(user, task_id, json.loads(flask.request.form.get("result")))
+        task_type.on_task_done(user, task_id, json.loads(flask.request.form.get("result")), idempotency_key=key)
     except TaskNotFoundError:
-        return NO_TASKS
+        return utils.no_tasks()
+    except TaskValidationError:
+        # concurrent retries: the other one has won
+        if key is not None and (replayed := _replay_submission(task_type, user, task_id, key)) is not None:
+            return replayed
+
+        raise
+
+    return utils.json_response({"done": True})
+
+
+def _replay_submission(task_type: AbstractTaskType, user: User, task_id: str, key: str) -> Response | None:
+    """
+    Builds the response to a retried submission.
+
+    :param task_type: Task type instance.
+    :param user: Current user.
+    :param task_id: Task ID of the current request.
+    :param key: Idempotency key of the current request.
+
+    :returns: The response given to the original submission, an error if
+              the key was used for another task, None if the key is new.
+    """
+    answered = task_type.find_submission(user, key)
+
+    if answered is None:
+        return None
+
+    if answered != task_id:
+        return utils.json_response(
+            {"done": False}, ["Idempotency key was used for another task"], utils.HTTPStatus.UNPROCESSABLE_ENTITY
+        )
+
+    response = utils.json_response({"done": True})
+    response.headers["Idempotent-Replayed"] = "true"
+
+    return response
+
+
+@app.route("/type/<string:type_name>/done_many", methods=["POST"])
+@login.login_required
+def done_many(type_name: str) -> Response:
+    """
+    Saves many answers at once, e.g. collected while being offline. The
+    `answers` form field holds a JSON list of `{"task": <task ID>, "result": {...}}`
+    objects. The response reports the outcome of every answer in the same order.
+
+    :param type_name: Task type name.
+
+    :returns: Prepared response.
+    """
+    user = flask.g.user
+    task_type = utils.resolve_task_type(type_name, TASKS_TYPES, user)
+
+    if task_type is None:
+        return utils.no_tasks()
+
+    try:
+        submissions = [(str(a["task"]), dict(a["result"])) for a in json.loads(flask.request.form.get("answers", "[]"))]
+    except (TypeError, ValueError, KeyError):
+        return utils.json_response({"done": False}, ["Malformed answers passed"], utils.HTTPStatus.BAD_REQUEST)
+
+    if len(submissions) > app.config["BULK_SUBMISSION_LIMIT"]:
+        return utils.json_response(
+            {"done": False}, ["Too many answers passed at once"], utils.HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        )
+
+    results = task_type.on_tasks_done_bulk(user, submissions)
+
+    return utils.json_response({"done": all(r.done for r in results), "results": [r._asdict() for r in results]})
+
+
+@app.route("/type/<string:type_name>/activity", methods=["POST"])
+@login.login_required
+def activity(type_name: str) -> Response:
+    """
+    Records time the user has been actively working on tasks. The `activity`
+    form field holds a JSON list of `{"task": <task ID>, "seconds": <int>}`
+    objects, so a few heartbeats could be sent within a single request.
+
+    :param type_name: Task type name.
+
+    :returns: Prepared response.
+    """
+    user = flask.g.user
+    task_type = utils.resolve_task_type(type_name, TASKS_TYPES, user)
+
+    if task_type is None:
+        return utils.no_tasks()
+
+    try:
+        heartbeats = json.loads(flask.request.form.get("activity", "[]"))
+    except ValueError:
+        heartbeats = None
+
+    if not isinstance(heartbeats, list):
+        return utils.json_response({"done": False}, ["Malformed activity passed"], utils.HTTPStatus.BAD_REQUEST)
+
+    if len(heartbeats) > app.config["ACTIVITY_HEARTBEATS_LIMIT"]:
+        return utils.json_response(
+            {"done": False}, ["Too many heartbeats passed at once"], utils.HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+        )
+
+    try:
+        task_type.record_activities(user.id, [(str(h["task"]), int(h["seconds"])) for h in heartbeats])
+    except (TypeError, ValueError, KeyError, OverflowError, WorkSessionUpdateError):
+        return utils.json_response({"done": False}, ["Malformed activity passed"], utils.HTTPStatus.BAD_REQUEST)
 
     return utils.json_response({"done": True})
 
@@ -206,7 +354,7 @@ def is_initialized() -> dict[str, bool]:
 
     :return: a dict with the `init` flag.
     """
-    return {"init": cli.is_initialized()}
+    return {"init": FACTS.holds("initialized")}
 
 
 # endregion Context processors
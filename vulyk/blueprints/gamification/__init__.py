@@ -3,6 +3,8 @@
 The core of gamification sub-project.
 """
 
+import os
+import tempfile
 from collections.abc import Mapping, Sequence
 from decimal import Decimal
 from typing import Any, ClassVar
@@ -10,9 +12,11 @@ from typing import Any, ClassVar
 import flask
 import wtforms
 from flask_login import AnonymousUserMixin
+from mongoengine import signals
 
 from vulyk import utils
 from vulyk.admin.models import AuthModelView, CKTextAreaField, RequiredBooleanField
+from vulyk.blueprints.gamification.logos import LogoCache
 from vulyk.blueprints.gamification.models.events import EventModel
 from vulyk.blueprints.gamification.models.foundations import Fund, FundFilterBy, FundModel
 from vulyk.blueprints.gamification.models.rules import AllRules, ProjectAndFreeRules, RuleModel, StrictProjectRules
@@ -32,12 +36,16 @@ class FundAdmin(AuthModelView):
     }
 
     column_exclude_list: ClassVar[list[str]] = ["description", "logo"]
+    # bumped on save, see `VersionedDocument`
+    form_excluded_columns: ClassVar[list[str]] = ["version", "updated_at"]
 
 
 class RuleAdmin(AuthModelView):
     form_overrides: ClassVar[dict[str, Any]] = {"description": CKTextAreaField}
 
     column_exclude_list: ClassVar[list[str]] = ["description"]
+    # bumped on save, see `VersionedDocument`
+    form_excluded_columns: ClassVar[list[str]] = ["version", "updated_at"]
 
 
 class GamificationModule(VulykModule):
@@ -45,6 +53,11 @@ class GamificationModule(VulykModule):
         super().__init__(*args, **kwargs)
 
         self.config["levels"] = {k: 1 if k == 1 else (k - 1) * 25 for k in range(1, 51)}
+        # funds' logos may be asked for resized to one of these sizes
+        self.config["logo_sizes"] = [64, 141]
+        self.config["logo_cache_folder"] = os.path.join(tempfile.gettempdir(), "vulyk", "logos")
+        # seconds resized logos may be kept by browsers without revalidating
+        self.config["logo_max_age"] = 24 * 60 * 60
 
     def register(self, app: flask.Flask, options: dict[str, Any]) -> None:
         super().register(app, options)
@@ -65,6 +78,13 @@ class GamificationModule(VulykModule):
 
             app.admin.add_view(RuleAdmin(RuleModel))
 
+    @property
+    def logos(self) -> LogoCache:
+        """
+        :return: Resized logos of funds.
+        """
+        return LogoCache(self.config["logo_cache_folder"], self.config["logo_sizes"])
+
     def get_level(self, points: Decimal) -> int:
         """
         Obtains the level that corresponds to a number of points.
@@ -111,8 +131,12 @@ def badges(project: str | None = None, strictness: str | None = None) -> flask.R
         else:
             flask.abort(utils.HTTPStatus.NOT_FOUND)
 
-    return utils.json_response(
-        {"badges": (r.to_dict() for r in RuleModel.get_actual_rules([], filtering, is_weekend=True))}
+    return utils.conditional_response(
+        RuleModel.collection_version(),
+        lambda: utils.json_response(
+            {"badges": [r.to_dict() for r in RuleModel.get_actual_rules([], filtering, is_weekend=True)]},
+            cache=utils.CACHE_REVALIDATE,
+        ),
     )
 
 
@@ -139,7 +163,12 @@ def funds(category: str | None = None) -> flask.Response:
         else:
             flask.abort(utils.HTTPStatus.NOT_FOUND)
 
-    return utils.json_response({"funds": (f.to_dict() for f in FundModel.get_funds(filtering))})
+    return utils.conditional_response(
+        FundModel.collection_version(),
+        lambda: utils.json_response(
+            {"funds": [f.to_dict() for f in FundModel.get_funds(filtering)]}, cache=utils.CACHE_REVALIDATE
+        ),
+    )
 
 
 @gamification.route("/funds/<string:fund_id>/logo", methods=["GET"])
@@ -152,16 +181,49 @@ def fund_logo(fund_id: str) -> flask.Response:
     proxy has a field named `format`, which contain an uppercase name of
     the type. E.g.: 'JPEG'.
 
+    The logo may be asked for resized with `size` parameter that takes one of
+    sizes configured, resized logos are served from the local disk.
+    Clients having the current version of the logo get 304 without it being
+    read at all.
+
     :param fund_id: Current fund ID.
 
     :return: An response with a file or 404 if fund is not found.
     """
-    fund: Fund | None = FundModel.find_by_id(fund_id)
+    size: int | None = flask.request.args.get("size", type=int)
+    version = FundModel.version_of(fund_id)
 
-    if fund is None or fund.logo is None:
+    if version is None or (size is not None and not gamification.logos.supports(size)):
         flask.abort(utils.HTTPStatus.NOT_FOUND)
 
-    return flask.send_file(fund.logo, mimetype="image/{}".format(fund.logo.format.lower()))
+    def send_logo() -> flask.Response:
+        fund: Fund | None = FundModel.find_by_id(fund_id)
+
+        if fund is None or fund.logo is None:
+            flask.abort(utils.HTTPStatus.NOT_FOUND)
+
+        response = flask.send_file(fund.logo, mimetype="image/{}".format(fund.logo.format.lower()))
+        response.headers["Cache-Control"] = utils.CACHE_REVALIDATE
+
+        return response
+
+    if size is None:
+        return utils.conditional_response(version, send_logo)
+
+    cache = "public, max-age={}".format(gamification.config["logo_max_age"])
+
+    def send_resized_logo() -> flask.Response:
+        path = gamification.logos.get(fund_id, size)
+
+        if path is None:
+            flask.abort(utils.HTTPStatus.NOT_FOUND)
+
+        response = flask.send_file(path, mimetype="image/png", etag=False, conditional=False)
+        response.headers["Cache-Control"] = cache
+
+        return response
+
+    return utils.conditional_response(version, send_resized_logo, cache)
 
 
 @gamification.route("/events/unseen", methods=["GET"])  # noqa: RET503
@@ -278,6 +340,19 @@ def donate() -> flask.Response:
     )
 
 
+def drop_resized_logos(sender: type, document: FundModel, **kwargs: Any) -> None:
+    """
+    Removes resized logos of a fund once it's changed.
+
+    :param sender: Document class.
+    :param document: Changed fund.
+    """
+    gamification.logos.invalidate(str(document.id))
+
+
+signals.post_save.connect(drop_resized_logos, sender=FundModel)
+
+
 def get_stats_service() -> dict[str, type[StatsService]]:
     return {"stats_service": StatsService}
 
@@ -4,10 +4,12 @@ from datetime import datetime, timezone
 from decimal import Decimal
 
 from bson import ObjectId
+from mongoengine.context_managers import no_dereference
 
+from vulyk.ext.jobs import deferrable
 from vulyk.models.stats import WorkSession
 from vulyk.models.tasks import AbstractAnswer, Batch
-from vulyk.signals import on_batch_done, on_task_done
+from vulyk.signals import on_batch_done, on_task_done, on_tasks_done
 
 from .core.events import Event
 from .core.queries import MongoRuleExecutor
@@ -18,10 +20,22 @@ from .models.rules import ProjectAndFreeRules, RuleModel
 from .models.state import UserStateModel
 from .models.task_types import COINS_PER_TASK_KEY, POINTS_PER_TASK_KEY, AbstractGamifiedTaskType
 
-__all__ = ["get_actual_rules", "track_events"]
+__all__ = ["get_actual_rules", "track_events", "track_events_bulk"]
 
 
-@on_task_done.connect
+def _user_key(answer: AbstractAnswer) -> str:
+    """
+    Key of deferred listeners that read and then update the state of the
+    answer's author: calls for the same user are made one at a time.
+
+    :param answer: Answer of the user.
+    :return: Job key.
+    """
+    with no_dereference(type(answer)):
+        return "user:{}".format(answer.created_by.id)
+
+
+@deferrable(on_task_done, key=lambda sender, answer: _user_key(answer))
 def track_events(sender: object, answer: AbstractAnswer) -> None:
     """
     The most important gear of the gamification module.
@@ -89,6 +103,90 @@ def track_events(sender: object, answer: AbstractAnswer) -> None:
         ).save()
 
 
+@deferrable(on_tasks_done, key=lambda sender, answers: _user_key(answers[0]) if answers else None)
+def track_events_bulk(sender: object, answers: list[AbstractAnswer]) -> None:
+    """
+    Counterpart of `track_events` for answers submitted at once by a user.
+
+    The state is read and updated once and rules are checked once, after all
+    the answers are accounted. Every answer gets its event, the one of the
+    last answer carries the badges and the new level.
+
+    :param sender: Sender.
+    :param answers: Finished tasks' answer instances.
+    """
+    from vulyk.app import TASKS_TYPES
+    from vulyk.blueprints.gamification import gamification
+
+    answers = [a for a in answers if isinstance(TASKS_TYPES.get(a.task_type), AbstractGamifiedTaskType)]
+    batch_ids: dict[ObjectId, str] = {}
+
+    for answer in answers:
+        # the batch ID is all we need, batches are fetched at once below
+        with no_dereference(type(answer.task)):
+            if answer.task.batch is not None:
+                batch_ids[answer.pk] = answer.task.batch.id
+
+    if not batch_ids:
+        return
+
+    batches = {b.id: b for b in Batch.objects(id__in=list(set(batch_ids.values())))}
+    gamified = [(a, batches[batch_ids[a.pk]]) for a in answers if batch_ids.get(a.pk) in batches]
+
+    if not gamified:
+        return
+
+    user = gamified[0][0].created_by
+    dt = datetime.now(timezone.utc)
+    state = UserStateModel.get_or_create_by_user(user)
+    badges = list(
+        filter(
+            lambda rule: MongoRuleExecutor.achieved(user_id=user.id, rule=rule, collection=WorkSession.objects),
+            get_actual_rules(state=state, task_type_name=gamified[0][1].task_type, now=dt),
+        )
+    )
+    gains = [
+        (Decimal(b.batch_meta[POINTS_PER_TASK_KEY]), Decimal(b.batch_meta[COINS_PER_TASK_KEY])) for _, b in gamified
+    ]
+    # badges' bonuses go to the last answer along with the badges themselves
+    bonus = sum((b.bonus for b in badges if b.bonus), Decimal(0))
+    gains[-1] = (gains[-1][0] + bonus, gains[-1][1])
+    points = sum((p for p, _ in gains), Decimal(0))
+
+    current_level = gamification.get_level(state.points)
+    updated_level = gamification.get_level(state.points + points)
+
+    UserStateModel.update_state(
+        diff=UserState(
+            user=user,
+            level=updated_level,
+            points=points,
+            actual_coins=Decimal(0),
+            potential_coins=sum((c for _, c in gains), Decimal(0)),
+            achievements=badges,
+            last_changed=dt,
+        )
+    )
+    events = []
+
+    for i, ((answer, _), (answer_points, answer_coins)) in enumerate(zip(gamified, gains, strict=True)):
+        last = i == len(gamified) - 1
+        event = Event.build(
+            timestamp=dt,
+            user=user,
+            answer=answer,
+            points_given=answer_points,
+            coins=answer_coins,
+            achievements=badges if last else [],
+            acceptor_fund=None,
+            level_given=updated_level if last and current_level != updated_level else None,
+            viewed=False,
+        )
+        events.append(EventModel.from_event(event))
+
+    EventModel.objects.insert(events, load_bulk=False)
+
+
 def get_actual_rules(state: UserState, task_type_name: str, now: datetime) -> Iterator[Rule]:
     """
     Returns a list of eligible rules.
@@ -106,7 +204,7 @@ def get_actual_rules(state: UserState, task_type_name: str, now: datetime) -> It
     )
 
 
-@on_batch_done.connect
+@deferrable(on_batch_done)
 def materialize_coins(sender: Batch) -> None:
     """
     Convert potential coins to active ones for every member participated upon
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Resized copies of funds' logos kept on the local disk, so that showing a
+small logo doesn't take reading and decoding the original from GridFS.
+"""
+
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable
+from typing import IO
+
+from PIL import Image
+
+from .models.foundations import FundModel
+
+__all__ = ["LogoCache"]
+
+
+class LogoCache:
+    """
+    Logos are resized on the first request and stored as
+    `<folder>/<fund>/<logo file ID>-<size>.png`. A new logo gets a new file ID
+    in GridFS, so stale copies are never served, though they're removed once
+    the fund is changed.
+    """
+
+    def __init__(self, folder: str, sizes: Iterable[int]) -> None:
+        """
+        :param folder: Where resized logos are kept.
+        :param sizes: Allowed sizes (the longest side in pixels).
+        """
+        self._folder = folder
+        self._sizes = frozenset(sizes)
+
+    def supports(self, size: int) -> bool:
+        """
+        :param size: The longest side in pixels.
+
+        :return: True if logos are resized to the size.
+        """
+        return size in self._sizes
+
+    def get(self, fund_id: str, size: int) -> str | None:
+        """
+        Looks for a resized logo, resizing the original if there's none yet.
+        Only the original logo is read from GridFS and only once.
+
+        :param fund_id: Fund's ID.
+        :param size: One of allowed sizes.
+
+        :return: Path to the PNG file or None if the fund has no logo.
+
+        :raises:
+            ValueError: If the size isn't allowed.
+        """
+        if not self.supports(size):
+            raise ValueError("Logos aren't resized to {}px".format(size))
+
+        fund = FundModel.objects(id=fund_id).only("logo").first()
+
+        if fund is None or not fund.logo:
+            return None
+
+        path = os.path.join(self._fund_folder(fund_id), "{}-{}.png".format(fund.logo.grid_id, size))
+
+        if not os.path.exists(path):
+            self._resize(fund.logo.get(), size, path)
+
+        return path
+
+    def invalidate(self, fund_id: str) -> None:
+        """
+        Removes resized logos of the fund.
+
+        :param fund_id: Fund's ID.
+        """
+        shutil.rmtree(self._fund_folder(fund_id), ignore_errors=True)
+
+    def _fund_folder(self, fund_id: str) -> str:
+        # IDs are arbitrary strings, so they're not trusted as file names
+        return os.path.join(self._folder, fund_id.encode().hex())
+
+    @staticmethod
+    def _resize(original: IO[bytes], size: int, path: str) -> None:
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        image: Image.Image
+
+        with Image.open(original) as image:
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+
+            # PNG can't hold e.g. CMYK of print-sourced JPEGs
+            if image.mode not in ("L", "LA", "P", "RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+            # other workers may be resizing the same logo at the moment
+            fd, tmp = tempfile.mkstemp(suffix=".png", dir=folder)
+
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    image.save(f, format="PNG")
+
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
@@ -8,10 +8,10 @@ from collections.abc import Iterator
 from enum import Enum
 from typing import Any, ClassVar
 
-from flask_mongoengine.documents import Document
-from mongoengine import BooleanField, EmailField, ImageField, Q, StringField
+from mongoengine import BooleanField, EmailField, ImageField, Q, StringField, signals
 
 from ..core.foundations import Fund
+from .versioned import VersionedDocument
 
 __all__ = ["FundFilterBy", "FundModel"]
 
@@ -26,7 +26,7 @@ class FundFilterBy(Enum):
     NON_DONATABLE = 2
 
 
-class FundModel(Document):
+class FundModel(VersionedDocument):
     """
     Database-specific foundation representation.
     """
@@ -123,3 +123,6 @@ class FundModel(Document):
 
     def __repr__(self) -> str:
         return str(self)
+
+
+signals.pre_save.connect(FundModel.pre_save, sender=FundModel)
@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 from typing import Any, ClassVar, Iterator, List
 
-from flask_mongoengine.documents import Document
-from mongoengine import BooleanField, IntField, Q, StringField
+from mongoengine import BooleanField, IntField, Q, StringField, signals
 
 from ..core.rules import ProjectRule, Rule
+from .versioned import VersionedDocument
 
 __all__ = ["AllRules", "ProjectAndFreeRules", "RuleModel", "StrictProjectRules"]
 
@@ -90,7 +90,7 @@ class StrictProjectRules(RuleFilter):
         return False
 
 
-class RuleModel(Document):
+class RuleModel(VersionedDocument):
     """
     Database-specific rule representation.
     """
@@ -187,3 +187,6 @@ class RuleModel(Document):
 
     def __repr__(self) -> str:
         return "RuleModel({model})".format(model=repr(self.to_rule()))
+
+
+signals.pre_save.connect(RuleModel.pre_save, sender=RuleModel)
@@ -21,13 +21,15 @@ class AbstractGamifiedTaskType(AbstractTaskType):
         :return: Next open batch for this task type
         """
 
-        for batch in Batch.objects.filter(task_type=self.type_name, closed__ne=True).order_by("id"):
-            if batch.tasks_count == batch.tasks_processed:
-                continue
-
-            return batch
-
-        return None
+        return (
+            Batch.objects(
+                task_type=self.type_name,
+                closed__ne=True,
+                __raw__={"$expr": {"$lt": [{"$ifNull": ["$tasksProcessed", 0]}, {"$ifNull": ["$tasksCount", 0]}]}},
+            )
+            .order_by("id")
+            .first()
+        )
 
     def to_dict(self) -> dict[str, str | dict[str, Any] | None]:
         """
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Documents rarely changed and often read by clients, so their readers may
+rely on versions instead of fetching them again.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, ClassVar
+
+from flask_mongoengine.documents import Document
+from mongoengine import DateTimeField, IntField
+
+__all__ = ["Version", "VersionedDocument"]
+
+# entity tag and the time of the last change, if known
+Version = tuple[str, datetime | None]
+
+
+class VersionedDocument(Document):
+    """
+    Document which version is bumped on every save.
+    """
+
+    version = IntField(default=0)
+    updated_at = DateTimeField(db_field="updatedAt")
+
+    meta: ClassVar[dict[str, Any]] = {"abstract": True}
+
+    @classmethod
+    def collection_version(cls) -> Version:
+        """
+        The version of the whole collection: changes once any document
+        is saved, added or removed. Only versions are fetched.
+
+        Removals can't be dated, so there's no time of the last change.
+
+        :return: Entity tag of the collection.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+
+        for doc in cls.objects.only("id", "version").order_by("id").as_pymongo():
+            digest.update("{}:{};".format(doc["_id"], doc.get("version", 0)).encode())
+
+        return digest.hexdigest(), None
+
+    @classmethod
+    def version_of(cls, doc_id: Any) -> Version | None:
+        """
+        The version of a single document. Only the version is fetched.
+
+        :param doc_id: Document ID.
+
+        :return: Entity tag and the time of the last change or None if the
+            document doesn't exist.
+        """
+        doc = cls.objects(id=doc_id).only("version", "updated_at").as_pymongo().first()
+
+        if doc is None:
+            return None
+
+        return "{}:{}".format(doc_id, doc.get("version", 0)), _aware(doc.get("updatedAt"))
+
+    @classmethod
+    def pre_save(cls, sender: type, document: "VersionedDocument", **kwargs: Any) -> None:
+        """
+        Bumps the version of a document being saved, e.g. from the admin.
+
+        :param sender: Document class.
+        :param document: Document being saved.
+        """
+        document.version = (document.version or 0) + 1
+        # HTTP dates have no fractions of seconds
+        document.updated_at = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def _aware(moment: datetime | None) -> datetime | None:
+    # dates are read back naive unless the connection is tz-aware
+    if moment is None or moment.tzinfo is not None:
+        return moment
+
+    return moment.replace(tzinfo=timezone.utc)
@@ -13,6 +13,7 @@ from vulyk.blueprints.gamification.core.state import UserState
 from vulyk.blueprints.gamification.models.events import EventModel
 from vulyk.blueprints.gamification.models.foundations import FundModel
 from vulyk.blueprints.gamification.models.state import UserStateModel
+from vulyk.models.stats import WorkSession
 from vulyk.models.tasks import AbstractTask
 from vulyk.models.user import User
 
@@ -122,16 +123,8 @@ class StatsService:
         :param user: Current user.
         :return: Full hours.
         """
-        from vulyk.app import TASKS_TYPES
-
-        seconds = 0
-
-        for task_type in TASKS_TYPES.values():
-            ws = task_type.work_session_manager
-            # TODO: must be changed after time tracking on frontend is done
-            seconds += ws.work_session.get_total_user_time_approximate(user.id)
-
-        return seconds // 3600
+        # TODO: must be changed after time tracking on frontend is done
+        return WorkSession.get_total_user_time_approximate(user.id) // 3600
 
     @classmethod
     def total_number_of_open_tasks(cls) -> int:
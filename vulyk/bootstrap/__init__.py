@@ -10,6 +10,11 @@ import contextlib
 import flask
 from flask_mongoengine import MongoEngine
 
+from vulyk.ext.compression import Compression
+from vulyk.ext.metrics import METRICS
+from vulyk.ext.monitoring import CommandMonitor
+from vulyk.ext.profiler import Profiler
+
 from . import _assets, _blueprints, _logging, _social_login
 from ._tasks import init_plugins
 
@@ -39,6 +44,10 @@ def init_app(name: str) -> flask.Flask:
         _logging.init_logger(app=app)
         app.logger.info("STARTING.")
 
+        # listeners must be registered before the client is created
+        if app.config.get("DB_SLOW_COMMAND_MS") or app.config.get("DB_SERVER_TIMING"):
+            CommandMonitor(slow_ms=app.config.get("DB_SLOW_COMMAND_MS", 0)).init_app(app)
+
         db = MongoEngine(app)
 
         app.logger.debug(
@@ -50,6 +59,10 @@ def init_app(name: str) -> flask.Flask:
         _assets.init(app)
         _social_login.init_social_login(app, db)
 
+        # goes after the login, which tells if the user is an admin
+        if app.config.get("PROFILER_ENABLED", False):
+            Profiler().init_app(app)
+
         if app.config.get("ENABLE_ADMIN", False):
             from . import _admin
 
@@ -57,6 +70,12 @@ def init_app(name: str) -> flask.Flask:
 
         _blueprints.init_blueprints(app)
 
+        if app.config.get("METRICS_ENABLED", False):
+            METRICS.init_app(app)
+
+        if app.config.get("COMPRESS_RESPONSES", False):
+            Compression(app.config["COMPRESS_MIMETYPES"], app.config["COMPRESS_MIN_SIZE"]).init_app(app)
+
         setattr(init_app, key, app)
 
         app.logger.info("Vulyk bootstrapping complete.")
@@ -3,7 +3,8 @@
 import flask_admin as admin
 import flask_login as login
 
-from vulyk.admin.models import AuthModelView
+from vulyk.admin.models import AuthModelView, ProfileAdmin
+from vulyk.models.stats import RequestProfile
 from vulyk.models.user import User
 
 __all__ = ["AuthAdminIndexView", "init_admin"]
@@ -18,5 +19,6 @@ def init_admin(app) -> admin.Admin:
     adm = admin.Admin(app, "Vulyk: Admin", index_view=AuthAdminIndexView(), template_mode="bootstrap3")
 
     adm.add_view(AuthModelView(User))
+    adm.add_view(ProfileAdmin(RequestProfile, name="Profiles"))
 
     return adm
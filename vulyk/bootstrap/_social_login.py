@@ -2,7 +2,6 @@
 """Module contains stuff related to interoperability with PSA."""
 
 import datetime
-from datetime import timezone
 
 import flask_login as login
 from flask import g
@@ -30,13 +29,15 @@ def init_social_login(app, db) -> None:
     login_manager.login_message = ""
     login_manager.init_app(app)
 
+    # every authenticated request loads the user, don't write on each of them
+    touch_interval = datetime.timedelta(seconds=app.config.get("LAST_LOGIN_UPDATE_INTERVAL", 0))
+
     @login_manager.user_loader
     def load_user(userid) -> User | None:
         try:
             user = User.objects.get(id=userid)
             if user:
-                user.last_login = datetime.datetime.now(timezone.utc)
-                user.save()
+                user.touch(touch_interval)
             return user
         except (TypeError, ValueError, User.DoesNotExist):
             return None
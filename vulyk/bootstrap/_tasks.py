@@ -13,6 +13,9 @@ from vulyk.models.task_types import AbstractTaskType
 
 __all__ = ["init_plugins"]
 
+# Application-wide settings every task type receives unless the plugin overrides them.
+CORE_TASK_SETTINGS: tuple[str, ...] = ("LEADERBOARD_CACHE_TTL", "ACTIVITY_FLUSH_INTERVAL", "ACTIVITY_BUFFER_SIZE")
+
 
 def _init_plugin_assets(app: Flask, task_type: AbstractTaskType, static_path: PathLike | str) -> list[str]:
     """
@@ -69,7 +72,8 @@ def init_plugins(app: Flask) -> dict[str, AbstractTaskType]:
 
         task_settings = import_string("{plugin_name}.settings".format(plugin_name=plugin))
         plugin_type = import_string("{plugin_name}".format(plugin_name=plugin))
-        settings = plugin_type.configure(task_settings)
+        settings = {k: app.config[k] for k in CORE_TASK_SETTINGS if k in app.config}
+        settings.update(plugin_type.configure(task_settings))
 
         task_type = import_string("{plugin_name}.models.task_types.{task}".format(plugin_name=plugin, task=task))
 
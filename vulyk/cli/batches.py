@@ -93,7 +93,7 @@ def remove_batch(batch_id: str, *, purge: bool = False) -> None:
 
     :raise click.BadParameter: if wrong `batch_id` has been passed.
     """
-    from vulyk.models.stats import WorkSession
+    from vulyk.models.stats import TaskCounters, WorkSession
 
     try:
         batch = Batch.objects.get(id=batch_id)
@@ -108,6 +108,7 @@ def remove_batch(batch_id: str, *, purge: bool = False) -> None:
 
     AbstractTask.objects(batch=batch).delete()
     batch.delete()
+    TaskCounters.recount(batch.task_type)
 
 
 def batches_list() -> list[str]:
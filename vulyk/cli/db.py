@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import gzip
 from collections.abc import Generator
+from datetime import timedelta
 from io import IOBase
 from typing import Any
 
@@ -8,6 +9,8 @@ import bz2file as bz2
 import orjson as json
 from click import echo
 
+from vulyk.ext.worksession import WorkSessionManager
+from vulyk.models.stats import WorkSession
 from vulyk.models.task_types import AbstractTaskType
 from vulyk.utils import chunked
 
@@ -111,3 +114,19 @@ def export_reports(
         echo("Got IO error when tried to read {0}: {1}".format(path, e))
 
     echo("Finished exporting answers for {0:d} tasks".format(i))
+
+
+def reap_sessions(hours: int, task_type: AbstractTaskType | None = None) -> int:
+    """
+    Removes work sessions that were started more than `hours` ago and never
+    finished nor skipped.
+
+    :param hours: Age of unfinished session to consider it abandoned.
+    :param task_type: Optional task type to limit the sweep with.
+
+    :return: Number of removed sessions.
+    """
+    if task_type is None:
+        return WorkSessionManager(WorkSession).reap_abandoned(timedelta(hours=hours))
+
+    return task_type.work_session_manager.reap_abandoned(timedelta(hours=hours), task_type.type_name)
@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+Generates synthetic data of realistic volumes to benchmark and test scaling:
+users, groups, batches, tasks, answers, work sessions and gamification events
+and states. Documents are inserted in bulk, tasks with everything done upon
+them are generated in chunks by a pool of processes.
+
+The data depends only on the plan (including its seed), not on the number
+of processes or the size of chunks.
+"""
+
+import multiprocessing
+import random
+from collections import Counter
+from collections.abc import Callable, Iterable, Mapping
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import partial
+from typing import Any, NamedTuple
+
+import click
+from bson import ObjectId
+from mongoengine import Document, connect
+from pymongo import UpdateOne
+
+from vulyk.blueprints.gamification.models.events import EventModel
+from vulyk.blueprints.gamification.models.state import UserStateModel
+from vulyk.models.stats import WorkSession
+from vulyk.models.tasks import AbstractAnswer, AbstractTask, Batch
+from vulyk.models.user import Group, User
+
+__all__ = ["SeedPlan", "seed"]
+
+# kinds of generated IDs, so ones of different documents never clash
+_USER, _ANSWER, _SESSION, _EVENT = range(4)
+# answers are given within daylight mostly: hours of the day and their weights
+_HOURS = range(24)
+_HOUR_WEIGHTS = (1, 1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 8, 7, 7, 8, 8, 8, 8, 9, 10, 10, 8, 5, 2)
+
+
+class SeedPlan(NamedTuple):
+    """
+    What to generate.
+    """
+
+    task_type: str
+    task_model: type[AbstractTask]
+    answer_model: type[AbstractAnswer]
+    # IDs of users, groups, batches and tasks start with it
+    prefix: str
+    users: int
+    groups: int
+    batches: int
+    tasks: int
+    # answers a task gets to be closed
+    redundancy: int
+    # share of tasks which are closed, the rest get fewer answers
+    done: float
+    # size of `task_data` in bytes, roughly
+    data_size: int
+    # answers are given within `days` before `until`
+    until: datetime
+    days: int
+    seed: int
+    batch_meta: Mapping[str, Any]
+    # points and coins an answer brings, None if the task type isn't gamified
+    points: Decimal | None = None
+    coins: Decimal | None = None
+
+    @property
+    def since(self) -> datetime:
+        return self.until - timedelta(days=self.days)
+
+    def user_id(self, n: int) -> ObjectId:
+        return _object_id(self.since, _USER, n)
+
+    def batch_id(self, n: int) -> str:
+        return "{}-batch{}".format(self.prefix, n)
+
+    def batch_of(self, task: int) -> int:
+        return task * self.batches // self.tasks
+
+
+class _ChunkStats(NamedTuple):
+    documents: int
+    tasks: int
+    # (user index, batch index) -> answers
+    answers: Counter
+    # user index -> time of the latest answer
+    latest: dict[int, datetime]
+    # batch index -> closed tasks
+    closed: Counter
+
+
+def seed(
+    plan: SeedPlan,
+    level_of: Callable[[Decimal], int],
+    db_settings: Mapping[str, Any],
+    processes: int = 1,
+    chunk: int = 10_000,
+    progress: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Generates the data planned.
+
+    :param plan: What to generate.
+    :param level_of: Gamification level reached with a number of points.
+    :param db_settings: `MONGODB_SETTINGS` for processes to connect with.
+    :param processes: Processes generating tasks, 1 does it in this one.
+    :param chunk: Tasks generated and inserted at once.
+    :param progress: Called with a number of tasks generated as they are.
+
+    :return: Number of documents inserted.
+
+    :raise: click.BadParameter
+    """
+    if Batch.objects(id__startswith="{}-".format(plan.prefix)).count():
+        raise click.BadParameter("Batches prefixed with {} exist already".format(plan.prefix))
+
+    documents = _seed_users(plan, chunk)
+    Batch.objects.insert(
+        [
+            Batch(
+                id=plan.batch_id(b),
+                task_type=plan.task_type,
+                tasks_count=_batch_size(plan, b),
+                batch_meta=dict(plan.batch_meta),
+            )
+            for b in range(plan.batches)
+        ],
+        load_bulk=False,
+    )
+    documents += plan.batches
+
+    bounds = [(start, min(start + chunk, plan.tasks)) for start in range(0, plan.tasks, chunk)]
+    generate = partial(_seed_tasks, plan)
+    answers: Counter = Counter()
+    latest: dict[int, datetime] = {}
+    closed: Counter = Counter()
+
+    if processes > 1:
+        context = multiprocessing.get_context("spawn")
+
+        with context.Pool(processes, initializer=_connect, initargs=(dict(db_settings),)) as pool:
+            results: Iterable[_ChunkStats] = list(_reported(pool.imap_unordered(generate, bounds), progress))
+    else:
+        results = _reported(map(generate, bounds), progress)
+
+    for stats in results:
+        documents += stats.documents
+        answers.update(stats.answers)
+        closed.update(stats.closed)
+
+        for user, when in stats.latest.items():
+            latest[user] = max(when, latest.get(user, when))
+
+    return documents + _tally(plan, level_of, answers, latest, closed)
+
+
+def _reported(results: Iterable[_ChunkStats], progress: Callable[[int], None] | None) -> Iterable[_ChunkStats]:
+    for stats in results:
+        if progress is not None:
+            progress(stats.tasks)
+
+        yield stats
+
+
+def _connect(db_settings: Mapping[str, Any]) -> None:
+    # spawned processes don't inherit the connection
+    connect(**{k.lower(): v for k, v in db_settings.items() if v is not None})
+
+
+def _seed_users(plan: SeedPlan, chunk: int) -> int:
+    """
+    Inserts groups allowed to the task type and users spread among them.
+
+    :param plan: What to generate.
+    :param chunk: Users inserted at once.
+
+    :return: Number of documents inserted.
+    """
+    Group.objects(id="default").update_one(
+        upsert=True, add_to_set__allowed_types=plan.task_type, set_on_insert__description="default group"
+    )
+    groups = ["{}-group{}".format(plan.prefix, g) for g in range(plan.groups)]
+    Group.objects.insert(
+        [Group(id=g, description="Seeded group", allowed_types=[plan.task_type]) for g in groups], load_bulk=False
+    )
+
+    collection = User._get_collection()  # noqa: SLF001
+
+    for start in range(0, plan.users, chunk):
+        collection.insert_many(
+            [
+                _raw(
+                    User,
+                    id=plan.user_id(n),
+                    username="{}{}".format(plan.prefix, n),
+                    name="Volunteer {}".format(n),
+                    email="{}{}@example.com".format(plan.prefix, n),
+                    active=True,
+                    admin=False,
+                    groups=["default", groups[n % len(groups)]] if groups else ["default"],
+                    last_login=plan.until,
+                    processed=0,
+                )
+                for n in range(start, min(start + chunk, plan.users))
+            ],
+            ordered=False,
+        )
+
+    return len(groups) + plan.users
+
+
+def _seed_tasks(plan: SeedPlan, bounds: tuple[int, int]) -> _ChunkStats:
+    """
+    Generates and inserts a range of tasks with answers, work sessions and
+    gamification events.
+
+    :param plan: What to generate.
+    :param bounds: The first task and the one after the last.
+
+    :return: What's been generated.
+    """
+    rng = random.Random()  # noqa: S311
+    tasks, answers, sessions, events = [], [], [], []
+    by_user: Counter = Counter()
+    latest: dict[int, datetime] = {}
+    closed: Counter = Counter()
+
+    for n in range(*bounds):
+        # every task gets its own sequence, which doesn't depend on chunks
+        rng.seed(plan.seed << 40 | n)
+        batch = plan.batch_of(n)
+        task_id = "{}-{}".format(plan.prefix, n)
+        is_done = rng.random() < plan.done
+        answered = plan.redundancy if is_done else rng.randrange(plan.redundancy)
+        users = rng.sample(range(plan.users), min(answered, plan.users))
+        others = [u for u in rng.sample(range(plan.users), min(2, plan.users)) if u not in users]
+        skipped = others[:1] if rng.random() < 0.1 else []
+
+        tasks.append(
+            _raw(
+                plan.task_model,
+                id=task_id,
+                task_type=plan.task_type,
+                batch=plan.batch_id(batch),
+                users_count=len(users),
+                users_processed=[plan.user_id(u) for u in users],
+                users_skipped=[plan.user_id(u) for u in skipped],
+                closed=is_done,
+                task_data={"number": n, "text": rng.randbytes(plan.data_size // 2).hex()},
+            )
+        )
+        closed[batch] += is_done
+
+        for i, user in enumerate(users):
+            seq = n * plan.redundancy + i
+            # a day within the span and an hour of it
+            finished = (
+                plan.since
+                + timedelta(days=rng.randrange(plan.days))
+                + timedelta(hours=rng.choices(_HOURS, _HOUR_WEIGHTS)[0], seconds=rng.randrange(3600))
+            )
+            # median session takes a minute and a half, some take much longer
+            duration = min(rng.lognormvariate(4.5, 0.8), 3600.0)
+            answer_id = _object_id(finished, _ANSWER, seq)
+
+            answers.append(
+                _raw(
+                    plan.answer_model,
+                    id=answer_id,
+                    task=task_id,
+                    created_by=plan.user_id(user),
+                    created_at=finished,
+                    task_type=plan.task_type,
+                    result={"answer": rng.choice(("yes", "no", "unsure"))},
+                )
+            )
+            sessions.append(
+                _raw(
+                    WorkSession,
+                    id=_object_id(finished, _SESSION, seq),
+                    user=plan.user_id(user),
+                    task=task_id,
+                    task_type=plan.task_type,
+                    answer=answer_id,
+                    start_time=finished - timedelta(seconds=duration),
+                    end_time=finished,
+                    activity=int(duration * rng.uniform(0.5, 1.0)),
+                )
+            )
+
+            if plan.points is not None:
+                events.append(
+                    _raw(
+                        EventModel,
+                        id=_object_id(finished, _EVENT, seq),
+                        timestamp=finished,
+                        user=plan.user_id(user),
+                        answer=answer_id,
+                        points_given=plan.points,
+                        coins=plan.coins,
+                        achievements=[],
+                        viewed=rng.random() < 0.8,
+                    )
+                )
+
+            by_user[(user, batch)] += 1
+            latest[user] = max(finished, latest.get(user, finished))
+
+    for model, docs in (
+        (plan.task_model, tasks),
+        (plan.answer_model, answers),
+        (WorkSession, sessions),
+        (EventModel, events),
+    ):
+        if docs:
+            model._get_collection().insert_many(docs, ordered=False)  # noqa: SLF001
+
+    return _ChunkStats(
+        documents=len(tasks) + len(answers) + len(sessions) + len(events),
+        tasks=len(tasks),
+        answers=by_user,
+        latest=latest,
+        closed=closed,
+    )
+
+
+def _tally(
+    plan: SeedPlan,
+    level_of: Callable[[Decimal], int],
+    answers: Counter,
+    latest: dict[int, datetime],
+    closed: Counter,
+) -> int:
+    """
+    Brings counters of users and batches in line with the answers generated
+    and creates gamification states of users who answered anything.
+
+    :param plan: What to generate.
+    :param level_of: Gamification level reached with a number of points.
+    :param answers: Answers by user and batch.
+    :param latest: Time of the latest answer by user.
+    :param closed: Closed tasks by batch.
+
+    :return: Number of documents inserted.
+    """
+    done = {b for b in range(plan.batches) if closed[b] == _batch_size(plan, b)}
+    totals: Counter = Counter()
+    # coins of closed batches are materialized
+    actual: Counter = Counter()
+
+    for b in range(plan.batches):
+        Batch.objects(id=plan.batch_id(b)).update_one(set__tasks_processed=closed[b], set__closed=b in done)
+
+    for (user, batch), count in answers.items():
+        totals[user] += count
+
+        if batch in done:
+            actual[user] += count
+
+    if totals:
+        User._get_collection().bulk_write(  # noqa: SLF001
+            [UpdateOne({"_id": plan.user_id(u)}, {"$set": {"processed": c}}) for u, c in totals.items()],
+            ordered=False,
+        )
+
+    per_task, coins_per_task = plan.points, plan.coins
+
+    if per_task is None or coins_per_task is None or not totals:
+        return 0
+
+    states = []
+
+    for user, count in totals.items():
+        points = per_task * count
+
+        states.append(
+            _raw(
+                UserStateModel,
+                user=plan.user_id(user),
+                level=level_of(points),
+                points=points,
+                actual_coins=coins_per_task * actual[user],
+                potential_coins=coins_per_task * (count - actual[user]),
+                achievements=[],
+                last_changed=latest[user],
+            )
+        )
+
+    UserStateModel._get_collection().insert_many(states, ordered=False)  # noqa: SLF001
+
+    return len(states)
+
+
+def _batch_size(plan: SeedPlan, batch: int) -> int:
+    # tasks n with n * batches // tasks == batch
+    first = -(-batch * plan.tasks // plan.batches)
+    after = -(-(batch + 1) * plan.tasks // plan.batches)
+
+    return after - first
+
+
+def _object_id(when: datetime, kind: int, n: int) -> ObjectId:
+    """
+    Makes IDs sorted by time like real ones, yet reproducible.
+
+    :param when: Creation time.
+    :param kind: Kind of the document.
+    :param n: Sequence number unique within the kind.
+
+    :return: New ID.
+    """
+    return ObjectId(int(when.timestamp()).to_bytes(4, "big") + (kind << 56 | n).to_bytes(8, "big"))
+
+
+def _raw(model: type[Document], **values: Any) -> dict[str, Any]:
+    """
+    Converts values of fields the way the model would, skipping validation
+    and the rest of what building documents costs.
+
+    :param model: Model of the document.
+    :param values: Values by field name.
+
+    :return: Document ready to be inserted.
+    """
+    fields = model._fields
+    doc = {fields[k].db_field: fields[k].to_mongo(v) for k, v in values.items()}
+
+    if model._meta.get("allow_inheritance"):  # noqa: SLF001
+        doc["_cls"] = model._class_name  # noqa: SLF001
+
+    return doc
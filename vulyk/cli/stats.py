@@ -4,6 +4,7 @@ from collections import OrderedDict
 from mongoengine import Q
 
 from vulyk.app import TASKS_TYPES
+from vulyk.models.stats import AnswersRollup, TaskCounters, WorkTimeTotals
 from vulyk.models.tasks import AbstractTask, Batch
 
 
@@ -66,3 +67,38 @@ def _breakdown_by_processed(batch: str) -> str:
         result.append("{:>12}: {}".format(*i))
 
     return "\n".join(result)
+
+
+def backfill_rollups(task_type: str | None) -> int:
+    """
+    Rebuilds daily answers rollups windowed leaderboards rely on.
+
+    :param task_type: Optional name of task type to limit the backfill with.
+
+    :returns: Number of rollups written.
+    """
+    task_types = [TASKS_TYPES[task_type]] if task_type else list(TASKS_TYPES.values())
+
+    return sum(AnswersRollup.backfill(t.answer_model, t.type_name) for t in task_types)
+
+
+def backfill_time_totals() -> int:
+    """
+    Rebuilds per-user totals of time spent on tasks.
+
+    :returns: Number of users accounted.
+    """
+    return WorkTimeTotals.backfill()
+
+
+def recount_tasks(task_type: str | None) -> dict[str, TaskCounters]:
+    """
+    Recounts tasks of task types the index page shows numbers of.
+
+    :param task_type: Optional name of task type to limit the recount with.
+
+    :returns: Fresh counters by task type name.
+    """
+    names = [task_type] if task_type else list(TASKS_TYPES.keys())
+
+    return {name: TaskCounters.recount(name) for name in names}
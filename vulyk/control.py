@@ -1,18 +1,32 @@
 #!/usr/bin/env python
 # -*- coding=utf-8 -*-
 
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
 from typing import Any
 
 import click
 from prettytable import ALL, PrettyTable
 
 from vulyk.app import TASKS_TYPES, app
+from vulyk.blueprints.gamification import gamification
+from vulyk.blueprints.gamification.models.task_types import (
+    COINS_PER_TASK_KEY,
+    POINTS_PER_TASK_KEY,
+    AbstractGamifiedTaskType,
+)
 from vulyk.cli import admin as _admin
 from vulyk.cli import batches as _batches
 from vulyk.cli import db as _db
 from vulyk.cli import groups as _groups
 from vulyk.cli import project_init as _project_init
+from vulyk.cli import seed as _seed
 from vulyk.cli import stats as _stats
+from vulyk.ext.jobs import JobQueue
 
 
 def abort_if_false(ctx: click.Context, param: click.Parameter, value: Any) -> None:
@@ -31,6 +45,21 @@ def run() -> None:
     app.run()
 
 
+@cli.command("worker")
+@click.option("--threads", default=4, show_default=True, type=click.IntRange(min=1), help="Jobs run in parallel")
+@click.option("--poll", default=1.0, show_default=True, type=click.FloatRange(min=0.1), help="Seconds between polls")
+@click.option("--burst", is_flag=True, default=False, help="Quit once the queue is empty")
+def worker(threads: int, poll: float, *, burst: bool) -> None:
+    """Process listener calls deferred by DEFERRED_LISTENERS."""
+    stop = threading.Event()
+
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    with app.app_context():
+        JobQueue(max_attempts=app.config["JOB_MAX_ATTEMPTS"]).work(threads, poll, stop, burst=burst)
+
+
 # region Admin
 @cli.group("admin")
 def admin() -> None:
@@ -114,6 +143,16 @@ def export(task_type: str, path: str, batch: str, *, export_all: bool, with_sess
     _db.export_reports(TASKS_TYPES[task_type], path, batch, closed=not export_all, with_sessions=with_sessions)
 
 
+@db.command("reap")
+@click.option("-t", "--task_type", "task_type", type=click.Choice(list(TASKS_TYPES.keys())))
+@click.option("--hours", default=24, show_default=True, type=click.IntRange(min=1), help="Age of abandoned sessions")
+def reap(task_type: str, hours: int) -> None:
+    """Removes work sessions which were started but never finished or skipped."""
+    task_type_obj = TASKS_TYPES[task_type] if task_type else None
+
+    click.echo("{:d} abandoned sessions removed".format(_db.reap_sessions(hours, task_type_obj)))
+
+
 # endregion DB (export/import)
 
 
@@ -272,4 +311,114 @@ def batch(batch_name: str, task_type: str) -> None:
     click.echo(pt.get_string())
 
 
+@stats.command("rollups")
+@click.option("-t", "--task_type", "task_type", type=click.Choice(list(TASKS_TYPES.keys())))
+def rollups(task_type: str) -> None:
+    """
+    Rebuilds daily answers rollups weekly and monthly leaderboards are built from.
+    """
+    click.echo("{:d} rollups written".format(_stats.backfill_rollups(task_type)))
+
+
+@stats.command("time")
+def time_totals() -> None:
+    """
+    Rebuilds per-user totals of time spent on tasks from finished work sessions.
+    """
+    click.echo("{:d} users accounted".format(_stats.backfill_time_totals()))
+
+
+@stats.command("tasks")
+@click.option("-t", "--task_type", "task_type", type=click.Choice(list(TASKS_TYPES.keys())))
+def task_counters(task_type: str) -> None:
+    """
+    Recounts total, open and closed tasks of task types.
+    """
+    for name, counters in _stats.recount_tasks(task_type).items():
+        click.echo(
+            "{}: {:d} tasks, {:d} open, {:d} closed".format(name, counters.tasks, counters.open, counters.closed)
+        )
+
+
 # endregion Stats
+
+
+# region Dev
+@cli.group("dev")
+def dev() -> None:
+    """Tools for development and benchmarking."""
+
+
+@dev.command("seed")
+@click.argument("task_type", type=click.Choice(list(TASKS_TYPES.keys())))
+@click.option("--users", default=1000, show_default=True, type=click.IntRange(min=1))
+@click.option("--groups", default=5, show_default=True, type=click.IntRange(min=0), help="Besides the default one")
+@click.option("--batches", default=10, show_default=True, type=click.IntRange(min=1))
+@click.option("--tasks", default=10_000, show_default=True, type=click.IntRange(min=1))
+@click.option("--redundancy", type=click.IntRange(min=1), help="Answers to close a task  [default: task type's]")
+@click.option("--done", default=0.8, show_default=True, type=click.FloatRange(0, 1), help="Share of closed tasks")
+@click.option("--data-size", default=1024, show_default=True, type=click.IntRange(min=0), help="Bytes of task data")
+@click.option("--days", default=90, show_default=True, type=click.IntRange(min=1), help="Days answers are spread over")
+@click.option("--until", type=click.DateTime(["%Y-%m-%d"]), help="Day answers end by  [default: today]")
+@click.option("--seed", "rng_seed", default=0, show_default=True, help="Same seed and options give the same data")
+@click.option("--prefix", default="seed", show_default=True, help="Prefix of IDs of generated users, batches, tasks")
+@click.option("--processes", default=os.cpu_count() or 1, show_default=True, type=click.IntRange(min=1))
+@click.option("--chunk", default=10_000, show_default=True, type=click.IntRange(min=1), help="Tasks inserted at once")
+def dev_seed(
+    task_type: str,
+    users: int,
+    groups: int,
+    batches: int,
+    tasks: int,
+    redundancy: int | None,
+    done: float,
+    data_size: int,
+    days: int,
+    until: datetime | None,
+    rng_seed: int,
+    prefix: str,
+    processes: int,
+    chunk: int,
+) -> None:
+    """
+    Generates users, groups, batches, tasks, answers, work sessions and
+    gamification events and states, then rebuilds stats upon them.
+    """
+    task_type_obj = TASKS_TYPES[task_type]
+    gamified = isinstance(task_type_obj, AbstractGamifiedTaskType)
+    meta = task_type_obj.task_type_meta
+    plan = _seed.SeedPlan(
+        task_type=task_type,
+        task_model=task_type_obj.task_model,
+        answer_model=task_type_obj.answer_model,
+        prefix=prefix,
+        users=users,
+        groups=groups,
+        batches=min(batches, tasks),
+        tasks=tasks,
+        redundancy=redundancy or task_type_obj.redundancy,
+        done=done,
+        data_size=data_size,
+        until=(until or datetime.now(timezone.utc)).replace(
+            hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc
+        ),
+        days=days,
+        seed=rng_seed,
+        batch_meta=meta,
+        points=Decimal(meta[POINTS_PER_TASK_KEY]) if gamified else None,
+        coins=Decimal(meta[COINS_PER_TASK_KEY]) if gamified else None,
+    )
+    started = time.perf_counter()
+
+    with click.progressbar(length=tasks, label="Tasks") as bar:
+        documents = _seed.seed(
+            plan, gamification.get_level, app.config["MONGODB_SETTINGS"], processes, chunk, progress=bar.update
+        )
+
+    click.echo("{:d} documents inserted in {:.1f}s".format(documents, time.perf_counter() - started))
+    click.echo("{:d} rollups written".format(_stats.backfill_rollups(task_type)))
+    click.echo("{:d} users accounted".format(_stats.backfill_time_totals()))
+    _stats.recount_tasks(task_type)
+
+
+# endregion Dev
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Compression of responses for deployments having no compressing proxy in
+front of the application server.
+"""
+
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from http import HTTPStatus
+from typing import cast
+
+import flask
+from flask import Response
+
+try:
+    import brotli  # type: ignore[import-not-found,import-untyped]
+except ImportError:
+    brotli = None
+
+__all__ = ["Compression"]
+
+# gzip level and brotli quality: fast enough to be done on every request
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+class _Encoder:
+    """
+    Incremental compressor of a single response.
+    """
+
+    def compress(self, chunk: bytes) -> bytes:
+        """
+        :param chunk: Next piece of the body.
+
+        :return: Compressed piece, flushed so it can be sent at once.
+        """
+        raise NotImplementedError("You must override the method in successors")
+
+    def finish(self) -> bytes:
+        """
+        :return: The rest of compressed body.
+        """
+        raise NotImplementedError("You must override the method in successors")
+
+
+class _GzipEncoder(_Encoder):
+    def __init__(self) -> None:
+        # wbits above 16 makes zlib write gzip headers and trailer
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder(_Encoder):
+    def __init__(self) -> None:
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return cast(bytes, self._compressor.process(chunk) + self._compressor.flush())
+
+    def finish(self) -> bytes:
+        return cast(bytes, self._compressor.finish())
+
+
+# content coding -> encoder, in order of preference
+ENCODERS: dict[str, Callable[[], _Encoder]] = {"gzip": _GzipEncoder}
+
+if brotli is not None:
+    ENCODERS = {"br": _BrotliEncoder, **ENCODERS}
+
+
+class Compression:
+    """
+    Compresses responses of allowed types with the best coding the client
+    accepts: brotli if the `brotli` package is installed, gzip otherwise.
+    Streamed responses are compressed chunk by chunk as they're generated.
+    """
+
+    def __init__(self, mimetypes: Iterable[str], min_size: int = 0) -> None:
+        """
+        :param mimetypes: Types of responses to compress.
+        :param min_size: Smaller bodies (in bytes) are sent as they are.
+        """
+        self._mimetypes = frozenset(mimetypes)
+        self._min_size = min_size
+
+    def init_app(self, app: flask.Flask) -> None:
+        """
+        Makes the application compress its responses.
+
+        :param app: Current application.
+        """
+        app.after_request(self.compress)
+
+    def compress(self, response: Response) -> Response:
+        """
+        Compresses the response if it's worth it and the client accepts it.
+
+        :param response: Response about to be sent.
+
+        :return: The same response.
+        """
+        if response.status_code == HTTPStatus.NOT_MODIFIED:
+            # must carry the same tag the full response would, else the tag the
+            # client has and sends in `If-None-Match` gets replaced
+            if flask.request.accept_encodings.best_match(list(ENCODERS)) is not None:
+                response.vary.add("Accept-Encoding")
+                _weaken_etag(response)
+
+            return response
+
+        if (
+            response.mimetype not in self._mimetypes
+            or response.status_code < HTTPStatus.OK
+            or response.status_code == HTTPStatus.NO_CONTENT
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        coding = flask.request.accept_encodings.best_match(list(ENCODERS))
+
+        if coding is None:
+            return response
+
+        encoder = ENCODERS[coding]()
+
+        if response.is_streamed:
+            response.response = _compress_stream(encoder, response.iter_encoded())
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+
+            if len(data) < self._min_size:
+                return response
+
+            response.set_data(encoder.compress(data) + encoder.finish())
+
+        response.headers["Content-Encoding"] = coding
+        _weaken_etag(response)
+
+        return response
+
+
+def _weaken_etag(response: Response) -> None:
+    etag, weak = response.get_etag()
+
+    # compressed body is a different representation of the resource
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _compress_stream(encoder: _Encoder, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    for chunk in chunks:
+        compressed = encoder.compress(chunk)
+
+        if compressed:
+            yield compressed
+
+    yield encoder.finish()
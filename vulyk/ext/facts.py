@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections.abc import Callable
+
+__all__ = ["Facts"]
+
+
+class Facts:
+    """
+    Registry of facts that are expensive to check but stay true once they
+    hold, e.g. "the project has been initialized". A fact is checked on every
+    request until it holds, then it's remembered, so templates and views
+    don't issue a query each time they need it.
+
+    Facts are remembered per process, so a change made elsewhere (e.g. the
+    default group removed by `manage.py group`) is only noticed once `ttl`
+    has passed. A fact that doesn't hold is checked every time, so becoming
+    true (e.g. after `manage.py init`) is noticed right away. `reset` only
+    affects the current process.
+    """
+
+    def __init__(self, ttl: float = 0) -> None:
+        """
+        :param ttl: Seconds a fact is remembered for, 0 means until reset.
+        """
+        self._ttl = ttl
+        self._probes: dict[str, Callable[[], bool]] = {}
+        # fact name -> time.monotonic() it was confirmed at
+        self._confirmed: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, probe: Callable[[], bool]) -> None:
+        """
+        :param name: Name of the fact.
+        :param probe: Checks whether the fact holds.
+        """
+        with self._lock:
+            self._probes[name] = probe
+            self._confirmed.pop(name, None)
+
+    def holds(self, name: str) -> bool:
+        """
+        :param name: Name of a registered fact.
+
+        :return: True if the fact holds.
+
+        :raises:
+            KeyError: If no such fact was registered.
+        """
+        confirmed = self._confirmed.get(name)
+        now = time.monotonic()
+
+        if confirmed is not None and (not self._ttl or now - confirmed < self._ttl):
+            return True
+
+        if not self._probes[name]():
+            return False
+
+        with self._lock:
+            self._confirmed[name] = now
+
+        return True
+
+    def reset(self, name: str | None = None) -> None:
+        """
+        Makes the fact checked anew.
+
+        :param name: Name of the fact, None for all of them.
+        """
+        with self._lock:
+            if name is None:
+                self._confirmed.clear()
+            else:
+                self._confirmed.pop(name, None)
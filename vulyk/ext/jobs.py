@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, TypeVar
+
+import flask
+from blinker import NamedSignal
+from mongoengine import Document, NotUniqueError
+from mongoengine.base import get_document
+
+from vulyk.ext.metrics import METRICS
+from vulyk.models.jobs import Job, JobLock
+
+__all__ = ["JobQueue", "deferrable"]
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# listeners which may be deferred, by their qualified names
+_HANDLERS: dict[str, Callable[..., Any]] = {}
+
+
+def deferrable(signal: NamedSignal, key: Callable[..., str | None] | None = None) -> Callable[[F], F]:
+    """
+    Connects a listener to the signal. When `DEFERRED_LISTENERS` is on, the
+    listener isn't called within the request: the call is queued instead and
+    made later by `manage.py worker`. Otherwise the listener runs right away.
+
+    Documents passed to the listener are stored by reference and fetched
+    anew by the worker, everything else must be BSON-serializable.
+
+    Deferred calls sharing a key are never made at the same time, so listeners
+    that read and then update some state (e.g. the user's) don't race.
+
+    :param signal: Signal to listen to.
+    :param key: Gets the arguments of the listener, returns the key of the call.
+
+    :return: Decorator, which leaves the listener itself intact.
+    """
+
+    def decorator(func: F) -> F:
+        name = "{}.{}".format(func.__module__, func.__qualname__)
+        _HANDLERS[name] = func
+
+        def receiver(sender: object, **kwargs: Any) -> None:
+            if flask.has_app_context() and flask.current_app.config.get("DEFERRED_LISTENERS", False):
+                JobQueue().enqueue(name, sender, kwargs, key=key(sender, **kwargs) if key else None)
+            else:
+                with METRICS.time("vulyk_listener_duration_seconds", listener=name):
+                    func(sender, **kwargs)
+
+        # blinker keeps weak references only by default, the closure would be lost
+        signal.connect(receiver, weak=False)
+
+        return func
+
+    return decorator
+
+
+class JobQueue:
+    """
+    Durable queue of deferred listener calls kept in the `jobs` collection.
+
+    A job is claimed atomically with a lease, so any number of workers could
+    drain the queue. A job is removed once acknowledged; failed ones are
+    retried with a growing delay until `max_attempts` is reached.
+    """
+
+    def __init__(self, lease: timedelta = timedelta(minutes=5), max_attempts: int = 5) -> None:
+        """
+        :param lease: How long a claimed job is reserved for the worker.
+        :param max_attempts: Number of tries before the job is marked as failed.
+        """
+        self._logger = logging.getLogger("vulyk.app")
+        self._lease = lease
+        self._max_attempts = max(max_attempts, 1)
+
+    def enqueue(self, handler: str, sender: object, kwargs: dict[str, Any], key: str | None = None) -> Job:
+        """
+        Store a listener call.
+
+        :param handler: Qualified name of a listener decorated with `deferrable`.
+        :param sender: Sender of the signal.
+        :param kwargs: Keyword arguments of the signal.
+        :param key: Jobs with the same key are run one at a time.
+
+        :return: New job.
+        """
+        now = datetime.now(timezone.utc)
+
+        job = Job(
+            handler=handler,
+            payload={"sender": _dump(sender), "kwargs": {k: _dump(v) for k, v in kwargs.items()}},
+            available_at=now,
+            key=key,
+            created_at=now,
+        )
+        job.save()
+
+        return job
+
+    def claim(self) -> Job | None:
+        """
+        Reserve the oldest available job.
+
+        A job whose lease has expired is claimed again only while it has
+        attempts left. Once the queue runs dry, the jobs that have used them
+        all up without being acknowledged are marked as failed.
+
+        A job with a key is claimed only along with the lock on the key. Keys
+        locked by other workers are skipped, their jobs stay in order until
+        the current holder is done.
+
+        :return: Claimed job or None if there's nothing to do.
+        """
+        now = datetime.now(timezone.utc)
+        available = {
+            "status__in": [Job.PENDING, Job.CLAIMED],
+            "available_at__lte": now,
+            "attempts__lt": self._max_attempts,
+        }
+        token = uuid.uuid4().hex
+        locked: list[str] = []
+
+        while candidate := (
+            Job.objects(key__nin=locked, **available).order_by("available_at", "created_at").only("key").first()
+        ):
+            if candidate.key and not self._lock(candidate.key, token, now):
+                locked.append(candidate.key)
+                continue
+
+            job: Job | None = Job.objects(id=candidate.id, **available).modify(
+                new=True,
+                set__status=Job.CLAIMED,
+                set__available_at=now + self._lease,
+                set__claim=token,
+                inc__attempts=1,
+            )
+
+            if job is not None:
+                return job
+
+            # somebody else has claimed it in between
+            if candidate.key:
+                JobLock.objects(id=candidate.key, claim=token).delete()
+
+        Job.objects(status=Job.CLAIMED, available_at__lte=now, attempts__gte=self._max_attempts).update(
+            set__status=Job.FAILED,
+            set__last_error="The lease has expired {} times".format(self._max_attempts),
+            unset__claim=True,
+        )
+
+        return None
+
+    def _lock(self, key: str, token: str, now: datetime) -> bool:
+        """
+        :param key: Key of the job about to be claimed.
+        :param token: Token of the claim.
+        :param now: Time of the claim.
+
+        :return: False if the key is held by somebody else.
+        """
+        try:
+            JobLock.objects(id=key, expires_at__lte=now).update_one(
+                upsert=True, set__claim=token, set__expires_at=now + self._lease
+            )
+        except NotUniqueError:
+            return False
+
+        return True
+
+    def ack(self, job: Job) -> bool:
+        """
+        Remove a job that is done.
+
+        :param job: Claimed job.
+
+        :return: False if the claim has expired and the job was taken by somebody else.
+        """
+        acked: bool = Job.objects(id=job.id, claim=job.claim).delete() > 0
+        self._unlock(job)
+
+        return acked
+
+    def fail(self, job: Job, error: str) -> None:
+        """
+        Put a job back for a retry or mark it as failed for good.
+
+        :param job: Claimed job.
+        :param error: Description of the failure.
+        """
+        update: dict[str, Any] = {"set__last_error": error, "unset__claim": True}
+
+        if job.attempts >= self._max_attempts:
+            update["set__status"] = Job.FAILED
+        else:
+            update["set__status"] = Job.PENDING
+            update["set__available_at"] = datetime.now(timezone.utc) + timedelta(seconds=2**job.attempts)
+
+        Job.objects(id=job.id, claim=job.claim).update_one(**update)
+        self._unlock(job)
+
+    def _unlock(self, job: Job) -> None:
+        """
+        Release the key of the job, unless the lock has been taken over.
+
+        :param job: Claimed job.
+        """
+        if job.key:
+            JobLock.objects(id=job.key, claim=job.claim).delete()
+
+    def run_next(self) -> bool:
+        """
+        Claim a job and make the call it holds.
+
+        :return: False if the queue is empty.
+        """
+        job = self.claim()
+
+        if job is None:
+            return False
+
+        try:
+            handler = _HANDLERS[job.handler]
+
+            with METRICS.time("vulyk_listener_duration_seconds", listener=job.handler):
+                handler(_load(job.payload["sender"]), **{k: _load(v) for k, v in job.payload["kwargs"].items()})
+        except Exception as err:
+            self._logger.exception("Job %r has failed.", job)
+            self.fail(job, "{}: {}".format(type(err).__name__, err))
+        else:
+            if not self.ack(job):
+                self._logger.warning("Job %r has outlived its lease.", job)
+
+        return True
+
+    def work(self, threads: int, poll_interval: float, stop: threading.Event, *, burst: bool = False) -> None:
+        """
+        Drain the queue with a pool of threads until stopped.
+
+        :param threads: Number of jobs run in parallel.
+        :param poll_interval: Seconds to wait when the queue is empty.
+        :param stop: Event that stops the workers once the current jobs are done.
+        :param burst: Quit as soon as the queue is empty.
+        """
+
+        def loop() -> None:
+            while not stop.is_set():
+                if not self.run_next():
+                    if burst:
+                        return
+
+                    stop.wait(poll_interval)
+
+        with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="vulyk-worker") as pool:
+            for future in [pool.submit(loop) for _ in range(threads)]:
+                future.result()
+
+
+def _dump(value: Any) -> Any:
+    if isinstance(value, Document):
+        return {"_document": value._class_name, "_id": value.pk}  # noqa: SLF001
+
+    if isinstance(value, list) and any(isinstance(v, Document) for v in value):
+        return [_dump(v) for v in value]
+
+    if isinstance(value, (str, int, float, bool, dict, list)) or value is None:
+        return value
+
+    # e.g. managers sending signals: workers have their own
+    return None
+
+
+def _load(value: Any) -> Any:
+    if isinstance(value, dict) and "_document" in value:
+        return get_document(value["_document"]).objects.get(pk=value["_id"])
+
+    if isinstance(value, list):
+        return [_load(v) for v in value]
+
+    return value
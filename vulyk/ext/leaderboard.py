@@ -1,16 +1,34 @@
 # -*- coding: utf-8 -*-
-from collections import defaultdict
+import logging
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from enum import Enum
 from operator import itemgetter
 from typing import TYPE_CHECKING
 
 from bson import ObjectId
+from mongoengine.errors import NotUniqueError
+
+from vulyk.models.stats import AnswersRollup, LeaderBoardSnapshot
 
 if TYPE_CHECKING:
+    from vulyk.ext.submission import SubmissionPipeline
     from vulyk.models.tasks import AbstractAnswer
     from vulyk.models.user import User
 
 
-__all__ = ["LeaderBoardManager"]
+__all__ = ["LeaderBoardManager", "LeaderBoardWindow"]
+
+
+class LeaderBoardWindow(Enum):
+    """
+    Time frames a ranking could be built for. Values are lengths in days.
+    """
+
+    ALL_TIME = 0
+    WEEK = 7
+    MONTH = 30
 
 
 class LeaderBoardManager:
@@ -18,41 +36,139 @@ class LeaderBoardManager:
     Manager for leaderboard operations for a specific task type in Vulyk.
 
     Provides methods to retrieve user rankings based on the number of tasks completed.
+
+    When `cache_ttl` is positive the ranking is served from a snapshot kept
+    both in-process and in the `leaderboard_snapshots` collection, so all
+    workers share it. Once the snapshot gets older than `cache_ttl` seconds
+    exactly one worker rebuilds it (single-flight) while the others keep
+    serving the stale copy.
+
+    Weekly and monthly rankings are summed up from daily rollups of answers
+    (see `AnswersRollup`), which are updated on every answer via `record_answer`.
+    Passing None as `task_type_name` gives a cross-project ranking.
     """
 
-    def __init__(self, task_type_name: str, answer_model: type["AbstractAnswer"], user_model: type["User"]) -> None:
+    # how long a worker may hold the refresh lease before others take over
+    REFRESH_LEASE = timedelta(seconds=30)
+
+    def __init__(
+        self,
+        task_type_name: str | None,
+        answer_model: type["AbstractAnswer"],
+        user_model: type["User"],
+        cache_ttl: int = 0,
+    ) -> None:
         """
         Initialize the LeaderBoardManager.
 
-        :param task_type_name: Name of the current task type.
+        :param task_type_name: Name of the current task type, None for all of them.
         :param answer_model: Model class representing answers for the task type.
         :param user_model: Model class representing users.
+        :param cache_ttl: Snapshot lifetime in seconds, zero disables caching.
         """
+        self._logger = logging.getLogger("vulyk.app")
+
         self._task_type_name = task_type_name
         self._answer_model = answer_model
         self._user_model = user_model
 
-    def get_leaders(self) -> list[tuple[ObjectId, int]]:
+        self._cache_ttl = timedelta(seconds=max(cache_ttl, 0))
+        self._snapshots: dict[LeaderBoardWindow, tuple[datetime, list[tuple[ObjectId, int]]]] = {}
+        self._refresh_locks = {window: threading.Lock() for window in LeaderBoardWindow}
+        self._stats_lock = threading.Lock()
+        self._stats: Counter[str] = Counter(hits=0, misses=0, refreshes=0)
+
+    @property
+    def cache_stats(self) -> dict[str, int]:
+        """
+        Snapshot cache counters of the current process.
+
+        :return: Dict with `hits`, `misses` and `refreshes` numbers.
+        """
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def record_answer(
+        self, user_id: ObjectId, moment: datetime, amount: int = 1, pipeline: "SubmissionPipeline | None" = None
+    ) -> None:
+        """
+        Account fresh answers in the daily rollups windowed rankings are built from.
+
+        :param user_id: Author of the answers.
+        :param moment: When the answers were given.
+        :param amount: Number of answers.
+        :param pipeline: Submission to queue the write to instead of doing it right away.
+        """
+        if self._task_type_name is not None:
+            AnswersRollup.increment(self._task_type_name, user_id, moment, amount, pipeline)
+
+    def get_leaders(self, window: LeaderBoardWindow = LeaderBoardWindow.ALL_TIME) -> list[tuple[ObjectId, int]]:
         """
         Return a sorted list of tuples (user_id, tasks_done) for the current task type.
 
+        :param window: Time frame to rank users within.
+
         :returns: List of tuples (user_id, tasks_done), sorted in descending order by tasks_done.
         """
-        scores = self._answer_model.objects(task_type=self._task_type_name).item_frequencies("created_by")
+        if not self._cache_ttl:
+            return self._compute_leaders(window)
 
-        return sorted(scores.items(), key=itemgetter(1), reverse=True)
+        now = datetime.now(timezone.utc)
+        snapshot = self._snapshots.get(window)
+
+        if snapshot is not None and now - snapshot[0] < self._cache_ttl:
+            self._count("hits")
+
+            return snapshot[1]
+
+        stored = LeaderBoardSnapshot.objects(id=self._cache_key(window)).first()
+
+        if stored is not None and stored.created_at is not None:
+            snapshot = (
+                stored.created_at.replace(tzinfo=timezone.utc),
+                [(user_id, freq) for user_id, freq in stored.leaders],
+            )
+            self._snapshots[window] = snapshot
+
+            if now - snapshot[0] < self._cache_ttl:
+                self._count("hits")
+
+                return snapshot[1]
 
-    def get_leaderboard(self, limit: int) -> list[dict[str, "User | int"]]:
+        self._count("misses")
+
+        if self._refresh(window, now):
+            return self._snapshots[window][1]
+
+        # somebody else is rebuilding the snapshot: stale is better than a stampede
+        if snapshot is not None:
+            return snapshot[1]
+
+        return self._compute_leaders(window)
+
+    def invalidate(self) -> None:
+        """
+        Drop both local and shared snapshots, so the next call recomputes.
+        """
+        self._snapshots.clear()
+        LeaderBoardSnapshot.objects(id__in=[self._cache_key(w) for w in LeaderBoardWindow]).delete()
+
+    def get_leaderboard(
+        self, limit: int, window: LeaderBoardWindow = LeaderBoardWindow.ALL_TIME
+    ) -> list[dict[str, "User | int"]]:
         """
         Find the top users who contributed the most to the current task type.
 
         :param limit: Number of top users to return.
+        :param window: Time frame to rank users within.
         :returns: List of dicts {rank: rank, user: user_obj, freq: count}, where rank is 1-based.
         """
         result = []
         top: dict[str, list[tuple[ObjectId, int]]] = defaultdict(list)
 
-        _ = [top[e[1]].append(e) for e in self.get_leaders() if len(top) < limit]  # type: ignore[func-returns-value,index]
+        leaders = self.get_leaders() if window == LeaderBoardWindow.ALL_TIME else self.get_leaders(window)
+
+        _ = [top[e[1]].append(e) for e in leaders if len(top) < limit]  # type: ignore[func-returns-value,index]
 
         sorted_top = sorted(top.values(), key=lambda r: r[0][1], reverse=True)
 
@@ -61,3 +177,98 @@ class LeaderBoardManager:
                 result.append({"rank": i + 1, "user": self._user_model.objects.get(id=v[0]), "freq": v[1]})
 
         return result
+
+    def _compute_leaders(self, window: LeaderBoardWindow = LeaderBoardWindow.ALL_TIME) -> list[tuple[ObjectId, int]]:
+        """
+        Rank users by the number of answers: all-time ranking is taken straight
+        from the answers collection, others are summed up from daily rollups.
+
+        :param window: Time frame to rank users within.
+
+        :returns: List of tuples (user_id, tasks_done), sorted in descending order by tasks_done.
+        """
+        if window != LeaderBoardWindow.ALL_TIME:
+            since = datetime.now(timezone.utc) - timedelta(days=window.value - 1)
+
+            return list(AnswersRollup.leaders(since, self._task_type_name))
+
+        rs = self._answer_model.objects()
+
+        if self._task_type_name is not None:
+            rs = rs.filter(task_type=self._task_type_name)
+
+        scores = rs.item_frequencies("created_by")
+
+        return sorted(scores.items(), key=itemgetter(1), reverse=True)
+
+    def _cache_key(self, window: LeaderBoardWindow) -> str:
+        """
+        :param window: Time frame of the ranking.
+
+        :return: ID of the shared snapshot.
+        """
+        key = self._task_type_name or "__all__"
+
+        if window != LeaderBoardWindow.ALL_TIME:
+            key = "{}:{}".format(key, window.name.lower())
+
+        return key
+
+    def _refresh(self, window: LeaderBoardWindow, now: datetime) -> bool:
+        """
+        Rebuild the snapshot if neither a thread of this process nor any other
+        worker is doing it at the moment.
+
+        :param window: Time frame of the ranking.
+        :param now: Current timestamp.
+
+        :return: True if the snapshot has been rebuilt by this call.
+        """
+        lock = self._refresh_locks[window]
+
+        if not lock.acquire(blocking=False):
+            return False
+
+        try:
+            if not self._acquire_lease(window, now):
+                return False
+
+            leaders = self._compute_leaders(window)
+            created_at = datetime.now(timezone.utc)
+
+            LeaderBoardSnapshot.objects(id=self._cache_key(window)).update_one(
+                set__leaders=[[user_id, freq] for user_id, freq in leaders],
+                set__created_at=created_at,
+                unset__refresh_until=True,
+            )
+            self._snapshots[window] = (created_at, leaders)
+            self._count("refreshes")
+            self._logger.debug("Leaderboard snapshot <%s> is rebuilt.", self._cache_key(window))
+
+            return True
+        finally:
+            lock.release()
+
+    def _acquire_lease(self, window: LeaderBoardWindow, now: datetime) -> bool:
+        """
+        Atomically mark the shared snapshot as being rebuilt by this worker.
+
+        :param window: Time frame of the ranking.
+        :param now: Current timestamp.
+
+        :return: True if nobody else holds the lease.
+        """
+        try:
+            # `$not: {$gte: now}` also matches a missing or null lease
+            return bool(
+                LeaderBoardSnapshot.objects(id=self._cache_key(window), refresh_until__not__gte=now).update_one(
+                    upsert=True, set__refresh_until=now + self.REFRESH_LEASE
+                )
+            )
+        except NotUniqueError:
+            # the document exists, but the lease is taken
+            return False
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] += 1
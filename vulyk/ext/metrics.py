@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Request, task and listener metrics in Prometheus text format.
+"""
+
+import atexit
+import bisect
+import contextlib
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from http import HTTPStatus
+from typing import Any
+
+import flask
+from flask import Response
+from pymongo.errors import PyMongoError
+
+from vulyk.models.stats import MetricsTotal
+
+__all__ = ["METRICS", "Metrics"]
+
+# upper bounds of histogram buckets, in seconds
+BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# (metric name, sorted label pairs)
+_Key = tuple[str, tuple[tuple[str, str], ...]]
+
+
+class Metrics:
+    """
+    Counters and histograms aggregated in memory of a worker process. Every
+    `flush_interval` seconds a background thread adds what the worker has
+    collected since to the `MetricsTotal`s, so `/metrics` served by any worker
+    shows the totals of all workers, including other hosts and those gone.
+
+    Nothing is recorded until the registry is enabled with `init_app`.
+    """
+
+    def __init__(self) -> None:
+        self._logger = logging.getLogger("vulyk.app")
+        self.enabled = False
+        self._flush_interval = 15.0
+
+        self._lock = threading.Lock()
+        # metric name -> (type, help)
+        self._descriptions: dict[str, tuple[str, str]] = {}
+        self._counters: dict[_Key, float] = {}
+        # key -> counts per bucket (the last one is +Inf), sum, count
+        self._histograms: dict[_Key, list[float]] = {}
+        self._stopped = threading.Event()
+        # metrics and the flusher are per process, so they're bound to the pid
+        self._pid: int | None = None
+
+        atexit.register(self.close)
+
+    def describe(self, name: str, kind: str, description: str) -> None:
+        """
+        :param name: Metric name.
+        :param kind: Either `counter` or `histogram`.
+        :param description: Help line shown along with the metric.
+        """
+        self._descriptions[name] = (kind, description)
+
+    def inc(self, name: str, amount: float = 1, /, **labels: str) -> None:
+        """
+        :param name: Counter name.
+        :param amount: Value to add.
+        :param labels: Labels of the counter.
+        """
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        self._ensure_worker()
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, /, **labels: str) -> None:
+        """
+        :param name: Histogram name.
+        :param value: Observed value, e.g. duration in seconds.
+        :param labels: Labels of the histogram.
+        """
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        self._ensure_worker()
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 3)
+
+            histogram[bisect.bisect_left(BUCKETS, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, name: str, /, **labels: str) -> Iterator[None]:
+        """
+        Observes the time the block takes, even if it fails.
+
+        :param name: Histogram name.
+        :param labels: Labels of the histogram.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def flush(self) -> None:
+        """
+        Adds what the current worker has collected since the last flush to
+        the totals.
+        """
+        if self._pid != os.getpid():
+            return
+
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            histograms, self._histograms = self._histograms, {}
+
+        if not counters and not histograms:
+            return
+
+        try:
+            MetricsTotal.add(
+                [{"name": n, "labels": dict(ls), "value": v} for (n, ls), v in counters.items()],
+                [
+                    {"name": n, "labels": dict(ls), "buckets": h[:-2], "sum": h[-2], "count": h[-1]}
+                    for (n, ls), h in histograms.items()
+                ],
+            )
+        except PyMongoError:
+            self._logger.exception("Failed to store metrics.")
+
+            # try again with the next flush
+            with self._lock:
+                for key, value in counters.items():
+                    self._counters[key] = self._counters.get(key, 0) + value
+
+                for key, histogram in histograms.items():
+                    merged = self._histograms.setdefault(key, [0] * (len(BUCKETS) + 3))
+
+                    for i, value in enumerate(histogram):
+                        merged[i] += value
+
+    def close(self) -> None:
+        """
+        Stops periodic flushing and writes the rest down.
+        """
+        self._stopped.set()
+        self.flush()
+
+    def render(self) -> str:
+        """
+        Shows the totals of all workers.
+
+        :return: Metrics in Prometheus text format.
+        """
+        self.flush()
+
+        counters: dict[_Key, float] = {}
+        histograms: dict[_Key, list[float]] = {}
+
+        for total in MetricsTotal.objects.as_pymongo():
+            key = (total["name"], tuple(sorted(total["labels"].items())))
+
+            if "value" in total:
+                counters[key] = total["value"]
+            else:
+                buckets = [total.get("buckets", {}).get(str(i), 0) for i in range(len(BUCKETS) + 1)]
+                histograms[key] = [*buckets, total["sum"], total["count"]]
+
+        lines: list[str] = []
+
+        for name, samples in _by_name(counters):
+            lines.extend(self._header(name, "counter"))
+            lines.extend("{}{} {}".format(name, _labels(labels), _number(v)) for labels, v in samples)
+
+        for name, samples in _by_name(histograms):
+            lines.extend(self._header(name, "histogram"))
+
+            for labels, h in samples:
+                cumulative = 0.0
+
+                for bound, count in zip([*map(_number, BUCKETS), "+Inf"], h[:-2], strict=True):
+                    cumulative += count
+                    lines.append("{}_bucket{} {}".format(name, _labels((*labels, ("le", bound))), _number(cumulative)))
+
+                lines.append("{}_sum{} {}".format(name, _labels(labels), _number(h[-2])))
+                lines.append("{}_count{} {}".format(name, _labels(labels), _number(h[-1])))
+
+        return "\n".join(lines) + "\n"
+
+    def init_app(self, app: flask.Flask) -> None:
+        """
+        Starts collecting metrics of the application and exposes them at
+        `/metrics`. Requests are labeled with the Flask endpoint.
+
+        :param app: Current application.
+        """
+        self.enabled = True
+        self._flush_interval = float(app.config.get("METRICS_FLUSH_INTERVAL", self._flush_interval))
+        token = app.config.get("METRICS_TOKEN")
+
+        @app.before_request
+        def start_timer() -> None:
+            flask.g.metrics_started = time.perf_counter()
+
+        @app.after_request
+        def observe_request(response: Response) -> Response:
+            started = flask.g.pop("metrics_started", None)
+            # unmatched URLs would make a label value each
+            endpoint = flask.request.endpoint or "unmatched"
+
+            self.inc(
+                "vulyk_http_requests_total",
+                endpoint=endpoint,
+                method=flask.request.method,
+                status=str(response.status_code),
+            )
+
+            if started is not None:
+                self.observe("vulyk_http_request_duration_seconds", time.perf_counter() - started, endpoint=endpoint)
+
+            return response
+
+        def metrics() -> Response:
+            if token and flask.request.headers.get("Authorization") != "Bearer {}".format(token):
+                flask.abort(HTTPStatus.FORBIDDEN)
+
+            return Response(self.render(), mimetype="text/plain", headers=[("Cache-Control", "no-store")])
+
+        app.add_url_rule("/metrics", "metrics", metrics)
+
+    def _header(self, name: str, default_kind: str) -> list[str]:
+        kind, description = self._descriptions.get(name, (default_kind, ""))
+
+        return ["# HELP {} {}".format(name, description), "# TYPE {} {}".format(name, kind)]
+
+    def _ensure_worker(self) -> None:
+        """
+        Starts over in a forked process: the parent's metrics stay its own.
+        """
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            self._pid = os.getpid()
+            self._counters = {}
+            self._histograms = {}
+
+        if self._flush_interval > 0:
+            threading.Thread(target=self._run, name="vulyk-metrics-flusher", daemon=True).start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._flush_interval):
+            self.flush()
+
+
+def _by_name(samples: dict[_Key, Any]) -> Iterable[tuple[str, list[tuple[tuple[tuple[str, str], ...], Any]]]]:
+    grouped: dict[str, list[tuple[tuple[tuple[str, str], ...], Any]]] = {}
+
+    for (name, labels), value in sorted(samples.items()):
+        grouped.setdefault(name, []).append((labels, value))
+
+    return grouped.items()
+
+
+def _labels(labels: Iterable[tuple[str, str]]) -> str:
+    pairs = [
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels
+    ]
+
+    return "{{{}}}".format(",".join(pairs)) if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# the registry of the process
+METRICS = Metrics()
+METRICS.describe("vulyk_http_requests_total", "counter", "Requests served, by endpoint, method and status.")
+METRICS.describe("vulyk_http_request_duration_seconds", "histogram", "Time spent serving requests, by endpoint.")
+METRICS.describe("vulyk_tasks_assigned_total", "counter", "Tasks given out to members, by task type.")
+METRICS.describe("vulyk_answers_submitted_total", "counter", "Answers accepted, by task type.")
+METRICS.describe("vulyk_tasks_skipped_total", "counter", "Tasks skipped by members, by task type.")
+METRICS.describe("vulyk_listener_duration_seconds", "histogram", "Time signal listeners take, by listener.")
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Monitoring of database commands: how many of them a request sends, how long
+they take and which ones are slow.
+"""
+
+import logging
+from collections.abc import Mapping
+from typing import Any
+
+import flask
+from flask import Response
+from pymongo import monitoring
+
+from vulyk.ext.metrics import METRICS
+
+__all__ = ["CommandMonitor", "shape"]
+
+# command name -> field holding the filter or the pipeline
+_FILTERS: dict[str, str] = {
+    "find": "filter",
+    "aggregate": "pipeline",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "update": "updates",
+    "delete": "deletes",
+}
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """
+    Attributes every command to the Flask request it's sent within, logs
+    commands slower than `slow_ms` with the shape of their filters (values
+    are replaced, so no personal data gets to logs) and tells the totals of
+    a request in the `Server-Timing` header if asked to.
+
+    pymongo calls listeners synchronously in the thread sending a command,
+    so commands of background threads are only checked for being slow.
+    """
+
+    def __init__(self, slow_ms: float = 0) -> None:
+        """
+        :param slow_ms: Commands taking longer (in milliseconds) are logged,
+            0 turns logging off.
+        """
+        self._logger = logging.getLogger("vulyk.app")
+        self._slow_micros = slow_ms * 1000
+        # (connection, request ID) -> command, kept until it's finished
+        self._pending: dict[tuple[Any, int], Mapping[str, Any]] = {}
+
+    def init_app(self, app: flask.Flask) -> None:
+        """
+        Starts monitoring the commands. Must be called before the connection
+        to the database is made: listeners are given to clients on creation.
+
+        :param app: Current application.
+        """
+        monitoring.register(self)
+
+        @app.after_request
+        def report_commands(response: Response) -> Response:
+            commands = flask.g.get("db_commands", 0)
+
+            if not commands:
+                return response
+
+            seconds = flask.g.get("db_seconds", 0.0)
+            endpoint = flask.request.endpoint or "unmatched"
+
+            METRICS.inc("vulyk_db_commands_total", commands, endpoint=endpoint)
+            METRICS.inc("vulyk_db_seconds_total", seconds, endpoint=endpoint)
+
+            if app.config.get("DB_SERVER_TIMING", False):
+                timing = 'db;dur={:.1f};desc="{} commands"'.format(seconds * 1000, commands)
+                # a single header, even if the view has set its own timings
+                existing = response.headers.get("Server-Timing")
+                response.headers["Server-Timing"] = "{}, {}".format(existing, timing) if existing else timing
+
+            return response
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        if self._slow_micros:
+            self._pending[(event.connection_id, event.request_id)] = event.command
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finished(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finished(event)
+
+    def _finished(self, event: monitoring.CommandSucceededEvent | monitoring.CommandFailedEvent) -> None:
+        command = self._pending.pop((event.connection_id, event.request_id), None)
+        endpoint = None
+
+        if flask.has_request_context():
+            flask.g.db_commands = flask.g.get("db_commands", 0) + 1
+            flask.g.db_seconds = flask.g.get("db_seconds", 0.0) + event.duration_micros / 1e6
+            endpoint = flask.request.endpoint
+
+        if command is not None and event.duration_micros > self._slow_micros:
+            self._logger.warning(
+                "Slow %s on %s.%s took %.1fms (endpoint %s): %s",
+                event.command_name,
+                event.database_name,
+                command.get(event.command_name),
+                event.duration_micros / 1000,
+                endpoint,
+                shape(command.get(_FILTERS.get(event.command_name, ""))),
+            )
+
+
+def shape(value: Any) -> Any:
+    """
+    Replaces values in a filter, a pipeline or an update with placeholders,
+    keeping the fields and the operators.
+
+    :param value: Filter, pipeline or update.
+
+    :return: The same structure with values replaced by "?".
+    """
+    if isinstance(value, Mapping):
+        return {k: shape(v) for k, v in value.items()}
+
+    if isinstance(value, list | tuple):
+        shapes = [shape(v) for v in value]
+        # long lists of values, e.g. in `$in`, look the same anyway
+        return shapes if any(s != "?" for s in shapes) else ["?"]
+
+    return "?"
+
+
+METRICS.describe("vulyk_db_commands_total", "counter", "Database commands sent within requests, by endpoint.")
+METRICS.describe("vulyk_db_seconds_total", "counter", "Time database commands took within requests, by endpoint.")
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling of single requests on demand, e.g. to find out why some call is
+slow in production.
+"""
+
+import cProfile
+import logging
+import marshal
+import time
+import zlib
+from datetime import datetime, timezone
+
+import flask
+from flask import Response
+
+from vulyk.models.stats import RequestProfile
+
+__all__ = ["PROFILE_HEADER", "Profiler"]
+
+# request header asking to profile the request, the response one names the profile
+PROFILE_HEADER = "X-Vulyk-Profile"
+
+
+class Profiler:
+    """
+    Runs a request of an admin under cProfile if it's asked for with
+    `?profile=1` or the `X-Vulyk-Profile` header. The profile is stored as
+    a `RequestProfile`, which ID is sent back in the `X-Vulyk-Profile`
+    header, and may be downloaded from the admin.
+
+    Requests of everybody else are served as usual.
+    """
+
+    def __init__(self) -> None:
+        self._logger = logging.getLogger("vulyk.app")
+
+    def init_app(self, app: flask.Flask) -> None:
+        """
+        Registers profiling hooks, must go after the one setting `g.user`.
+
+        :param app: Current application.
+        """
+        app.before_request(self.start)
+        app.after_request(self.stop)
+        app.teardown_request(self._abandon)
+
+    def start(self) -> None:
+        """
+        Starts profiling if the request asks for it and comes from an admin.
+        """
+        request = flask.request
+
+        if not (request.args.get("profile") or request.headers.get(PROFILE_HEADER)):
+            return
+
+        user = flask.g.get("user")
+
+        if user is None or not user.is_authenticated or not user.is_admin():
+            return
+
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler (e.g. a debugger) is active
+            self._logger.warning("Can't profile %s, another profiler is active.", request.path)
+            return
+
+        flask.g.profile = (profile, time.perf_counter())
+
+    def stop(self, response: Response) -> Response:
+        """
+        Stops profiling and stores the profile.
+
+        :param response: Response of the profiled request.
+
+        :return: The response with the ID of the profile.
+        """
+        started = flask.g.pop("profile", None)
+
+        if started is None:
+            return response
+
+        profile, started_at = started
+        profile.disable()
+        duration = time.perf_counter() - started_at
+        profile.create_stats()
+
+        record = RequestProfile(
+            method=flask.request.method,
+            path=flask.request.full_path.rstrip("?"),
+            endpoint=flask.request.endpoint,
+            status=response.status_code,
+            duration=duration,
+            username=flask.g.user.username,
+            created_at=datetime.now(timezone.utc),
+            stats=zlib.compress(marshal.dumps(profile.stats)),
+        ).save()
+        self._logger.info("Profiled %s in %.3fs as %s.", record.path, duration, record.id)
+
+        response.headers[PROFILE_HEADER] = str(record.id)
+
+        return response
+
+    @staticmethod
+    def _abandon(_: BaseException | None) -> None:
+        # the response may never be made, the profiler mustn't outlive the request
+        started = flask.g.pop("profile", None)
+
+        if started is not None:
+            started[0].disable()
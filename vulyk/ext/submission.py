@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from typing import Any
+
+from bson import ObjectId
+from flask_mongoengine.documents import Document
+from mongoengine import signals
+from mongoengine.errors import NotUniqueError, OperationError
+from pymongo import InsertOne, UpdateOne
+from pymongo.client_session import ClientSession
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.mongo_client import MongoClient
+
+__all__ = ["SubmissionPipeline"]
+
+# topologies where multi-document transactions are available
+_TRANSACTIONAL_TOPOLOGIES = frozenset(["ReplicaSetWithPrimary", "Sharded"])
+# https://www.mongodb.com/docs/manual/reference/error-codes/#mongodb-error-DuplicateKey
+_DUPLICATE_KEY = 11000
+
+
+class SubmissionPipeline:
+    """Groups writes caused by submitted answers and applies them at once.
+
+    Writes are grouped by collection, so each collection gets a single bulk
+    request no matter how many answers are submitted. Collections are written
+    in the order they were first touched: queue the answers first and their
+    unique index rejects a duplicate before any counter is moved.
+
+    Round trips are saved for bulk submissions only: a single answer costs a
+    request per collection, as saving the documents one by one would. There
+    the pipeline just keeps the order of writes and validation in one place.
+
+    When the deployment supports them (a replica set or a sharded cluster)
+    everything is written within a single transaction: a submission is either
+    stored completely or not at all, and the majority write concern is waited
+    for only once, on commit. Otherwise the bulk requests are ordered and sent
+    one by one. A transaction only pays off for many writes per collection:
+    for a single answer leave the client out, as it costs extra round trips.
+
+    Inserted documents get the same `pre_save`, `pre_save_post_validation` and
+    `post_save` signals `Document.save` sends.
+    """
+
+    def __init__(self, client: MongoClient | None = None) -> None:
+        """Constructor.
+
+        :param client: Client to start transactions with. Writes are done
+                       outside of any transaction if None.
+        """
+        self._client = client
+        self._writes: dict[type[Document], list[InsertOne | UpdateOne]] = {}
+        self._inserted: list[Document] = []
+
+    @property
+    def transactional(self) -> bool:
+        """
+        :return: True if writes are going to be done within a transaction.
+        """
+        if self._client is None:
+            return False
+
+        topology = getattr(self._client, "topology_description", None)
+
+        return topology is not None and topology.topology_type_name in _TRANSACTIONAL_TOPOLOGIES
+
+    def insert(self, document: Document, *, validate: bool = True) -> None:
+        """Queues a new document. It's validated right away and gets its ID
+        assigned, so it could be referenced by other writes.
+
+        :param document: Unsaved document.
+        :param validate: Set to False if the caller has validated the document.
+
+        :raises:
+            ValidationError: If the document is invalid.
+        """
+        signals.pre_save.send(type(document), document=document)
+
+        if validate:
+            document.validate()
+
+        if document.pk is None:
+            document.pk = ObjectId()
+
+        signals.pre_save_post_validation.send(type(document), document=document, created=True)
+        self._writes.setdefault(type(document), []).append(InsertOne(document.to_mongo().to_dict()))
+        self._inserted.append(document)
+
+    def update(
+        self, model: type[Document], query: dict[str, Any], update: dict[str, Any], *, upsert: bool = False
+    ) -> None:
+        """Queues an update of a single document.
+
+        :param model: Model of the collection to update.
+        :param query: Raw filter.
+        :param update: Raw update document.
+        :param upsert: Create the document if nothing matches.
+        """
+        self._writes.setdefault(model, []).append(UpdateOne(query, update, upsert=upsert))
+
+    def write_inserts(self, model: type[Document]) -> list[Document]:
+        """Writes documents of the model queued by `insert` right away, with a
+        single unordered bulk request outside of any transaction. Unlike
+        `execute` a duplicate doesn't stop the rest from being stored, and
+        the caller learns which ones have been rejected, so it could account
+        exactly those stored. Other writes stay queued.
+
+        :param model: Model of the documents, only inserts of it may be queued.
+
+        :return: Documents rejected by a unique index, the rest are stored.
+
+        :raises:
+            OperationError: If the database write fails otherwise.
+        """
+        requests = self._writes.pop(model, [])
+        documents = [d for d in self._inserted if type(d) is model]
+        self._inserted = [d for d in self._inserted if type(d) is not model]
+        rejected: set[int] = set()
+
+        if not requests:
+            return []
+
+        try:
+            model._get_collection().bulk_write(requests, ordered=False)  # noqa: SLF001
+        except BulkWriteError as err:
+            errors = err.details.get("writeErrors", [])
+
+            if any(e.get("code") != _DUPLICATE_KEY for e in errors):
+                raise OperationError(str(err)) from err
+
+            rejected = {e["index"] for e in errors}
+        except PyMongoError as err:
+            raise OperationError(str(err)) from err
+
+        self._stored([d for i, d in enumerate(documents) if i not in rejected])
+
+        return [documents[i] for i in sorted(rejected)]
+
+    def __len__(self) -> int:
+        return sum(len(w) for w in self._writes.values())
+
+    def execute(self) -> int:
+        """Writes everything queued so far.
+
+        :return: Number of bulk requests sent.
+
+        :raises:
+            NotUniqueError: If some inserted document violates a unique index.
+            OperationError: If the database write fails.
+        """
+        writes, self._writes = self._writes, {}
+        inserted, self._inserted = self._inserted, []
+
+        if not writes:
+            return 0
+
+        try:
+            if self.transactional:
+                with self._client.start_session() as session:  # type: ignore[union-attr]
+                    session.with_transaction(lambda s: self._write(writes, s))
+            else:
+                self._write(writes, None)
+        except BulkWriteError as err:
+            if any(e.get("code") == _DUPLICATE_KEY for e in err.details.get("writeErrors", [])):
+                raise NotUniqueError(str(err)) from err
+
+            raise OperationError(str(err)) from err
+        except PyMongoError as err:
+            raise OperationError(str(err)) from err
+
+        self._stored(inserted)
+
+        return len(writes)
+
+    @staticmethod
+    def _stored(documents: list[Document]) -> None:
+        for document in documents:
+            # from now on save() updates the document instead of inserting
+            document._created = False  # noqa: SLF001
+            document._clear_changed_fields()  # noqa: SLF001
+            signals.post_save.send(type(document), document=document, created=True)
+
+    @staticmethod
+    def _write(writes: dict[type[Document], list[InsertOne | UpdateOne]], session: ClientSession | None) -> None:
+        for model, requests in writes.items():
+            model._get_collection().bulk_write(requests, ordered=True, session=session)  # noqa: SLF001
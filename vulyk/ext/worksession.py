@@ -1,17 +1,28 @@
 # -*- coding: utf-8 -*-
+import atexit
 import logging
-from datetime import datetime, timezone
-from typing import TypeVar, cast
+import os
+import threading
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any, TypeVar
 
 from bson import ObjectId
+from mongoengine.context_managers import no_dereference
 from mongoengine.errors import OperationError
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from pymongo.results import BulkWriteResult
 
 from vulyk.models.exc import InitializationError, WorkSessionLookUpError, WorkSessionUpdateError
-from vulyk.models.stats import WorkSession
+from vulyk.models.stats import WorkSession, WorkTimeTotals
 from vulyk.models.tasks import AbstractAnswer, AbstractTask
-from vulyk.signals import on_task_done
+from vulyk.signals import on_task_done, on_tasks_done
 
-__all__ = ["WorkSessionManager"]
+__all__ = ["MAX_HEARTBEAT_SECONDS", "ActivityBuffer", "WorkSessionManager"]
+
+# longest activity a single heartbeat may report, a session can't take longer
+MAX_HEARTBEAT_SECONDS = 24 * 60 * 60
 
 
 class WorkSessionManager:
@@ -85,7 +96,10 @@ class WorkSessionManager:
         actively working on the task.
 
         The total recorded activity time cannot exceed the total duration
-        since the session started.
+        since the session started. The check is done by the database within
+        a single conditional update, so concurrent heartbeats never lose
+        increments. An extra lookup is only made when the update fails to
+        tell a missing session from an invalid value.
 
         :param task: The task associated with the session.
         :param user_id: The ID of the user whose activity is being recorded.
@@ -96,26 +110,83 @@ class WorkSessionManager:
             WorkSessionUpdateError: If the provided activity duration is invalid
                                      or the database update fails.
         """
+        if seconds < 0:
+            msg = "Can not update the session for user {} and task {}. Value: {}.".format(user_id, task.id, seconds)
+            raise WorkSessionUpdateError(msg)
+
         try:
-            session: WorkSession = self.work_session.objects.get(user=user_id, task=task)
-            # Ensure comparison is between offset-aware datetimes if start_time is stored aware
-            # If start_time is naive, this comparison might be inaccurate across DST changes.
-            # Assuming start_time becomes aware after the start_work_session change.
-            now_utc = datetime.now(timezone.utc)
-            duration = now_utc - cast(datetime, session.start_time).replace(tzinfo=timezone.utc)
-
-            # Check if adding seconds is valid (non-negative and doesn't exceed total time).
-            if seconds >= 0 and duration.total_seconds() >= (seconds + session.activity):
-                session.activity += seconds
-                session.save()
-
-                self._logger.debug("Added %s seconds of activities for user %s and task %s.", seconds, user_id, task.id)
-            else:
-                msg = "Can not update the session {} for user {}. Value: {}.".format(session.id, user_id, seconds)
-                raise WorkSessionUpdateError(msg)
-        except self.work_session.DoesNotExist as err:
+            num_changed = self.work_session.objects(
+                user=user_id, task=task, __raw__=self._activity_fits(seconds, datetime.now(timezone.utc))
+            ).update_one(inc__activity=seconds)
+        except OperationError as err:
+            raise WorkSessionUpdateError() from err
+
+        if num_changed:
+            self._logger.debug("Added %s seconds of activities for user %s and task %s.", seconds, user_id, task.id)
+
+            return
+
+        if self.work_session.objects(user=user_id, task=task).count() == 0:
             msg = "Did not found a session for user {} and task {}.".format(user_id, task.id)
-            raise WorkSessionLookUpError(msg) from err
+            raise WorkSessionLookUpError(msg)
+
+        msg = "Can not update the session for user {} and task {}. Value: {}.".format(user_id, task.id, seconds)
+        raise WorkSessionUpdateError(msg)
+
+    @staticmethod
+    def _activity_fits(seconds: int, now: datetime) -> dict[str, Any]:
+        """Query clause that holds if `activity + seconds <= now - start_time`.
+
+        :param seconds: The duration of the recent activity in seconds.
+        :param now: Current timestamp.
+
+        :return: Raw MongoDB filter.
+        """
+        return {
+            "$expr": {
+                "$lte": [
+                    {"$add": [{"$ifNull": ["$activity", 0]}, seconds]},
+                    # dates difference is given in milliseconds
+                    {"$divide": [{"$subtract": [now, "$start_time"]}, 1000]},
+                ]
+            }
+        }
+
+    def record_activities(self, activities: Mapping[tuple[ObjectId, str], int]) -> int:
+        """Records activity time of many sessions within a single bulk request.
+
+        Applies the same guard as `record_activity` does, but silently skips
+        sessions that are missing or would overflow: there is nobody to report
+        the error to when heartbeats are buffered.
+
+        :param activities: Map of `(user_id, task_id) -> seconds`.
+
+        :return: Number of sessions updated.
+
+        :raises:
+            WorkSessionUpdateError: If the database update fails.
+        """
+        now = datetime.now(timezone.utc)
+        bulk = [
+            UpdateOne(
+                {"user": user_id, "task": task_id, **self._activity_fits(seconds, now)}, {"$inc": {"activity": seconds}}
+            )
+            for (user_id, task_id), seconds in activities.items()
+            if seconds > 0
+        ]
+
+        if not bulk:
+            return 0
+
+        try:
+            result: BulkWriteResult = self.work_session._get_collection().bulk_write(bulk, ordered=False)  # noqa: SLF001
+        except PyMongoError as err:
+            raise WorkSessionUpdateError() from err
+
+        if result.modified_count < len(bulk):
+            self._logger.debug("%s of %s activity updates were rejected.", len(bulk) - result.modified_count, len(bulk))
+
+        return result.modified_count
 
     def end_work_session(self, task: AbstractTask, user_id: ObjectId, answer: AbstractAnswer) -> None:
         """Ends the most recent WorkSession for a user and task upon completion.
@@ -135,18 +206,80 @@ class WorkSessionManager:
         """
         # TODO: store id of active session in cookies or elsewhere
         try:
-            rs = self.work_session.objects(user=user_id, task=task).order_by("-start_time")
+            # a single findAndModify picks the latest session and updates it
+            session = (
+                self.work_session.objects(user=user_id, task=task)
+                .order_by("-start_time")
+                .modify(new=True, set__end_time=datetime.now(timezone.utc), set__answer=answer)
+            )
+        except OperationError as e:
+            raise WorkSessionUpdateError() from e
 
-            if rs.count() > 0:
-                rs.first().update(set__end_time=datetime.now(timezone.utc), set__answer=answer)
+        if session is None:
+            msg = "No session was found for {0}.".format(answer)
 
-                on_task_done.send(self, answer=answer)
-            else:
-                msg = "No session was found for {0}.".format(answer)
+            raise WorkSessionLookUpError(msg)
 
-                raise WorkSessionLookUpError(msg)
-        except OperationError as e:
-            raise WorkSessionUpdateError() from e
+        try:
+            WorkTimeTotals.account(user_id, session)
+        except PyMongoError:
+            # totals are rebuilt by `manage.py stats time`, the answer matters more
+            self._logger.exception("Failed to account time of session %s.", session.id)
+
+        on_task_done.send(self, answer=answer)
+
+    def end_work_sessions(self, user_id: ObjectId, answers: Sequence[AbstractAnswer]) -> None:
+        """Ends the most recent WorkSessions for many tasks done by a user at once.
+
+        Sessions are looked up with a single query and closed with a single
+        bulk request, then time totals are added up with one more update.
+        Unlike `end_work_session` a missing session isn't an error, as answers
+        submitted in bulk are often prepared offline. It triggers the
+        `on_tasks_done` signal once for all the answers.
+
+        :param user_id: The ID of the user who completed the tasks.
+        :param answers: Answers submitted by the user.
+
+        :raises:
+            WorkSessionUpdateError: If the database update fails.
+        """
+        by_task = {answer.task.id: answer for answer in answers}
+        latest: dict[Any, WorkSession] = {}
+        now = datetime.now(timezone.utc)
+
+        with no_dereference(self.work_session):
+            for session in (
+                self.work_session.objects(user=user_id, task__in=list(by_task))
+                .order_by("-start_time")
+                .only("task", "task_type", "start_time", "activity")
+            ):
+                latest.setdefault(session.task.id, session)
+
+        if missing := by_task.keys() - latest.keys():
+            self._logger.warning("No sessions were found for tasks %s done by %s.", sorted(missing), user_id)
+
+        if latest:
+            try:
+                self.work_session._get_collection().bulk_write(  # noqa: SLF001
+                    [
+                        UpdateOne({"_id": s.id}, {"$set": {"end_time": now, "answer": by_task[task_id].pk}})
+                        for task_id, s in latest.items()
+                    ],
+                    ordered=False,
+                )
+            except PyMongoError as e:
+                raise WorkSessionUpdateError() from e
+
+            for session in latest.values():
+                # dates are read back naive unless the connection is tz-aware
+                session.end_time = now.replace(tzinfo=session.start_time.tzinfo)
+
+            try:
+                WorkTimeTotals.account(user_id, *latest.values())
+            except PyMongoError:
+                self._logger.exception("Failed to account time of sessions done by %s.", user_id)
+
+        on_tasks_done.send(self, answers=list(answers))
 
     def delete_work_session(self, task: AbstractTask, user_id: ObjectId) -> None:
         """Deletes the most recent WorkSession for a user and task, e.g., when skipped.
@@ -163,13 +296,168 @@ class WorkSessionManager:
             WorkSessionUpdateError: If the database deletion fails.
         """
         try:
-            rs = self.work_session.objects(user=user_id, task=task).order_by("-start_time")
+            session = self.work_session.objects(user=user_id, task=task).order_by("-start_time").modify(remove=True)
+        except OperationError as e:
+            raise WorkSessionUpdateError() from e
+
+        if session is None:
+            msg = "No session was found for {0} & {1}.".format(user_id, task.id)
+
+            raise WorkSessionLookUpError(msg)
+
+    def reap_abandoned(self, max_age: timedelta, task_type: str | None = None, chunk_size: int = 1000) -> int:
+        """Deletes sessions that were started but never finished or skipped,
+        e.g. because the user has just closed the tab.
+
+        Sessions are removed in chunks, so the collection isn't locked
+        for long and the sweep could be interrupted safely.
+
+        :param max_age: Unfinished sessions started earlier than that are abandoned.
+        :param task_type: Optional name of task type to limit the sweep with.
+        :param chunk_size: Number of sessions removed within a single request.
+
+        :return: Number of sessions removed.
+
+        :raises:
+            WorkSessionUpdateError: If the database deletion fails.
+        """
+        threshold = datetime.now(timezone.utc) - max_age
+        rs = self.work_session.objects(end_time=None, start_time__lt=threshold)
 
-            if rs.count() > 0:
-                rs.first().delete()
-            else:
-                msg = "No session was found for {0} & {1}.".format(user_id, task.id)
+        if task_type is not None:
+            rs = rs.filter(task_type=task_type)
 
-                raise WorkSessionLookUpError(msg)
+        removed = 0
+
+        try:
+            while ids := list(rs.limit(chunk_size).scalar("id")):
+                # re-check end_time: the session might have been finished meanwhile
+                removed += self.work_session.objects(id__in=ids, end_time=None).delete()
         except OperationError as e:
             raise WorkSessionUpdateError() from e
+
+        self._logger.info("%s abandoned work sessions were removed.", removed)
+
+        return removed
+
+
+class ActivityBuffer:
+    """Coalesces activity heartbeats in memory and writes them in bulk.
+
+    Heartbeats are summed up per `(user, task)` pair and flushed as a single
+    `bulk_write` either every `flush_interval` seconds (by a background
+    thread), or as soon as `max_entries` distinct pairs are collected, or on
+    interpreter shutdown. The buffer lives in a process, so a crash may cost
+    up to `flush_interval` seconds of recorded activity.
+    """
+
+    def __init__(self, manager: WorkSessionManager, flush_interval: float, max_entries: int) -> None:
+        """Constructor.
+
+        :param manager: Manager that writes coalesced activities down.
+        :param flush_interval: Seconds between periodic flushes.
+        :param max_entries: Number of distinct sessions that triggers a flush.
+        """
+        self._logger = logging.getLogger("vulyk.app")
+
+        self._manager = manager
+        self._flush_interval = flush_interval
+        self._max_entries = max(max_entries, 1)
+
+        self._lock = threading.Lock()
+        self._pending: dict[tuple[ObjectId, str], int] = {}
+        self._stopped = threading.Event()
+        # the flusher thread doesn't survive forking, so it's bound to the pid
+        self._flusher_pid: int | None = None
+
+        atexit.register(self.close)
+
+    def add(self, user_id: ObjectId, task_id: str, seconds: int) -> None:
+        """Buffers a heartbeat.
+
+        :param user_id: The ID of the user whose activity is being recorded.
+        :param task_id: The ID of the task the user is working on.
+        :param seconds: The duration of the recent activity in seconds.
+
+        :raises:
+            WorkSessionUpdateError: If the provided activity duration is negative
+                                    or longer than `MAX_HEARTBEAT_SECONDS`.
+        """
+        if not 0 <= seconds <= MAX_HEARTBEAT_SECONDS:
+            msg = "Can not update the session for user {} and task {}. Value: {}.".format(user_id, task_id, seconds)
+            raise WorkSessionUpdateError(msg)
+
+        self._ensure_flusher()
+
+        with self._lock:
+            key = (user_id, task_id)
+            self._pending[key] = self._pending.get(key, 0) + seconds
+            overflow = len(self._pending) >= self._max_entries
+
+        if overflow:
+            self.flush()
+
+    def flush(self) -> int:
+        """Writes everything buffered so far.
+
+        :return: Number of sessions updated.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return 0
+
+        try:
+            return self._manager.record_activities(pending)
+        except WorkSessionUpdateError:
+            self._logger.exception("Failed to flush %s buffered activities.", len(pending))
+
+            return 0
+
+    def flush_sessions(self, user_id: ObjectId, task_ids: Sequence[str]) -> int:
+        """Writes down activity buffered for some sessions of a user only,
+        e.g. before they are ended and their time is accounted.
+
+        :param user_id: The ID of the user.
+        :param task_ids: Tasks of the sessions.
+
+        :return: Number of sessions updated.
+        """
+        with self._lock:
+            pending = {k: s for k in ((user_id, t) for t in task_ids) if (s := self._pending.pop(k, None)) is not None}
+
+        if not pending:
+            return 0
+
+        try:
+            return self._manager.record_activities(pending)
+        except WorkSessionUpdateError:
+            self._logger.exception("Failed to flush buffered activity of %s sessions.", len(pending))
+
+            return 0
+
+    def close(self) -> None:
+        """Stops periodic flushing and writes the rest down."""
+        self._stopped.set()
+        self.flush()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _ensure_flusher(self) -> None:
+        """Starts the background flusher in the current process if needed."""
+        if self._flusher_pid == os.getpid() or self._flush_interval <= 0:
+            return
+
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+
+            self._flusher_pid = os.getpid()
+
+        threading.Thread(target=self._run, name="vulyk-activity-flusher", daemon=True).start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._flush_interval):
+            self.flush()
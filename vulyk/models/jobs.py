@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Module contains the model of the durable work queue `manage.py worker` drains.
+"""
+
+from typing import Any, ClassVar
+
+from flask_mongoengine.documents import Document
+from mongoengine import DateTimeField, DictField, IntField, StringField
+
+__all__ = ["Job", "JobLock"]
+
+
+class Job(Document):
+    """
+    Deferred call of a signal listener.
+
+    A pending job becomes claimable once `available_at` has come. A claimed job
+    gets `available_at` pushed to the end of its lease: if the worker dies
+    before acknowledging it, the job is picked up again after that.
+    """
+
+    PENDING = "pending"
+    CLAIMED = "claimed"
+    FAILED = "failed"
+
+    handler = StringField(max_length=200, required=True)
+    payload = DictField()
+    status = StringField(choices=(PENDING, CLAIMED, FAILED), default=PENDING)
+    available_at = DateTimeField(required=True, db_field="availableAt")
+    # token of the current claim, only its owner may acknowledge the job
+    claim = StringField(max_length=32)
+    attempts = IntField(default=0)
+    # jobs sharing a key never run at the same time, e.g. those of one user
+    key = StringField(max_length=100)
+    last_error = StringField(db_field="lastError")
+    created_at = DateTimeField(db_field="createdAt")
+
+    meta: ClassVar[dict[str, Any]] = {"collection": "jobs", "indexes": [("status", "available_at", "created_at")]}
+
+    def __str__(self) -> str:
+        return str(self.id)
+
+    def __repr__(self) -> str:
+        return "Job [{id}] {handler} ({status})".format(id=self.id, handler=self.handler, status=self.status)
+
+
+class JobLock(Document):
+    """
+    Lock on a job key, held by the worker running a job with that key.
+
+    Expires along with the lease of the job, so a dead worker doesn't hold
+    the key forever.
+    """
+
+    id = StringField(max_length=100, primary_key=True)
+    claim = StringField(max_length=32, required=True)
+    expires_at = DateTimeField(required=True, db_field="expiresAt")
+
+    meta: ClassVar[dict[str, Any]] = {
+        "collection": "job_locks",
+        "indexes": [{"fields": ["expires_at"], "expireAfterSeconds": 0}],
+    }
+
+    def __str__(self) -> str:
+        return str(self.id)
+
+    def __repr__(self) -> str:
+        return "JobLock [{id}] {claim}".format(id=self.id, claim=self.claim)
@@ -4,16 +4,43 @@ Module contains all models used to keep some metadata we could use to perform
 any kind of analysis.
 """
 
-from typing import Any, ClassVar
+import json
+import zlib
+from collections import defaultdict
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, ClassVar, cast
 
 from bson import ObjectId
 from flask_mongoengine.documents import Document
-from mongoengine import CASCADE, DateTimeField, IntField, ReferenceField, StringField
+from mongoengine import (
+    CASCADE,
+    BinaryField,
+    DateTimeField,
+    DictField,
+    FloatField,
+    IntField,
+    ListField,
+    ReferenceField,
+    StringField,
+)
+from pymongo import UpdateOne
 
 from vulyk.models.tasks import AbstractAnswer, AbstractTask
 from vulyk.models.user import User
 
-__all__ = ["WorkSession"]
+if TYPE_CHECKING:
+    from vulyk.ext.submission import SubmissionPipeline
+
+__all__ = [
+    "AnswersRollup",
+    "LeaderBoardSnapshot",
+    "MetricsTotal",
+    "RequestProfile",
+    "TaskCounters",
+    "WorkSession",
+    "WorkTimeTotals",
+]
 
 
 class WorkSession(Document):
@@ -34,30 +61,522 @@ class WorkSession(Document):
     meta: ClassVar[dict[str, Any]] = {
         "allow_inheritance": True,
         "collection": "work_sessions",
-        "indexes": [("user", "task"), "task"],
+        # the latest session of a user on a task is looked up by the first
+        # index, abandoned sessions are swept using the last one
+        "indexes": [("user", "task", "-start_time"), "task", ("end_time", "start_time")],
     }
 
     @classmethod
-    def get_total_user_time_precise(cls, user_id: ObjectId) -> int:
+    def get_total_user_time_precise(cls, user_id: ObjectId, task_type: str | None = None) -> int:
         """
         Aggregated time spent doing tasks on all projects by certain user.
         As the source we use more precise value of activity field.
 
         :param user_id: User ID.
+        :param task_type: Optional task type name to limit the total with.
 
         :return: Total time (in seconds).
         """
-        return sum((session.activity for session in cls.objects(user=user_id)))
+        return WorkTimeTotals.of_user(user_id).seconds("precise", task_type)
 
     @classmethod
-    def get_total_user_time_approximate(cls, user_id: ObjectId) -> int:
+    def get_total_user_time_approximate(cls, user_id: ObjectId, task_type: str | None = None) -> int:
         """
         Aggregated time spent doing tasks on all projects by certain user.
         As the source we use approximate values of start time and end time.
         Might be useful if no proper time accounting is done on frontend.
 
         :param user_id: User ID.
+        :param task_type: Optional task type name to limit the total with.
+
+        :return: Total time (in seconds).
+        """
+        return WorkTimeTotals.of_user(user_id).seconds("approximate", task_type)
+
+
+class WorkTimeTotals(Document):
+    """
+    Time a user has spent on finished sessions, overall and per task type.
+    Kept up to date as sessions end, so nobody has to scan the sessions.
+    """
+
+    user = ReferenceField(User, reverse_delete_rule=CASCADE, required=True, unique=True)
+    # sums of (end_time - start_time) of sessions, in seconds
+    approximate = IntField(default=0)
+    # sums of activity reported by the frontend, in seconds
+    precise = IntField(default=0)
+    # {task_type: {"approximate": seconds, "precise": seconds}}
+    by_task_type = DictField(db_field="byTaskType")
+
+    meta: ClassVar[dict[str, Any]] = {"collection": "work_time_totals"}
+
+    def seconds(self, kind: str, task_type: str | None = None) -> int:
+        """
+        :param kind: Either "approximate" or "precise".
+        :param task_type: Optional task type name, None for all of them.
 
         :return: Total time (in seconds).
         """
-        return sum(((session.end_time - session.start_time).seconds for session in cls.objects(user=user_id)))
+        if task_type is None:
+            return getattr(self, kind) or 0
+
+        return cast(int, (self.by_task_type or {}).get(task_type, {}).get(kind, 0))
+
+    @classmethod
+    def of_user(cls, user_id: ObjectId) -> "WorkTimeTotals":
+        """
+        Totals of a user. Those who haven't been accounted yet (e.g. sessions
+        ended before the totals were introduced) are backfilled on the fly.
+
+        :param user_id: User ID.
+
+        :return: Totals, unsaved empty ones if the user has no finished sessions.
+        """
+        totals = cls.objects(user=user_id).first()
+
+        if totals is None and cls.backfill(user_id) > 0:
+            totals = cls.objects(user=user_id).first()
+
+        return totals or cls(user=user_id)
+
+    @classmethod
+    def account(cls, user_id: ObjectId, *sessions: WorkSession) -> None:
+        """
+        Add up just finished sessions with a single update.
+
+        :param user_id: Owner of the sessions.
+        :param sessions: Work sessions with end_time set.
+        """
+        inc: dict[str, int] = defaultdict(int)
+
+        for session in sessions:
+            approximate = max(int((session.end_time - session.start_time).total_seconds()), 0)
+            precise = session.activity or 0
+            by_type = "byTaskType.{}.".format(session.task_type)
+
+            inc["approximate"] += approximate
+            inc["precise"] += precise
+            inc[by_type + "approximate"] += approximate
+            inc[by_type + "precise"] += precise
+
+        if not inc:
+            return
+
+        result = cls._get_collection().update_one({"user": user_id}, {"$inc": dict(inc)}, upsert=True)
+
+        if result.upserted_id is not None:
+            cls._account_history(user_id, sessions)
+
+    @classmethod
+    def _account_history(cls, user_id: ObjectId, sessions: tuple[WorkSession, ...]) -> None:
+        """
+        Adds up sessions which ended before the user was first accounted,
+        e.g. before the totals were introduced. It's done with `$inc` rather
+        than by the backfill, as sessions ending meanwhile are added up by
+        their own `account` calls and would be overwritten.
+
+        :param user_id: Owner of the sessions.
+        :param sessions: Sessions the totals have just been created with.
+        """
+        match = {
+            "user": user_id,
+            "_id": {"$nin": [s.id for s in sessions]},
+            # skips sessions ending concurrently, they are accounted on their own
+            "end_time": {"$ne": None, "$lt": min(s.end_time for s in sessions)},
+        }
+
+        for _, totals in cls._aggregate(match):
+            inc = {"approximate": totals["approximate"], "precise": totals["precise"]}
+
+            for task_type, by_type in totals["byTaskType"].items():
+                inc["byTaskType.{}.approximate".format(task_type)] = by_type["approximate"]
+                inc["byTaskType.{}.precise".format(task_type)] = by_type["precise"]
+
+            cls._get_collection().update_one({"user": user_id}, {"$inc": inc})
+
+    @classmethod
+    def backfill(cls, user_id: ObjectId | None = None, chunk_size: int = 1000) -> int:
+        """
+        Rebuild totals from finished work sessions using a single aggregation.
+        Safe to run more than once as the totals are overwritten.
+
+        :param user_id: Optional user ID to limit the backfill with.
+        :param chunk_size: Number of totals written per a bulk request.
+
+        :return: Number of users whose totals were written.
+        """
+        match: dict[str, Any] = {"end_time": {"$ne": None}}
+
+        if user_id is not None:
+            match["user"] = user_id
+
+        collection = cls._get_collection()
+        bulk: list[UpdateOne] = []
+        written = 0
+
+        for user, totals in cls._aggregate(match):
+            bulk.append(UpdateOne({"user": user}, {"$set": totals}, upsert=True))
+
+            if len(bulk) >= chunk_size:
+                written += len(bulk)
+                collection.bulk_write(bulk, ordered=False)
+                bulk = []
+
+        if bulk:
+            written += len(bulk)
+            collection.bulk_write(bulk, ordered=False)
+
+        return written
+
+    @staticmethod
+    def _aggregate(match: dict[str, Any]) -> Iterator[tuple[ObjectId, dict[str, Any]]]:
+        """
+        Sums up work sessions by user in a single aggregation.
+
+        :param match: Filter of the sessions.
+
+        :return: Pairs of user ID and totals in their stored shape.
+        """
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {"user": "$user", "taskType": "$taskType"},
+                    "approximate": {
+                        "$sum": {"$floor": {"$divide": [{"$subtract": ["$end_time", "$start_time"]}, 1000]}}
+                    },
+                    "precise": {"$sum": {"$ifNull": ["$activity", 0]}},
+                }
+            },
+            {
+                "$group": {
+                    "_id": "$_id.user",
+                    "approximate": {"$sum": "$approximate"},
+                    "precise": {"$sum": "$precise"},
+                    "types": {
+                        "$push": {"taskType": "$_id.taskType", "approximate": "$approximate", "precise": "$precise"}
+                    },
+                }
+            },
+        ]
+        for r in WorkSession.objects.aggregate(pipeline, allowDiskUse=True):
+            yield (
+                r["_id"],
+                {
+                    "approximate": int(r["approximate"]),
+                    "precise": int(r["precise"]),
+                    "byTaskType": {
+                        t["taskType"]: {"approximate": int(t["approximate"]), "precise": int(t["precise"])}
+                        for t in r["types"]
+                    },
+                },
+            )
+
+
+class TaskCounters(Document):
+    """
+    Number of tasks of a task type, overall and closed ones. Kept up to date
+    on import, close and batch removal, so nobody has to count the tasks.
+    """
+
+    # task type name
+    id = StringField(max_length=50, primary_key=True)
+    tasks = IntField(default=0)
+    closed = IntField(default=0)
+
+    meta: ClassVar[dict[str, Any]] = {"collection": "task_counters"}
+
+    @property
+    def open(self) -> int:
+        """
+        :return: Number of tasks that aren't closed yet.
+        """
+        return cast(int, max(self.tasks - self.closed, 0))
+
+    @classmethod
+    def of_type(cls, task_type: str) -> "TaskCounters":
+        """
+        Counters of a task type. Those that haven't been accounted yet are
+        recounted on the fly.
+
+        :param task_type: Task type name.
+
+        :return: Counters of the task type.
+        """
+        counters = cls.objects(id=task_type).first()
+
+        return counters if counters is not None else cls.recount(task_type)
+
+    @classmethod
+    def increment(cls, task_type: str, tasks: int = 0, closed: int = 0) -> None:
+        """
+        Account freshly imported or closed tasks.
+
+        :param task_type: Task type name.
+        :param tasks: Number of tasks added.
+        :param closed: Number of tasks closed.
+        """
+        cls.objects(id=task_type).update_one(upsert=True, inc__tasks=tasks, inc__closed=closed)
+
+    @classmethod
+    def recount(cls, task_type: str) -> "TaskCounters":
+        """
+        Count tasks of a task type with a single aggregation and store the
+        result, e.g. after tasks were removed.
+
+        :param task_type: Task type name.
+
+        :return: Fresh counters.
+        """
+        pipeline = [
+            {"$match": {"taskType": task_type}},
+            {"$group": {"_id": None, "tasks": {"$sum": 1}, "closed": {"$sum": {"$cond": ["$closed", 1, 0]}}}},
+        ]
+        counted = next(AbstractTask.objects.aggregate(pipeline), {"tasks": 0, "closed": 0})
+
+        return cast(
+            "TaskCounters",
+            cls.objects(id=task_type).modify(
+                upsert=True, new=True, set__tasks=counted["tasks"], set__closed=counted["closed"]
+            ),
+        )
+
+
+class LeaderBoardSnapshot(Document):
+    """
+    Precomputed ranking of a task type shared by all application workers.
+    While `refresh_until` is in the future some worker is rebuilding the
+    snapshot, so the rest should keep serving the stale copy.
+    """
+
+    id = StringField(max_length=100, primary_key=True)
+    # list of [user_id, tasks_done] pairs sorted by tasks_done descending
+    leaders = ListField(ListField())
+    created_at = DateTimeField(db_field="createdAt")
+    refresh_until = DateTimeField(db_field="refreshUntil")
+
+    meta: ClassVar[dict[str, Any]] = {"collection": "leaderboard_snapshots"}
+
+
+class MetricsTotal(Document):
+    """
+    Running total of a counter or a histogram over all worker processes (see
+    `vulyk.ext.metrics`). Workers add what they have collected since their
+    last flush, so totals keep growing as workers come and go, the way
+    Prometheus expects counters to.
+    """
+
+    # name and labels of the series
+    id = StringField(primary_key=True)
+    name = StringField(max_length=200)
+    labels = DictField()
+    # value of a counter
+    value = FloatField()
+    # counts per bucket of a histogram by the bucket's index, the last one is +Inf
+    buckets = DictField()
+    sum = FloatField()
+    count = FloatField()
+
+    meta: ClassVar[dict[str, Any]] = {"collection": "metrics"}
+
+    @classmethod
+    def add(cls, counters: list[dict[str, Any]], histograms: list[dict[str, Any]]) -> None:
+        """
+        Add increments of some counters and histograms to the totals.
+
+        :param counters: [{"name": ..., "labels": {...}, "value": ...}]
+        :param histograms: [{"name": ..., "labels": {...}, "buckets": [...], "sum": ..., "count": ...}]
+        """
+        requests = [
+            UpdateOne(
+                {"_id": json.dumps([c["name"], c["labels"]], sort_keys=True)},
+                {"$setOnInsert": {"name": c["name"], "labels": c["labels"]}, "$inc": {"value": c["value"]}},
+                upsert=True,
+            )
+            for c in counters
+        ]
+
+        for h in histograms:
+            inc = {"buckets.{}".format(i): n for i, n in enumerate(h["buckets"]) if n}
+            inc.update(sum=h["sum"], count=h["count"])
+            requests.append(
+                UpdateOne(
+                    {"_id": json.dumps([h["name"], h["labels"]], sort_keys=True)},
+                    {"$setOnInsert": {"name": h["name"], "labels": h["labels"]}, "$inc": inc},
+                    upsert=True,
+                )
+            )
+
+        if requests:
+            cls._get_collection().bulk_write(requests, ordered=False)
+
+
+class RequestProfile(Document):
+    """
+    Profile of a request an admin asked to be profiled (see
+    `vulyk.ext.profiler`). Only the latest hundred profiles are kept.
+    """
+
+    method = StringField(max_length=10)
+    path = StringField()
+    endpoint = StringField()
+    status = IntField()
+    # seconds the request took while being profiled
+    duration = FloatField()
+    username = StringField()
+    created_at = DateTimeField(db_field="createdAt")
+    # zlib-compressed stats in the format of `pstats.Stats.dump_stats`
+    stats = BinaryField()
+
+    meta: ClassVar[dict[str, Any]] = {
+        "collection": "profiles",
+        "max_documents": 100,
+        "max_size": 128 * 1024 * 1024,
+        "ordering": ["-created_at"],
+    }
+
+    def to_pstats(self) -> bytes:
+        """
+        :return: Stats as read by `pstats.Stats`, snakeviz and alike.
+        """
+        return zlib.decompress(self.stats)
+
+
+class AnswersRollup(Document):
+    """
+    Number of answers given by a user to a certain task type during a day.
+    Allows to build time-windowed rankings without scanning the answers.
+    """
+
+    # midnight (UTC) of the day
+    day = DateTimeField(required=True)
+    task_type = StringField(max_length=50, required=True, db_field="taskType")
+    user = ReferenceField(User, reverse_delete_rule=CASCADE, required=True)
+    answers = IntField(default=0)
+
+    meta: ClassVar[dict[str, Any]] = {
+        "collection": "answers_daily",
+        "indexes": [
+            {"fields": ["day", "task_type", "user"], "unique": True},
+            ("task_type", "day"),
+        ],
+    }
+
+    @staticmethod
+    def day_of(moment: datetime) -> datetime:
+        """
+        :param moment: Any timestamp.
+
+        :return: UTC midnight of the day the timestamp belongs to.
+        """
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(timezone.utc)
+
+        return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+
+    @classmethod
+    def increment(
+        cls,
+        task_type: str,
+        user_id: ObjectId,
+        moment: datetime,
+        amount: int = 1,
+        pipeline: "SubmissionPipeline | None" = None,
+    ) -> None:
+        """
+        Account freshly given answers.
+
+        :param task_type: Task type name.
+        :param user_id: Author of the answers.
+        :param moment: When the answers were given.
+        :param amount: Number of answers.
+        :param pipeline: Submission to queue the write to instead of doing it right away.
+        """
+        if pipeline is None:
+            cls.objects(day=cls.day_of(moment), task_type=task_type, user=user_id).update_one(
+                upsert=True, inc__answers=amount
+            )
+        else:
+            pipeline.update(
+                cls,
+                {"day": cls.day_of(moment), "taskType": task_type, "user": user_id},
+                {"$inc": {"answers": amount}},
+                upsert=True,
+            )
+
+    @classmethod
+    def backfill(cls, answer_model: type[AbstractAnswer], task_type: str | None = None, chunk_size: int = 1000) -> int:
+        """
+        Rebuild rollups from the answers collection in bulk. Safe to run more
+        than once as the counters are overwritten, not incremented.
+
+        :param answer_model: Answers model to aggregate.
+        :param task_type: Optional task type name to limit the backfill with.
+        :param chunk_size: Number of rollups written per a bulk request.
+
+        :return: Number of rollups written.
+        """
+        match: dict[str, Any] = {"createdAt": {"$ne": None}}
+
+        if task_type is not None:
+            match["taskType"] = task_type
+
+        pipeline = [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {
+                        "day": {
+                            "$dateFromParts": {
+                                "year": {"$year": "$createdAt"},
+                                "month": {"$month": "$createdAt"},
+                                "day": {"$dayOfMonth": "$createdAt"},
+                            }
+                        },
+                        "taskType": "$taskType",
+                        "user": "$createdBy",
+                    },
+                    "answers": {"$sum": 1},
+                }
+            },
+        ]
+        collection = cls._get_collection()
+        bulk: list[UpdateOne] = []
+        written = 0
+
+        for r in answer_model.objects.aggregate(pipeline, allowDiskUse=True):
+            bulk.append(UpdateOne(r["_id"], {"$set": {"answers": r["answers"]}}, upsert=True))
+
+            if len(bulk) >= chunk_size:
+                written += len(bulk)
+                collection.bulk_write(bulk, ordered=False)
+                bulk = []
+
+        if bulk:
+            written += len(bulk)
+            collection.bulk_write(bulk, ordered=False)
+
+        return written
+
+    @classmethod
+    def leaders(cls, since: datetime, task_type: str | None = None) -> Iterator[tuple[ObjectId, int]]:
+        """
+        Sum up the rollups starting from a certain day.
+
+        :param since: The first day to take into account.
+        :param task_type: Task type name, None to get a cross-project ranking.
+
+        :return: Pairs (user_id, answers) sorted in descending order by answers.
+        """
+        match: dict[str, Any] = {"day": {"$gte": cls.day_of(since)}}
+
+        if task_type is not None:
+            match["taskType"] = task_type
+
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$user", "answers": {"$sum": "$answers"}}},
+            {"$sort": {"answers": -1, "_id": 1}},
+        ]
+
+        yield from ((r["_id"], r["answers"]) for r in cls.objects.aggregate(pipeline))
@@ -6,15 +6,18 @@ import random
 from collections.abc import Generator, Sequence
 from datetime import datetime, timezone
 from hashlib import sha1
-from typing import Any, ClassVar, Generic, TypeVar
+from typing import Any, ClassVar, Generic, NamedTuple, TypeVar
 
 import orjson as json
 from bson import ObjectId
 from mongoengine import Q, QuerySet
+from mongoengine.context_managers import no_dereference
 from mongoengine.errors import InvalidQueryError, LookUpError, NotUniqueError, OperationError, ValidationError
 
-from vulyk.ext.leaderboard import LeaderBoardManager
-from vulyk.ext.worksession import WorkSessionManager
+from vulyk.ext.leaderboard import LeaderBoardManager, LeaderBoardWindow
+from vulyk.ext.metrics import METRICS
+from vulyk.ext.submission import SubmissionPipeline
+from vulyk.ext.worksession import MAX_HEARTBEAT_SECONDS, ActivityBuffer, WorkSessionManager
 from vulyk.models.exc import (
     InitializationError,
     TaskImportError,
@@ -22,16 +25,19 @@ from vulyk.models.exc import (
     TaskSaveError,
     TaskSkipError,
     TaskValidationError,
+    WorkSessionUpdateError,
 )
-from vulyk.models.stats import WorkSession
+from vulyk.models.stats import TaskCounters, WorkSession
 from vulyk.models.tasks import AbstractAnswer, AbstractTask, Batch
 from vulyk.models.user import User
 
-__all__ = ["AbstractTaskType"]
+__all__ = ["AbstractTaskType", "SubmissionResult"]
 
 TAbstractTask = TypeVar("TAbstractTask", bound=AbstractTask)
 TAbstractAnswer = TypeVar("TAbstractAnswer", bound=AbstractAnswer)
 
+SubmissionResult = NamedTuple("SubmissionResult", [("task_id", str), ("done", bool), ("error", str | None)])
+
 
 class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
     """
@@ -73,6 +79,7 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
     # These are typically instantiated in __init__ if not provided by a subclass.
     _work_session_manager: WorkSessionManager
     _leaderboard_manager: LeaderBoardManager
+    _activity_buffer: ActivityBuffer | None = None
 
     def __init__(self, settings: dict[str, Any]) -> None:
         """
@@ -94,7 +101,9 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
             raise InitializationError("You should define answer_model property")
 
         if not hasattr(self, "_leaderboard_manager"):
-            self._leaderboard_manager = LeaderBoardManager(self.type_name, self.answer_model, User)
+            self._leaderboard_manager = LeaderBoardManager(
+                self.type_name, self.answer_model, User, cache_ttl=int(settings.get("LEADERBOARD_CACHE_TTL", 0))
+            )
         if not hasattr(self, "_work_session_manager"):
             self._work_session_manager = WorkSessionManager(WorkSession)
 
@@ -103,6 +112,8 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
         if not isinstance(self._leaderboard_manager, LeaderBoardManager):
             raise InitializationError("You should define _leaderboard_manager property")
 
+        self._activity_buffer = self._init_activity_buffer(settings)
+
         if not self.type_name:
             raise InitializationError("You should define type_name (underscore)")
         if not self.template:
@@ -110,6 +121,27 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
         if not isinstance(self._task_type_meta, dict):
             raise InitializationError("Batch meta must of dict type")
 
+    def _init_activity_buffer(self, settings: dict[str, Any]) -> ActivityBuffer | None:
+        """
+        Sets up the buffer for activity heartbeats unless it's disabled in settings.
+
+        :param settings: Global application settings dictionary.
+        :return: An ActivityBuffer or None if heartbeats should be written through.
+        """
+        if self._activity_buffer is not None:
+            return self._activity_buffer
+
+        interval = float(settings.get("ACTIVITY_FLUSH_INTERVAL", 0))
+
+        if interval <= 0:
+            return None
+
+        return ActivityBuffer(
+            self._work_session_manager,
+            flush_interval=interval,
+            max_entries=int(settings.get("ACTIVITY_BUFFER_SIZE", 500)),
+        )
+
     @property
     def name(self) -> str:
         """
@@ -150,6 +182,24 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
         """
         return self._work_session_manager
 
+    @property
+    def activity_buffer(self) -> ActivityBuffer | None:
+        """
+        Provides access to the buffer heartbeats are coalesced in, if enabled.
+
+        :return: The active ActivityBuffer instance or None.
+        """
+        return self._activity_buffer
+
+    @property
+    def leaderboard_manager(self) -> LeaderBoardManager:
+        """
+        Provides access to the LeaderBoardManager instance for this task type.
+
+        :return: The active LeaderBoardManager instance.
+        """
+        return self._leaderboard_manager
+
     def import_tasks(self, tasks: Sequence[dict], batch: str | None) -> None:
         """Imports a list of tasks into the database for this task type.
 
@@ -183,9 +233,13 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
                 )
 
             self.task_model.objects.insert(bulk)
+            TaskCounters.increment(self.type_name, tasks=len(bulk))
 
             self._logger.debug("Inserted %s tasks in batch %s for plugin <%s>", len(bulk), batch, self.name)
         except errors as e:
+            # some tasks might have been inserted before the failure
+            TaskCounters.recount(self.type_name)
+
             raise TaskImportError("Can't load task.") from e
 
     def export_reports(
@@ -248,25 +302,36 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
             else:
                 yield [a.as_dict() for a in answers]
 
-    def get_leaders(self) -> list[tuple[ObjectId, int]]:
+    def get_leaders(self, window: LeaderBoardWindow = LeaderBoardWindow.ALL_TIME) -> list[tuple[ObjectId, int]]:
         """Retrieves the raw leaderboard data.
 
         Uses the LeaderBoardManager to get a sorted list of user contributions.
 
+        :param window: Time frame to rank users within.
         :returns: A sorted list of tuples: `(user_id, tasks_done_count)`.
         """
-        return self._leaderboard_manager.get_leaders()
+        if window == LeaderBoardWindow.ALL_TIME:
+            # keep managers overridden by plugins before windows were introduced working
+            return self._leaderboard_manager.get_leaders()
+
+        return self._leaderboard_manager.get_leaders(window)
 
-    def get_leaderboard(self, limit: int = 10) -> list[dict[str, Any]]:
+    def get_leaderboard(
+        self, limit: int = 10, window: LeaderBoardWindow = LeaderBoardWindow.ALL_TIME
+    ) -> list[dict[str, Any]]:
         """Retrieves the formatted leaderboard with user objects.
 
         Uses the LeaderBoardManager to get the top contributing users.
 
         :param limit: The maximum number of top users to return.
+        :param window: Time frame to rank users within.
         :returns: A list of dictionaries, each containing:
                   `{'user': UserObject, 'freq': tasks_done_count}`.
         """
-        return self._leaderboard_manager.get_leaderboard(limit)
+        if window == LeaderBoardWindow.ALL_TIME:
+            return self._leaderboard_manager.get_leaderboard(limit)
+
+        return self._leaderboard_manager.get_leaderboard(limit, window)
 
     def get_next(self, user: User) -> dict[str, Any]:
         """
@@ -287,6 +352,7 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
             # immediately on GET request for the task.
             self._work_session_manager.start_work_session(task, user.id)
             self._logger.debug("Assigned task %s to user %s", task.id, user.id)
+            METRICS.inc("vulyk_tasks_assigned_total", task_type=self.type_name)
 
             return task.as_dict()
 
@@ -377,6 +443,47 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
         except self.task_model.DoesNotExist as err:
             raise TaskNotFoundError() from err
 
+    def record_activities(self, user_id: ObjectId, activities: Sequence[tuple[str, int]]) -> None:
+        """
+        Records a bunch of activity heartbeats of a user at once.
+
+        Unlike `record_activity` tasks aren't looked up: heartbeats either go
+        into the activity buffer (if enabled) or are written within a single
+        bulk request. Heartbeats for unknown sessions are silently dropped.
+
+        :param user_id: The ID of the user performing the activity.
+        :param activities: Pairs of `(task_id, seconds)`.
+        :raises WorkSessionUpdateError: If any duration is negative or longer
+                                        than `MAX_HEARTBEAT_SECONDS`, or the
+                                        database update fails.
+        """
+        if any(not 0 <= seconds <= MAX_HEARTBEAT_SECONDS for _, seconds in activities):
+            raise WorkSessionUpdateError("Activity duration is out of range.")
+
+        if self._activity_buffer is not None:
+            for task_id, seconds in activities:
+                self._activity_buffer.add(user_id, task_id, seconds)
+
+            return
+
+        coalesced: dict[tuple[ObjectId, str], int] = {}
+
+        for task_id, seconds in activities:
+            coalesced[(user_id, task_id)] = coalesced.get((user_id, task_id), 0) + seconds
+
+        self._work_session_manager.record_activities(coalesced)
+
+    def _flush_activity(self, user_id: ObjectId, task_ids: Sequence[str]) -> None:
+        """
+        Writes down activity still buffered for sessions about to be ended,
+        so it's accounted along with them.
+
+        :param user_id: The ID of the user.
+        :param task_ids: Tasks of the sessions.
+        """
+        if self._activity_buffer is not None:
+            self._activity_buffer.flush_sessions(user_id, task_ids)
+
     def skip_task(self, task_id: str, user: User) -> None:
         """
         Marks a task as skipped by a specific user.
@@ -396,12 +503,33 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
             self._work_session_manager.delete_work_session(task, user.id)
 
             self._logger.debug("User %s skipped the task %s", user.id, task_id)
+            METRICS.inc("vulyk_tasks_skipped_total", task_type=self.type_name)
         except self.task_model.DoesNotExist as err:
             raise TaskNotFoundError() from err
         except OperationError as err:
             raise TaskSkipError("Can not skip the task.") from err
 
-    def on_task_done(self, user: User, task_id: str, result: dict[str, Any]) -> None:
+    def find_submission(self, user: User, idempotency_key: str) -> str | None:
+        """
+        Looks up an answer submitted earlier with the same idempotency key.
+        Only the ID of the task is fetched, using the unique index.
+
+        :param user: The User instance who submits the answer.
+        :param idempotency_key: Key supplied by the client.
+        :return: ID of the task answered with this key or None.
+        """
+        submitted = (
+            self.answer_model.objects(created_by=user, idempotency_key=idempotency_key)
+            .only("task")
+            .as_pymongo()
+            .first()
+        )
+
+        return None if submitted is None else submitted["task"]
+
+    def on_task_done(
+        self, user: User, task_id: str, result: dict[str, Any], idempotency_key: str | None = None
+    ) -> None:
         """
         Handles the submission of a user's answer for a completed task.
 
@@ -411,6 +539,8 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
         :param user: The User instance who submitted the answer.
         :param task_id: The ID of the task being answered.
         :param result: A dictionary containing the user's answer data.
+        :param idempotency_key: Optional key supplied by the client, stored with
+                                the answer to recognize retries (see `find_submission`).
         :raises TaskNotFoundError: If the specified task_id does not exist.
         :raises TaskValidationError: If the answer data is invalid, or if the user
                                      has already submitted an answer for this task.
@@ -428,25 +558,41 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
             ) from err
 
         try:
-            answer = self.answer_model.objects.create(
+            answer = self.answer_model(
                 task=task,
                 created_by=user,
                 created_at=datetime.now(tz=timezone.utc),
                 task_type=self.type_name,
                 result=result,
+                idempotency_key=idempotency_key,
             )
+            answer.validate()
+            # the answer goes first so a duplicate doesn't move any counter;
+            # it's a write per collection anyway, a transaction would only add
+            # round trips
+            pipeline = SubmissionPipeline()
+            pipeline.insert(answer, validate=False)
+            # update user
+            pipeline.update(User, {"_id": user.id}, {"$inc": {"processed": 1}})
+            # update daily rollups windowed leaderboards are built from
+            self._leaderboard_manager.record_answer(user.id, answer.created_at, pipeline=pipeline)
+            pipeline.execute()
 
             # update task
             closed = self._update_task_on_answer(task, answer, user)
-            # update user
-            user.update(inc__processed=1)
-            # update stats record
+            # update stats record, along with the activity still buffered
+            self._flush_activity(user.id, [task.id])
             self._work_session_manager.end_work_session(task, user.id, answer)
 
             self._logger.debug("User %s has done task %s", user.id, task_id)
+            METRICS.inc("vulyk_answers_submitted_total", task_type=self.type_name)
+
+            if closed:
+                # the batch ID is all we need, don't fetch the batch itself
+                with no_dereference(self.task_model):
+                    batch = task.batch
 
-            if closed and task.batch is not None:
-                Batch.task_done_in(batch_id=task.batch.id)
+                self._account_closed({None if batch is None else batch.id: 1})
         except NotUniqueError as err:
             raise TaskValidationError(
                 "Attempt to save over the existing answer for task {id} by user {user!r}".format(id=task_id, user=user)
@@ -456,6 +602,181 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
         except (OperationError, LookUpError, InvalidQueryError) as err:
             raise TaskSaveError() from err
 
+    def on_tasks_done_bulk(
+        self, user: User, submissions: Sequence[tuple[str, dict[str, Any]]]
+    ) -> list[SubmissionResult]:
+        """
+        Handles many answers submitted at once, e.g. prepared offline.
+
+        Does the same as `on_task_done` for every answer, but with a fixed number
+        of requests: tasks and earlier answers are fetched with one query each,
+        new answers are inserted with a single bulk insert along with the user
+        counters, tasks are updated with one request per batch and each batch is
+        closed at most once. Listeners get a single `on_tasks_done` signal.
+
+        A submission that can't be accepted (missing task, repeated answer,
+        invalid result) doesn't prevent the others from being saved.
+
+        :param user: The User instance who submitted the answers.
+        :param submissions: Pairs of task ID and the answer data.
+        :return: Outcome of every submission, in the same order.
+        :raises TaskValidationError: If some answer has been saved concurrently
+                                     by another request within a transaction,
+                                     which is rolled back then. Without
+                                     transactions such answers are reported as
+                                     not done, the rest are saved.
+        :raises TaskSaveError: If a database operation fails during saving.
+        """
+        now = datetime.now(tz=timezone.utc)
+        task_ids = list({task_id for task_id, _ in submissions})
+        tasks = {t.id: t for t in self.task_model.objects(id__in=task_ids, task_type=self.type_name)}
+        answered = {
+            a["task"]
+            for a in self.answer_model.objects(created_by=user, task__in=list(tasks)).only("task").as_pymongo()
+        }
+        results: list[SubmissionResult] = []
+        accepted: list[tuple[AbstractTask, AbstractAnswer]] = []
+        pipeline = SubmissionPipeline(self.answer_model._get_db().client)  # noqa: SLF001
+
+        for task_id, result in submissions:
+            if (task := tasks.get(task_id)) is None:
+                results.append(SubmissionResult(task_id, done=False, error="Task not found"))
+                continue
+
+            if task_id in answered:
+                results.append(SubmissionResult(task_id, done=False, error="Task has been answered already"))
+                continue
+
+            answer = self.answer_model(
+                task=task, created_by=user, created_at=now, task_type=self.type_name, result=result
+            )
+
+            try:
+                pipeline.insert(answer)
+            except ValidationError as err:
+                results.append(SubmissionResult(task_id, done=False, error=str(err)))
+                continue
+
+            answered.add(task_id)
+            accepted.append((task, answer))
+            results.append(SubmissionResult(task_id, done=True, error=None))
+
+        if not accepted:
+            return results
+
+        try:
+            if not pipeline.transactional:
+                accepted = self._insert_answers(pipeline, accepted, results)
+
+                if not accepted:
+                    return results
+
+            pipeline.update(User, {"_id": user.id}, {"$inc": {"processed": len(accepted)}})
+            self._leaderboard_manager.record_answer(user.id, now, amount=len(accepted), pipeline=pipeline)
+            pipeline.execute()
+
+            closed_in = self._update_tasks_on_answers(accepted, user)
+            self._flush_activity(user.id, [task.id for task, _ in accepted])
+            self._work_session_manager.end_work_sessions(user.id, [answer for _, answer in accepted])
+
+            self._logger.debug("User %s has done %s tasks at once", user.id, len(accepted))
+            METRICS.inc("vulyk_answers_submitted_total", len(accepted), task_type=self.type_name)
+
+            self._account_closed(closed_in)
+        except NotUniqueError as err:
+            raise TaskValidationError(
+                "Attempt to save over existing answers by user {user!r}".format(user=user)
+            ) from err
+        except (OperationError, LookUpError, InvalidQueryError, WorkSessionUpdateError) as err:
+            raise TaskSaveError() from err
+
+        return results
+
+    def _insert_answers(
+        self,
+        pipeline: SubmissionPipeline,
+        accepted: list[tuple[AbstractTask, AbstractAnswer]],
+        results: list[SubmissionResult],
+    ) -> list[tuple[AbstractTask, AbstractAnswer]]:
+        """
+        Without a transaction answers stored before a duplicate would stay
+        unaccounted, so they are written on their own first and only those
+        actually stored go on. Answers saved concurrently by another request
+        are reported as not done.
+
+        :param pipeline: Pipeline with the answers queued.
+        :param accepted: Pairs of task and its new answer.
+        :param results: Outcomes of submissions, updated in place.
+        :return: Pairs whose answers have been stored.
+        """
+        rejected = {answer.task.id for answer in pipeline.write_inserts(self.answer_model)}
+
+        for i, r in enumerate(results):
+            if r.done and r.task_id in rejected:
+                results[i] = SubmissionResult(r.task_id, done=False, error="Task has been answered already")
+
+        return [(task, answer) for task, answer in accepted if task.id not in rejected]
+
+    def _update_tasks_on_answers(
+        self, accepted: Sequence[tuple[AbstractTask, AbstractAnswer]], user: User
+    ) -> dict[str | None, int]:
+        """
+        Bulk counterpart of `_update_task_on_answer`: tasks staying open are
+        updated with a single request, tasks to be closed - with a conditional
+        request per batch, which tells how many of them this call has closed.
+
+        Task types overriding `_update_task_on_answer` get it called for
+        every task instead.
+
+        :param accepted: Pairs of task and its new answer.
+        :param user: The User instance who provided the answers.
+        :return: Number of tasks closed by this call per batch ID.
+        """
+        closed_in: dict[str | None, int] = {}
+        to_close: dict[str | None, list[str]] = {}
+        to_count: list[str] = []
+
+        for task, answer in accepted:
+            # the batch ID is all we need, don't fetch the batch itself
+            with no_dereference(self.task_model):
+                batch_id = None if task.batch is None else task.batch.id
+
+            if type(self)._update_task_on_answer is not AbstractTaskType._update_task_on_answer:  # noqa: SLF001
+                closed_in[batch_id] = closed_in.get(batch_id, 0) + self._update_task_on_answer(task, answer, user)
+            elif self._is_ready_for_autoclose(task, answer) or task.users_count + 1 >= self.redundancy:
+                to_close.setdefault(batch_id, []).append(task.id)
+            else:
+                to_count.append(task.id)
+
+        update_q = {"inc__users_count": 1, "add_to_set__users_processed": user}
+
+        if to_count:
+            self.task_model.objects(id__in=to_count).update(**update_q)
+
+        for batch_id, ids in to_close.items():
+            closed_in[batch_id] = self.task_model.objects(id__in=ids, closed=False).update(set__closed=True, **update_q)
+
+            # the rest have been closed concurrently, see `_update_task_on_answer`
+            if closed_in[batch_id] < len(ids):
+                self.task_model.objects(id__in=ids, users_processed__ne=user).update(**update_q)
+
+        return closed_in
+
+    def _account_closed(self, closed_in: dict[str | None, int]) -> None:
+        """
+        Accounts closed tasks in the counters of the task type and advances
+        their batches, closing those that are done.
+
+        :param closed_in: Number of tasks closed per batch ID (None for tasks
+                          outside of any batch).
+        """
+        if closed := sum(closed_in.values()):
+            TaskCounters.increment(self.type_name, closed=closed)
+
+        for batch_id, amount in closed_in.items():
+            if batch_id is not None and amount:
+                Batch.task_done_in(batch_id=batch_id, amount=amount)
+
     def _is_ready_for_autoclose(self, task: AbstractTask, answer: AbstractAnswer) -> bool:
         """
         Determines if a task can be automatically closed based on the latest answer.
@@ -524,21 +845,20 @@ class AbstractTaskType(Generic[TAbstractTask, TAbstractAnswer]):
 
         Provides key information like name, description, type identifier, and
         task counts (total, open, closed). Useful for displaying task type
-        information in UIs or APIs.
+        information in UIs or APIs. Counts are read from the maintained
+        `TaskCounters` document instead of counting the tasks.
 
         :return: A dictionary containing summary information about the task type.
         """
 
-        closed_tasks: int = self.task_model.objects(closed=True).count()
-        tasks: int = self.task_model.objects().count()
-        open_tasks: int = tasks - closed_tasks
+        counters = TaskCounters.of_type(self.type_name)
 
         return {
             "name": self.name,
             "description": self.description,
             "type": self.type_name,
-            "tasks": tasks,
-            "open_tasks": open_tasks,
-            "closed_tasks": closed_tasks,
-            "has_tasks": open_tasks > 0,
+            "tasks": counters.tasks,
+            "open_tasks": counters.open,
+            "closed_tasks": counters.closed,
+            "has_tasks": counters.open > 0,
         }
@@ -15,6 +15,7 @@ from mongoengine import (
     ReferenceField,
     StringField,
 )
+from pymongo import ReturnDocument
 
 from vulyk.models.user import User
 from vulyk.signals import on_batch_done
@@ -43,38 +44,43 @@ class Batch(Document):
     }
 
     @classmethod
-    def task_done_in(cls, batch_id: str) -> BatchUpdateResult:
+    def task_done_in(cls, batch_id: str, amount: int = 1) -> BatchUpdateResult:
         """
         Increment needed values upon a task from the batch is done. In case if
         all tasks are finished - close the batch.
 
+        The counter is incremented atomically and never beyond the number of
+        tasks: if `amount` would overshoot it (e.g. the counter has drifted or
+        tasks have been re-imported) it's clamped, so the batch still gets
+        closed. The batch is closed (and `on_batch_done` is sent) exactly once,
+        by the call that has done the last task.
+
         :param batch_id: Batch ID.
+        :param amount: Number of tasks done at once.
 
         :return: Aggregate which represents complex effect of the method.
         """
-        num_changed = 0
-        batch = cls.objects.get(id=batch_id)  # type: Batch
-        processed = batch.tasks_processed + 1
+        processed = {"$ifNull": ["$tasksProcessed", 0]}
+        raw = cls._get_collection().find_one_and_update(
+            {"_id": batch_id, "$expr": {"$lt": [processed, "$tasksCount"]}},
+            [{"$set": {"tasksProcessed": {"$min": ["$tasksCount", {"$add": [processed, amount]}]}}}],
+            return_document=ReturnDocument.AFTER,
+        )
 
-        if processed > batch.tasks_count:
+        if raw is None:
             return BatchUpdateResult(success=False, closed=False)
 
-        closed = processed == batch.tasks_count
-        update_q = {"inc__tasks_processed": 1}
-
-        if closed:
-            update_q["set__closed"] = closed
-            num_changed = cls.objects(id=batch.id, closed=False).update(**update_q)
+        batch = cls._from_son(raw)
 
-        if num_changed == 0:
-            update_q.pop("set__closed", None)
-            closed = False
+        closed = batch.tasks_processed >= batch.tasks_count and bool(
+            cls.objects(id=batch.id, closed=False).update_one(set__closed=True)
+        )
 
-            num_changed = batch.update(**update_q)
-        elif closed:
+        if closed:
+            batch.closed = True
             on_batch_done.send(batch)
 
-        return BatchUpdateResult(success=num_changed > 0, closed=closed)
+        return BatchUpdateResult(success=True, closed=closed)
 
     def __str__(self) -> str:
         return str(self.id)
@@ -145,11 +151,25 @@ class AbstractAnswer(Document):
     task_type = StringField(max_length=50, required=True, db_field="taskType")
     # not sure - could be extended
     result = DictField()
+    # supplied by the client to recognize retries of the same submission
+    idempotency_key = StringField(max_length=64, db_field="idempotencyKey")
 
     meta: ClassVar[dict[str, Any]] = {
         "collection": "reports",
         "allow_inheritance": True,
-        "indexes": ["task", "created_by", "created_at", {"fields": ["created_by", "task"], "unique": True}],
+        "indexes": [
+            "task",
+            "created_by",
+            "created_at",
+            {"fields": ["created_by", "task"], "unique": True},
+            # keys are chosen by clients, so they are unique per user only;
+            # a sparse index would still cover answers without a key, by user
+            {
+                "fields": ["created_by", "idempotency_key"],
+                "unique": True,
+                "partialFilterExpression": {"idempotencyKey": {"$type": "string"}},
+            },
+        ],
     }
 
     # TODO: decide, if we need it at all
@@ -3,6 +3,7 @@
 
 import datetime
 from datetime import timezone
+from functools import cached_property
 from itertools import chain
 from typing import TYPE_CHECKING, Any, ClassVar
 
@@ -14,11 +15,13 @@ from mongoengine import (
     DateTimeField,
     IntField,
     ListField,
+    Q,
     ReferenceField,
     StringField,
     ValidationError,
     signals,
 )
+from mongoengine.context_managers import no_dereference
 
 if TYPE_CHECKING:
     from vulyk.models.task_types import AbstractTaskType
@@ -76,7 +79,22 @@ class User(Document, UserMixin):
         if not task_type:
             raise ValueError("Empty parameter `task_type` passed")
 
-        return self.admin or task_type in chain(*(g.allowed_types for g in self.groups))
+        return self.admin or task_type in self.allowed_types
+
+    @cached_property
+    def allowed_types(self) -> frozenset[str]:
+        """
+        Task types allowed by all groups of the member. Groups are fetched with
+        a single query, once per instance: the member is loaded anew for every
+        request, so changes of groups take effect from the next one.
+
+        :return: Set of task type names.
+        """
+        # IDs are all we need, don't fetch groups one by one
+        with no_dereference(User):
+            ids = [g.id for g in self.groups]
+
+        return frozenset(chain.from_iterable(Group.objects(id__in=ids).scalar("allowed_types")))
 
     def get_stats(self, task_type: "AbstractTaskType") -> dict[str, int]:
         """
@@ -104,6 +122,37 @@ class User(Document, UserMixin):
 
         return {"total": total, "position": i}
 
+    def touch(self, interval: datetime.timedelta) -> bool:
+        """
+        Update the time of the last login, unless it was updated lately.
+        Only `last_login` is written, with a conditional update, so
+        concurrent requests of the same member write it once.
+
+        :param interval: How outdated the stored time may be.
+
+        :return: True if the time was written.
+        """
+        now = datetime.datetime.now(timezone.utc)
+        threshold = now - interval
+        last_login = self.last_login
+
+        # dates are read back naive unless the connection is tz-aware
+        if last_login is not None and last_login.tzinfo is None:
+            last_login = last_login.replace(tzinfo=timezone.utc)
+
+        if last_login is not None and last_login > threshold:
+            return False
+
+        written = User.objects(Q(last_login__lte=threshold) | Q(last_login=None), id=self.id).update_one(
+            set__last_login=now
+        )
+
+        if written:
+            self.last_login = now
+            self._clear_changed_fields()
+
+        return bool(written)
+
     def as_dict(self) -> dict[str, str]:
         """
         Converts the model-instance into a safe dict that will include some
@@ -125,6 +174,9 @@ class User(Document, UserMixin):
 
         :return: Modified User instance.
         """
+        # groups might have been changed
+        document.__dict__.pop("allowed_types", None)
+
         if all((x.id != "default" for x in document.groups)):
             try:
                 document.groups = [Group.objects.get(id="default")]
@@ -94,6 +94,71 @@ COLLECT_PLUGIN_DIR_PREFIX: str = "plugin_"
 # Default redundancy level for processing
 USERS_PER_TASK: int = int(ENV("USERS_PER_TASK", "2"))
 
+# Lifetime (in seconds) of a leaderboard snapshot shared by all workers.
+# 0 disables caching, so the ranking is recomputed on every request.
+LEADERBOARD_CACHE_TTL: int = int(ENV("LEADERBOARD_CACHE_TTL", "60"))
+
+# Activity heartbeats are coalesced in memory and written down in bulk every
+# ACTIVITY_FLUSH_INTERVAL seconds or once ACTIVITY_BUFFER_SIZE sessions are
+# buffered. 0 makes every heartbeats request write through.
+ACTIVITY_FLUSH_INTERVAL: float = float(ENV("ACTIVITY_FLUSH_INTERVAL", "5"))
+ACTIVITY_BUFFER_SIZE: int = int(ENV("ACTIVITY_BUFFER_SIZE", "500"))
+
+# Maximum number of answers accepted by a single `done_many` request.
+BULK_SUBMISSION_LIMIT: int = int(ENV("BULK_SUBMISSION_LIMIT", "100"))
+# Maximum number of heartbeats accepted by a single `activity` request.
+ACTIVITY_HEARTBEATS_LIMIT: int = int(ENV("ACTIVITY_HEARTBEATS_LIMIT", "100"))
+
+# The time of the last login is written at most once per interval (seconds)
+# per member, not on every request. 0 writes it on every request.
+LAST_LOGIN_UPDATE_INTERVAL: int = int(ENV("LAST_LOGIN_UPDATE_INTERVAL", "300"))
+
+# Facts like "the project is initialized" are remembered once they hold, per
+# worker. There's no invalidation across processes: a fact that stops holding
+# (e.g. the default group removed by `manage.py group`) is noticed after
+# FACTS_TTL seconds. 0 keeps them until the process restarts.
+FACTS_TTL: int = int(ENV("FACTS_TTL", "300"))
+
+# Listeners opted into deferring (e.g. gamification) are queued instead of
+# being run within the request. Run `manage.py worker` to process the queue.
+DEFERRED_LISTENERS: bool = ENV("DEFERRED_LISTENERS", "False").lower() in ("true", "t", "1")
+JOB_MAX_ATTEMPTS: int = int(ENV("JOB_MAX_ATTEMPTS", "5"))
+
+# Turn COMPRESS_RESPONSES on to compress pages and JSON responses with gzip
+# (or brotli, if `brotli` package is installed) when no proxy in front of the
+# application does it.
+# Responses smaller than COMPRESS_MIN_SIZE bytes aren't worth compressing.
+COMPRESS_RESPONSES: bool = ENV("COMPRESS_RESPONSES", "False").lower() in ("true", "t", "1")
+COMPRESS_MIN_SIZE: int = int(ENV("COMPRESS_MIN_SIZE", "500"))
+COMPRESS_MIMETYPES: list[str] = [
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/javascript",
+    "application/javascript",
+    "application/json",
+]
+
+# Request, task and listener metrics exposed at /metrics in Prometheus format.
+# Every worker writes its metrics down each METRICS_FLUSH_INTERVAL seconds, so
+# that any of them shows the totals. If METRICS_TOKEN is set, scrapers must
+# send it as `Authorization: Bearer <token>`.
+METRICS_ENABLED: bool = ENV("METRICS_ENABLED", "False").lower() in ("true", "t", "1")
+METRICS_FLUSH_INTERVAL: float = float(ENV("METRICS_FLUSH_INTERVAL", "15"))
+METRICS_TOKEN: str = ENV("METRICS_TOKEN", "")
+
+# Database commands taking longer than DB_SLOW_COMMAND_MS milliseconds are
+# logged with the shape of their filters, 0 turns it off. DB_SERVER_TIMING
+# reports the number and the time of commands a request has sent in the
+# `Server-Timing` header (shown by browsers' dev tools).
+DB_SLOW_COMMAND_MS: float = float(ENV("DB_SLOW_COMMAND_MS", "100"))
+DB_SERVER_TIMING: bool = ENV("DB_SERVER_TIMING", str(DEBUG)).lower() in ("true", "t", "1")
+
+# With PROFILER_ENABLED admins may have a request profiled by adding
+# `?profile=1` or the `X-Vulyk-Profile: 1` header to it. Profiles are listed
+# in the admin.
+PROFILER_ENABLED: bool = ENV("PROFILER_ENABLED", "False").lower() in ("true", "t", "1")
+
 # Restrict an access to site to admins only
 SITE_IS_CLOSED: bool = bool(ENV("SITE_IS_CLOSED", default=False))
 
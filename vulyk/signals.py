@@ -1,7 +1,10 @@
 # coding=utf-8
 from blinker import signal
 
-__all__ = ["on_batch_done", "on_task_done"]
+__all__ = ["on_batch_done", "on_task_done", "on_tasks_done"]
 
 on_task_done = signal("on_task_done")
+# answers submitted at once: sent a single time with the list of them
+# instead of `on_task_done` for every answer
+on_tasks_done = signal("on_tasks_done")
 on_batch_done = signal("on_batch_done")
@@ -8,6 +8,7 @@ var Vulyk = Vulyk || {
             task_type: "",
             task_title: "",
             task_id: 0,
+            submission_key: "",
             task_init_state: null,
             task_state: null,
             task_wrapper: null,
@@ -40,6 +41,8 @@ var Vulyk = Vulyk || {
                 "/type/" + vus.task_type + "/next",
                 function (data) {
                     vus.task_id = data.result.task.id;
+                    // lets the server recognize retries of the same submission
+                    vus.submission_key = Date.now().toString(36) + Math.random().toString(36).slice(2);
                     vus.body.trigger("vulyk.next", data);
                 }
             ).fail(function (data) {
@@ -76,7 +79,7 @@ var Vulyk = Vulyk || {
 
             $.post(
                 "/type/" + vus.task_type + "/done/" + vus.task_id,
-                {result: JSON.stringify(result)},
+                {result: JSON.stringify(result), idempotency_key: vus.submission_key},
                 function (data) {
                     vu.load_next();
                 });
@@ -2,19 +2,42 @@
 """Every project must have a package called `utils`."""
 
 import os
-from collections.abc import Generator, Iterable
+from collections.abc import Callable, Generator, Iterable
+from datetime import datetime
 from http import HTTPStatus
 from itertools import islice
-from typing import Any
+from typing import Any, cast
+from weakref import WeakKeyDictionary
 
 import flask
 import orjson as json
 from flask import Response, abort
+from werkzeug.http import is_resource_modified
 
+from vulyk.ext.leaderboard import LeaderBoardWindow
 from vulyk.models.task_types import AbstractTaskType
 from vulyk.models.user import User
 
-__all__ = ["NO_TASKS", "chunked", "get_template_path", "json_response", "resolve_task_type"]
+__all__ = [
+    "CACHE_NO_STORE",
+    "CACHE_REVALIDATE",
+    "chunked",
+    "conditional_response",
+    "get_template_path",
+    "json_response",
+    "no_tasks",
+    "resolve_leaderboard_window",
+    "resolve_task_type",
+    "template_paths",
+]
+
+# responses that mustn't be kept by clients or proxies
+CACHE_NO_STORE = "no-cache, no-store, must-revalidate"
+# responses that may be kept, but must be revalidated using ETag on every use
+CACHE_REVALIDATE = "no-cache"
+
+# application -> (jinja loader the map was built with, the map)
+_TEMPLATE_PATHS: "WeakKeyDictionary[flask.Flask, tuple[Any, dict[str, str]]]" = WeakKeyDictionary()
 
 
 def resolve_task_type(type_id: str, tasks: dict[str, AbstractTaskType], user: User) -> AbstractTaskType:
@@ -39,6 +62,23 @@ def resolve_task_type(type_id: str, tasks: dict[str, AbstractTaskType], user: Us
     return task_type
 
 
+def resolve_leaderboard_window(name: str | None) -> LeaderBoardWindow:
+    """
+    Converts the `window` query argument into a leaderboard time frame.
+
+    :param name: Lowercase name of the window, e.g. `week`. None means all-time.
+
+    :returns: Correct LeaderBoardWindow member or throws an exception.
+    """
+    if not name:
+        return LeaderBoardWindow.ALL_TIME
+
+    try:
+        return LeaderBoardWindow[name.upper()]
+    except KeyError:
+        abort(HTTPStatus.NOT_FOUND)
+
+
 # Borrowed from elasticutils.
 def chunked(iterable: Iterable, n: int) -> Generator[tuple]:
     """Returns chunks of n length of iterable.
@@ -71,25 +111,69 @@ def get_template_path(app: flask.Flask, name: str) -> str:
     """
     Finds the path to the template.
 
+    Listing templates walks template folders of every plugin on disk, so it's
+    done once and the result is kept until the loader is replaced. When
+    templates are reloaded (e.g. in debug) it's done once per request instead.
+
     :param app: Flask application instance.
     :param name: Name of the template.
 
     :return: Full path to the template.
     """
+    return template_paths(app).get(name, "base/%s" % name)
+
+
+def template_paths(app: flask.Flask) -> dict[str, str]:
+    """
+    Map of template names to their overrides within `TEMPLATE_BASE_FOLDERS`.
+
+    :param app: Flask application instance.
+
+    :return: Dictionary of `name -> full path`.
+    """
+    if app.jinja_env.auto_reload:
+        if not flask.has_request_context():
+            return _list_template_paths(app)
+
+        if "template_paths" not in flask.g:
+            flask.g.template_paths = _list_template_paths(app)
+
+        return cast(dict[str, str], flask.g.template_paths)
+
+    loader, paths = _TEMPLATE_PATHS.get(app, (None, {}))
+
+    if loader is not app.jinja_loader:
+        loader, paths = app.jinja_loader, _list_template_paths(app)
+        _TEMPLATE_PATHS[app] = (loader, paths)
+
+    return paths
+
+
+def _list_template_paths(app: flask.Flask) -> dict[str, str]:
+    prefixes = [os.path.join(f, "base", "") for f in app.config.get("TEMPLATE_BASE_FOLDERS", []) if f]
+    paths: dict[str, str] = {}
+
     for x in app.jinja_loader.list_templates():
-        for folder in app.config.get("TEMPLATE_BASE_FOLDERS", []):
-            if folder and os.path.join(folder, "base", name) == x:
-                return x
-    return "base/%s" % name
+        for prefix in prefixes:
+            if x.startswith(prefix):
+                paths.setdefault(x[len(prefix) :], x)
+
+    return paths
 
 
-def json_response(result: dict[str, Any], errors: Iterable[Any] | None = None, status: int = HTTPStatus.OK) -> Response:
+def json_response(
+    result: dict[str, Any],
+    errors: Iterable[Any] | None = None,
+    status: int = HTTPStatus.OK,
+    cache: str = CACHE_NO_STORE,
+) -> Response:
     """
     Handy helper to prepare unified responses.
 
     :param result: Data to be sent.
     :param errors: Sequence of errors.
     :param status: Response http-status.
+    :param cache: Cache policy, either `CACHE_NO_STORE` or `CACHE_REVALIDATE`.
 
     :returns: Jsonified response.
     """
@@ -97,17 +181,50 @@ def json_response(result: dict[str, Any], errors: Iterable[Any] | None = None, s
         errors = []
 
     data = json.dumps({"result": result, "errors": errors}, default=str)
+    headers = [("Cache-Control", cache)]
 
-    return flask.Response(
-        data,
-        status,
-        mimetype="application/json",
-        headers=[
-            ("Cache-Control", "no-cache, no-store, must-revalidate"),
-            ("Pragma", "no-cache"),
-            ("Expires", "0"),
-        ],
-    )
+    if cache == CACHE_NO_STORE:
+        headers += [("Pragma", "no-cache"), ("Expires", "0")]
 
+    return flask.Response(data, status, mimetype="application/json", headers=headers)
 
-NO_TASKS = json_response({}, ["There is no task having type like this"], HTTPStatus.NOT_FOUND)
+
+def conditional_response(
+    version: tuple[str, datetime | None],
+    build: Callable[[], Response],
+    cache: str = CACHE_REVALIDATE,
+) -> Response:
+    """
+    Answers 304 Not Modified if the client already has the current version
+    of a resource, otherwise builds the response and tags it with the version.
+
+    :param version: Entity tag and the time of the last change, if known.
+    :param build: Prepares the full response.
+    :param cache: Cache policy the 304 response is sent with, it should be
+        the same the full one has.
+
+    :returns: Either the full response or an empty 304 one.
+    """
+    etag, last_modified = version
+
+    if is_resource_modified(flask.request.environ, etag=etag, last_modified=last_modified):
+        response = build()
+    else:
+        response = flask.Response(status=HTTPStatus.NOT_MODIFIED, headers=[("Cache-Control", cache)])
+
+    response.set_etag(etag)
+
+    if last_modified is not None:
+        response.last_modified = last_modified
+
+    return response
+
+
+def no_tasks() -> Response:
+    """
+    Answers a request for a task type the user can't have. A new response is
+    built every time, as after-request hooks add headers to it.
+
+    :returns: 404 response.
+    """
+    return json_response({}, ["There is no task having type like this"], HTTPStatus.NOT_FOUND)